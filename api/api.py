@@ -1,14 +1,19 @@
-import cv2
-import openpyxl
-import threading
 import numpy as np
-import os, json, time, bcrypt, base64, datetime
-from io import BytesIO
+import os, csv, json, time, datetime, hashlib, itertools, tempfile, threading
+from io import StringIO
 
-from flask import Flask, Response, jsonify, request, send_from_directory, send_file
+from flask import Flask, Response, g, jsonify, request, send_from_directory, stream_with_context
 from flask_socketio import SocketIO, emit, join_room
+from werkzeug.datastructures import MultiDict
 
-from detector import detect_action
+from clips import ClipRecorder
+from detector import MultiPoseTracker, TrackerRegistry
+from episodes import EpisodeEngine
+from imagestore import ImageStore
+from inbox import LatestInbox
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsRegistry
+from snapshots import SnapshotWriter
+from store import CONFIDENCE_BUCKET, EventStore, RECENT_CACHE_SIZE
 
 app = Flask(__name__)
 socketio = SocketIO(app, cors_allowed_origins="*", async_mode="threading")
@@ -17,21 +22,172 @@ DB_DIR = os.path.join(os.path.dirname(__file__), '..', 'db', 'logs')
 CRED_DIR = os.path.join(os.path.dirname(__file__), '..', 'db', 'credentials')
 EMAILS_DIR = os.path.join(os.path.dirname(__file__), '..', 'db', 'credentials')
 IMG_DIR = os.path.join(os.path.dirname(__file__), '..', 'db', 'imgs')
-
-os.makedirs(DB_DIR, exist_ok=True)
-os.makedirs(CRED_DIR, exist_ok=True)
-os.makedirs(IMG_DIR, exist_ok=True)
+CLIP_DIR = os.path.join(os.path.dirname(__file__), '..', 'db', 'clips')
+
+# Importing this module has no side effects: create_app() opens the stores
+# and starts the background workers, and cameras are only opened by
+# start_capture() or the first request for one. Heavy modules (cv2 via
+# capture, openpyxl, bcrypt) are imported where they are first needed.
+event_store = None
+image_store = None
+snapshot_writer = None
+clip_recorder = None
+capture_manager = None
+episodes = None
+keypoint_inbox = None
+_setup_lock = threading.Lock()
+
+# Counters and histograms here are updated inline on the hot paths; everything
+# else is read from existing state when /api/metrics is scraped
+metrics = MetricsRegistry("pose")
+http_latency = metrics.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route (until headers for streamed bodies).",
+    ("method", "route", "status")
+)
+detect_latency = metrics.histogram(
+    "detect_duration_seconds", "Time spent in the detector per keypoints event.", ("kind",)
+)
+keypoint_events = metrics.counter(
+    "keypoint_frames_total", "Keypoint frames received, by socket client.", ("client",)
+)
+mjpeg_bytes = metrics.counter("mjpeg_bytes_sent_total", "MJPEG bytes sent to viewers.", ("camera",))
+snapshot_latency = metrics.histogram(
+    "snapshot_write_duration_seconds", "Snapshot decode, encode and write time.", ("result",)
+)
+store_append_latency = metrics.histogram(
+    "event_store_append_duration_seconds", "Time to append one event to the store."
+)
 
 HIGH_CONFIDENCE_THRESHOLD = 0.8
 
-last_saved_time = {}
-SNAPSHOT_COOLDOWN = 5
+# Alerts for the same pose on the same stream are merged into one episode
+# (and one logged event). Once open, samples down to EPISODE_CLOSE_THRESHOLD
+# keep it going; it closes EPISODE_CLOSE_AFTER seconds after the last one.
+EPISODE_CLOSE_THRESHOLD = 0.6
+EPISODE_CLOSE_AFTER = 10
+EPISODE_MAX_DURATION = 300
+MAX_OPEN_EPISODES = 1024
+
+# Snapshots are re-encoded to this format before hitting disk ("jpeg", "webp",
+# or None to keep the uploaded PNG as is)
+SNAPSHOT_FORMAT = None
+SNAPSHOT_QUALITY = 85
+SNAPSHOT_QUEUE_SIZE = 64
+
+# db/imgs is capped at IMAGE_QUOTA_MB; the least recently viewed images go
+# first, and images older than IMAGE_MAX_AGE_DAYS go regardless. Images of
+# unreviewed events are always kept. 0 disables either limit.
+IMAGE_QUOTA_MB = 2048
+IMAGE_MAX_AGE_DAYS = 90
+THUMBNAIL_HEIGHT = 160
+# Browsers reuse images this long, then revalidate with the ETag. A snapshot
+# only changes while its episode is open, which is at most EPISODE_MAX_DURATION.
+IMAGE_CACHE_SECONDS = EPISODE_MAX_DURATION
+
+MAX_POSE_TRACKERS = 1024
+POSE_TRACKER_IDLE_TIMEOUT = 60
+
+pose_trackers = TrackerRegistry(MAX_POSE_TRACKERS, POSE_TRACKER_IDLE_TIMEOUT)
+# Streams that send every person in the frame get track-id association
+multi_pose_trackers = TrackerRegistry(
+    MAX_POSE_TRACKERS, POSE_TRACKER_IDLE_TIMEOUT, factory=MultiPoseTracker
+)
+
+# Keypoint frames are detected on a worker pool. Each stream keeps only its
+# newest unprocessed frame, and frames older than KEYPOINT_MAX_AGE seconds
+# when a worker gets to them are dropped, so answers stay current under load.
+# Clients are told a target interval between frames (at least
+# KEYPOINT_MIN_INTERVAL_MS) derived from the measured detector time. Stream
+# slots are bounded and swept like the pose trackers.
+KEYPOINT_WORKERS = 4
+KEYPOINT_MAX_AGE = 1.0
+KEYPOINT_MIN_INTERVAL_MS = 50
+KEYPOINT_MAX_INTERVAL_MS = 2000
+
+MAX_PAGE_SIZE = 1000
+
+# Flask debug mode and its reloader when run as a script
+DEBUG = True
 
 RTSP_ADDRESS = ""
 
-cap = cv2.VideoCapture(RTSP_ADDRESS)
-frame_lock = threading.Lock()
-latest_frame = None
+# camera id -> stream address; the first camera also backs /api/ipcam_stream
+CAMERAS = {
+    "default": RTSP_ADDRESS
+}
+DEFAULT_CAMERA = next(iter(CAMERAS))
+
+# Per-viewer frame rate cap for MJPEG streams (overridable with ?fps=)
+MJPEG_MAX_FPS = 15
+
+# Motion gating tells pose-analysis clients to slow down ("throttle") or stop
+# ("skip") while a camera sees no motion; "off" disables the motion detector
+MOTION_GATING = "throttle"
+MOTION_IDLE_INTERVAL_MS = 1000
+
+
+def analysis_hint(camera):
+    """How often a consumer should run pose analysis on this camera's frames."""
+    state = camera.motion_state()
+    if MOTION_GATING == "off" or state["active"]:
+        state.update(analyze=True, interval_ms=None)
+    elif MOTION_GATING == "skip":
+        state.update(analyze=False, interval_ms=None)
+    else:
+        state.update(analyze=True, interval_ms=MOTION_IDLE_INTERVAL_MS)
+    return state
+
+
+def broadcast_motion(camera):
+    # Runs on the capture thread, only when a camera goes active or static
+    socketio.emit("motion", analysis_hint(camera), to=f"camera:{camera.camera_id}")
+
+
+# Alert clips: every camera keeps its last frames as JPEGs in a ring; the
+# total across cameras is capped at CLIP_BUFFER_MB (0 disables clips)
+CLIP_BUFFER_MB = 64
+CLIP_TIER = "720p"
+CLIP_FPS = 10
+CLIP_PRE_SECONDS = 5
+CLIP_POST_SECONDS = 5
+CLIP_QUEUE_SIZE = 16
+
+# Each camera decodes in its own process and hands frames over through a
+# shared-memory ring of FRAME_BUS_SLOTS frames; set CAPTURE_PROCESSES = False
+# to decode on threads in this process instead. Frames larger than
+# FRAME_BUS_MAX_BYTES (1080p BGR by default) are skipped.
+CAPTURE_PROCESSES = True
+FRAME_BUS_SLOTS = 4
+FRAME_BUS_MAX_BYTES = 1920 * 1080 * 3
+
+
+def get_capture_manager():
+    """The CaptureManager, created (and cv2 imported) on first use; starts no camera."""
+    global capture_manager
+    with _setup_lock:
+        if capture_manager is None:
+            from capture import CaptureManager
+            capture_manager = CaptureManager(
+                CAMERAS, motion=MOTION_GATING != "off", on_motion=broadcast_motion,
+                clip_buffer_bytes=CLIP_BUFFER_MB * 1024 * 1024, clip_tier=CLIP_TIER, clip_fps=CLIP_FPS,
+                processes=CAPTURE_PROCESSES, ring_slots=FRAME_BUS_SLOTS, ring_slot_bytes=FRAME_BUS_MAX_BYTES
+            )
+        return capture_manager
+
+
+def get_camera(camera_id):
+    """A configured camera, started on first request; None if there is no such camera."""
+    camera = get_capture_manager().get(camera_id)
+    if camera is not None:
+        with _setup_lock:
+            camera.start()
+    return camera
+
+
+def start_capture():
+    """Open every configured camera now instead of on first request."""
+    get_capture_manager().start()
+
 
 def load_credentials():
     cred_path = os.path.join(CRED_DIR, 'user_details.json')
@@ -89,11 +245,9 @@ def save_db(filepath, data):
         json.dump(data, f, indent=2)
 
 
-def log_suspicious_pose(pose, conf, snapshot_filename=None):
-    suspicious_poses = load_db('suspicious_poses.json', default=[])
-    
+def log_suspicious_pose(pose, conf, snapshot_filename=None, timestamp=None, extra=None):
     new_suspicious_pose_entry = {
-        "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "timestamp": timestamp or datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "pose": pose,
         "confidence": int(round(conf)),
         "status": "unreviewed"
@@ -101,55 +255,212 @@ def log_suspicious_pose(pose, conf, snapshot_filename=None):
 
     if snapshot_filename:
         new_suspicious_pose_entry["image-path"] = snapshot_filename
+    if extra:
+        new_suspicious_pose_entry.update(extra)
 
-    suspicious_poses.append(new_suspicious_pose_entry)
-    save_db(os.path.join(DB_DIR, 'suspicious_poses.json'), suspicious_poses)
+    start = time.perf_counter()
+    event = event_store.append(new_suspicious_pose_entry)
+    store_append_latency.observe(time.perf_counter() - start)
+    return event
 
 
 
 @app.route('/api/health', methods=['GET'])
 def health():
-    return jsonify({'status': 'Alive'}), 200
+    return jsonify({
+        'status': 'Alive',
+        'event_cache': event_store.cache.stats(),
+        'snapshot_writer': snapshot_writer.stats(),
+        'image_store': image_store.stats(),
+        'episodes': episodes.stats(),
+        'clip_recorder': clip_recorder.stats(),
+        'keypoint_inbox': keypoint_inbox.stats()
+    }), 200
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_latency(response):
+    start = g.get("request_start")
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        http_latency.observe(time.perf_counter() - start, request.method, route, str(response.status_code))
+    return response
+
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
 
 
 @app.route("/imgs/<filename>")
 def serve_image(filename):
-    """Serve images stored in the db/imgs folder."""
-    return send_from_directory(IMG_DIR, filename)
+    """
+    Serve images stored in the db/imgs folder; ?size=thumb gets the
+    thumbnail. Responses carry a strong ETag (a content hash) and answer
+    If-None-Match with 304.
+    """
+    size = request.args.get("size", "full")
+    if size not in ("full", "thumb"):
+        return jsonify({"error": "size must be full or thumb"}), 400
+
+    entry = image_store.get(filename)
+    if entry is None:
+        return jsonify({"error": "Image not found"}), 404
+    image_store.touch(filename)
+
+    if size == "thumb":
+        try:
+            path = image_store.thumbnail(filename)
+        except (OSError, ValueError):
+            return jsonify({"error": "Image not found"}), 404
+        return send_from_directory(
+            image_store.thumb_dir, os.path.basename(path),
+            etag=f"{entry['etag']}-thumb", max_age=IMAGE_CACHE_SECONDS
+        )
+    return send_from_directory(IMG_DIR, filename, etag=entry["etag"], max_age=IMAGE_CACHE_SECONDS)
+
+
+@app.route("/clips/<filename>")
+def serve_clip(filename):
+    """Serve alert clips stored in the db/clips folder."""
+    return send_from_directory(CLIP_DIR, filename, mimetype="video/x-msvideo")
+
+
+def camera_stat(key):
+    # Cameras nobody asked for yet have no stats to report
+    return lambda: [((stats["id"],), stats[key]) for stats in (capture_manager.stats() if capture_manager else [])]
 
 
-def capture_frames():
-    global latest_frame, cap
-    while True:
-        if not cap.isOpened():
-            cap = cv2.VideoCapture(RTSP_ADDRESS)
-            time.sleep(1)
-            continue
+def event_store_bytes():
+    return sum(
+        os.path.getsize(path)
+        for path in (event_store.path, event_store.path + "-wal")
+        if os.path.exists(path)
+    )
 
-        ret, frame = cap.read()
-        if not ret:
-            time.sleep(0.1)
-            continue
 
-        _, buffer = cv2.imencode('.jpg', frame)
-        with frame_lock:
-            latest_frame = buffer.tobytes()
+metrics.collector("camera_fps", "Frames per second read from each camera.", camera_stat("fps"), labelnames=("camera",))
+metrics.collector("camera_connected", "1 while the camera stream is open.", camera_stat("connected"), labelnames=("camera",))
+metrics.collector("camera_frames_total", "Frames read from each camera.", camera_stat("frames"), "counter", ("camera",))
+metrics.collector(
+    "camera_read_failures_total", "Failed frame reads per camera.", camera_stat("read_failures"), "counter", ("camera",)
+)
+metrics.collector(
+    "camera_reconnects_total", "Failed (re)connect attempts per camera.", camera_stat("reconnects"), "counter", ("camera",)
+)
+metrics.collector("camera_motion_active", "1 while the camera sees motion.", camera_stat("motion_active"), labelnames=("camera",))
+metrics.collector(
+    "camera_static_frames_total", "Frames without motion per camera.", camera_stat("static_frames"), "counter", ("camera",)
+)
+metrics.collector("mjpeg_viewers", "Open MJPEG streams per camera.", camera_stat("viewers"), labelnames=("camera",))
+metrics.collector("mjpeg_encodes_total", "JPEG encodes per camera.", camera_stat("encodes"), "counter", ("camera",))
+metrics.collector("snapshot_queue_depth", "Snapshots waiting to be written.", lambda: snapshot_writer.stats()["queued"])
+metrics.collector(
+    "snapshots_dropped_total", "Snapshots rejected because the queue was full.", lambda: snapshot_writer.dropped, "counter"
+)
+metrics.collector(
+    "event_appends_inline_total", "Event appends run on the socket handler because the snapshot queue was full.",
+    lambda: snapshot_writer.calls_rejected, "counter"
+)
+metrics.collector("snapshot_store_bytes", "Size of the snapshot directory, thumbnails excluded.", lambda: image_store.total_bytes)
+metrics.collector(
+    "snapshots_evicted_total", "Snapshots removed by the quota or age limit.", lambda: image_store.evicted, "counter"
+)
+metrics.collector("event_store_events", "Events in the suspicious pose log.", lambda: event_store.count())
+metrics.collector("event_store_bytes", "Size of the event database, WAL included.", event_store_bytes)
+metrics.collector(
+    "clips_dropped_total", "Alert clips rejected because the queue was full.", lambda: clip_recorder.dropped, "counter"
+)
+metrics.collector("open_episodes", "Alert episodes currently open.", lambda: len(episodes))
+metrics.collector("keypoint_clients", "Socket clients with a pose tracker.", lambda: len(pose_trackers) + len(multi_pose_trackers))
+metrics.collector(
+    "keypoint_frames_dropped_total", "Keypoint frames replaced by a newer one before detection.",
+    lambda: keypoint_inbox.stats()["dropped"], "counter"
+)
+metrics.collector(
+    "keypoint_frames_expired_total", "Keypoint frames too old to detect once a worker was free.",
+    lambda: keypoint_inbox.stats()["expired"], "counter"
+)
+metrics.collector("keypoint_streams_waiting", "Keypoint streams with a frame waiting for a worker.", lambda: keypoint_inbox.stats()["waiting"])
+metrics.collector(
+    "keypoint_target_interval_seconds", "Interval between frames currently advertised to clients.",
+    lambda: keypoint_inbox.target_interval()
+)
+
+
+def mjpeg_response(camera):
+    max_fps = request.args.get("fps", default=MJPEG_MAX_FPS, type=float)
+    max_fps = max(1.0, min(max_fps, 60.0))
+    from capture import DEFAULT_TIER
+    tier = request.args.get("tier", DEFAULT_TIER)
+    if tier not in camera.broadcaster.tiers:
+        return jsonify({"error": f"tier must be one of {', '.join(camera.broadcaster.tiers)}"}), 400
+
+    def counted(parts):
+        for part in parts:
+            mjpeg_bytes.inc(camera.camera_id, amount=len(part))
+            yield part
+
+    return Response(
+        counted(camera.broadcaster.stream(max_fps, tier)),
+        mimetype="multipart/x-mixed-replace; boundary=frame"
+    )
 
-threading.Thread(target=capture_frames, daemon=True).start()
 
 @app.route("/api/ipcam_stream")
 def ipcam_stream():
-    def gen():
-        while True:
-            with frame_lock:
-                if latest_frame is None:
-                    continue
-                frame = latest_frame
-            yield (
-                b'--frame\r\n'
-                b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n'
-            )
-    return Response(gen(), mimetype="multipart/x-mixed-replace; boundary=frame")
+    return mjpeg_response(get_camera(DEFAULT_CAMERA))
+
+
+@app.route("/api/cameras", methods=['GET'])
+def cameras():
+    return jsonify(get_capture_manager().stats()), 200
+
+
+@app.route("/api/cameras/<camera_id>/stream")
+def camera_stream(camera_id):
+    camera = get_camera(camera_id)
+    if camera is None:
+        return jsonify({"error": "Camera not found"}), 404
+    return mjpeg_response(camera)
+
+
+@app.route("/api/cameras/<camera_id>/snapshot")
+def camera_snapshot(camera_id):
+    camera = get_camera(camera_id)
+    if camera is None:
+        return jsonify({"error": "Camera not found"}), 404
+
+    from capture import DEFAULT_TIER
+    tier = request.args.get("tier", DEFAULT_TIER)
+    if tier not in camera.broadcaster.tiers:
+        return jsonify({"error": f"tier must be one of {', '.join(camera.broadcaster.tiers)}"}), 400
+
+    encoded = camera.broadcaster.encoded(tier)
+    if encoded is None:
+        return jsonify({"error": "No frame captured yet"}), 503
+
+    seq, jpeg, _ = encoded
+    response = Response(jpeg, mimetype="image/jpeg")
+    response.headers["Cache-Control"] = "no-store"
+    response.headers["X-Frame-Seq"] = str(seq)
+    response.headers["X-Motion-Active"] = "1" if camera.motion_active else "0"
+    response.headers["X-Motion-Score"] = str(round(camera.motion_score, 4))
+    return response
+
+
+@app.route("/api/cameras/<camera_id>/motion")
+def camera_motion(camera_id):
+    camera = get_camera(camera_id)
+    if camera is None:
+        return jsonify({"error": "Camera not found"}), 404
+    return jsonify(analysis_hint(camera)), 200
+
 
 @app.route('/api/login', methods=['POST'])
 def login():
@@ -157,6 +468,7 @@ def login():
     if not data or "password" not in data:
         return jsonify({'success': False, 'error': 'Missing password'}), 400
 
+    import bcrypt
     input_pw = data["password"]
     creds = load_credentials()
     hashed_password = creds[0]["password"].strip().encode('utf-8')
@@ -169,6 +481,7 @@ def login():
 
 @app.route('/api/change-password', methods=['POST'])
 def change_password():
+    import bcrypt
     creds = load_credentials()
     data = request.get_json()
 
@@ -226,13 +539,11 @@ def email():
 
 @app.route('/api/latest', methods=['GET'])
 def latest():
-    suspicious_poses = load_db('suspicious_poses.json', default=[])
+    last_event = event_store.latest()
 
-    if not suspicious_poses:
+    if not last_event:
         return jsonify({"message": "no suspicious_poses yet"}), 200
 
-    last_event = suspicious_poses[-1]
-
     filtered_event = {
         "timestamp": last_event.get("timestamp", ""),
         "pose": last_event.get("pose", ""),
@@ -243,15 +554,219 @@ def latest():
     return jsonify(filtered_event), 200
 
 
-@app.route('/api/suspicious_poses', methods=['GET', 'POST', 'DELETE'])
-def suspicious_poses_handler():
-    filepath = os.path.join(DB_DIR, 'suspicious_poses.json')
+# Latest possible value of each timestamp position, to complete truncated ends
+LAST_TIMESTAMP = "9999-12-31 23:59:59"
+EVENT_FILTER_KEYS = ("pose", "status", "start", "end", "min_confidence", "max_confidence")
+
+
+def event_filters(args):
+    """
+    Parse the event filter query parameters; raises ValueError on bad input.
+    A truncated end ("YYYY-MM-DD", "YYYY-MM-DD HH", ...) includes the whole
+    day, hour or minute it names.
+    """
+    end = args.get("end")
+    if end and len(end) < len(LAST_TIMESTAMP):
+        end += LAST_TIMESTAMP[len(end):]
+    filters = {
+        "pose": args.getlist("pose") or None,
+        "status": [s.lower() for s in args.getlist("status")] or None,
+        "start": args.get("start"),
+        "end": end
+    }
+    for key in ("min_confidence", "max_confidence"):
+        filters[key] = args.get(key, type=float)
+        if key in args and filters[key] is None:
+            raise ValueError(f"{key} must be a number")
+    return filters
+
+
+def list_suspicious_poses():
+    version = event_store.version()
+    etag = str(version)
+
+    # Nothing changed since the client's copy: skip the query entirely
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        try:
+            filters = event_filters(request.args)
+            limit = request.args.get("limit", type=int)
+            after_id = request.args.get("after_id", type=int)
+            since = request.args.get("since", type=int)
+            for key, value in (("limit", limit), ("after_id", after_id), ("since", since)):
+                if key in request.args and value is None:
+                    raise ValueError(f"{key} must be an integer")
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        if limit is not None:
+            limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+        events = event_store.query(after_id=after_id, since=since, limit=limit, **filters)
+
+        if since is None:
+            response = jsonify(events)
+        else:
+            deleted = event_store.deleted_since(since)
+            response = jsonify({
+                "version": version,
+                "events": events,
+                "deleted": deleted or [],
+                "reset": deleted is None
+            })
+
+        if limit is not None and len(events) == limit:
+            response.headers["X-Next-After-Id"] = str(events[-1]["id"])
+
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Events-Version"] = str(version)
+    return response
+
+
+def pivot(rows, key):
+    """[{bucket, status, count}] -> [{key: bucket, total, statuses: {status: count}}]."""
+    out = {}
+    for row in rows:
+        entry = out.setdefault(row["bucket"], {key: row["bucket"], "total": 0, "statuses": {}})
+        entry["total"] += row["count"]
+        entry["statuses"][row["status"]] = row["count"]
+    return list(out.values())
+
+
+@app.route('/api/stats', methods=['GET'])
+def stats():
+    """
+    Chart aggregates from the incrementally maintained rollups. Optional
+    from/to ("YYYY-MM-DD" or "YYYY-MM-DD HH") bound the day and hour series.
+    """
+    version = event_store.version()
+    etag = f"stats-{version}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        start = request.args.get("from")
+        end = request.args.get("to")
+        hour_end = end if end is None or len(end) > 10 else f"{end} 23"
+
+        by_pose = event_store.rollup("all", ("pose",))
+        confidence = event_store.rollup("confidence", ("bucket", "pose"))
+        buckets = list(range(0, 100, CONFIDENCE_BUCKET))
+        histograms = {}
+        for row in confidence:
+            if row["bucket"] != "":
+                counts = histograms.setdefault(row["pose"], [0] * len(buckets))
+                counts[int(row["bucket"]) // CONFIDENCE_BUCKET] += row["count"]
+
+        response = jsonify({
+            "version": version,
+            "total": sum(row["count"] for row in by_pose),
+            "by_pose": sorted(by_pose, key=lambda row: -row["count"]),
+            "by_status": event_store.rollup("all", ("status",)),
+            "by_pose_status": event_store.rollup("all", ("pose", "status")),
+            "by_day": pivot(event_store.rollup("day", ("bucket", "status"), start, end), "day"),
+            "by_hour": pivot(event_store.rollup("hour", ("bucket", "status"), start, hour_end), "hour"),
+            "by_camera": [
+                {"camera": row["bucket"] or None, "count": row["count"]}
+                for row in event_store.rollup("camera")
+            ],
+            "confidence": {
+                "bucket_size": CONFIDENCE_BUCKET,
+                "buckets": buckets,
+                "all": [sum(counts[i] for counts in histograms.values()) for i in range(len(buckets))],
+                "by_pose": histograms
+            }
+        })
+
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+@app.route('/api/recent', methods=['GET'])
+def recent():
+    limit = request.args.get("limit", default=10, type=int)
+    limit = max(1, min(limit, RECENT_CACHE_SIZE))
+    return jsonify(event_store.recent(limit)), 200
+
+
+def bulk_selection(data):
+    """
+    (ids, filters) from a bulk request body with any of "ids": [1, 2, ...],
+    "filter": {the GET filter parameters} and "older_than_days": n; only
+    events matching all of them are affected. Raises ValueError on bad input.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("expected a JSON object")
+    if not any(key in data for key in ("ids", "filter", "older_than_days")):
+        raise ValueError("give ids, filter or older_than_days")
+
+    ids = data.get("ids")
+    if ids is not None and (
+        not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids)
+    ):
+        raise ValueError("ids must be a list of integers")
+
+    selector = data.get("filter", {})
+    if not isinstance(selector, dict):
+        raise ValueError("filter must be an object")
+    unknown = set(selector) - set(EVENT_FILTER_KEYS)
+    if unknown:
+        raise ValueError(f"unknown filter {', '.join(sorted(unknown))}")
+    filters = event_filters(MultiDict([
+        (key, value)
+        for key, values in selector.items()
+        for value in (values if isinstance(values, list) else [values])
+    ]))
+
+    if "older_than_days" in data:
+        days = data["older_than_days"]
+        if not isinstance(days, (int, float)) or isinstance(days, bool) or days < 0:
+            raise ValueError("older_than_days must be a non-negative number")
+        cutoff = format_time(time.time() - days * 86400)
+        filters["end"] = min(filters["end"] or cutoff, cutoff)
+
+    # An empty filter ({}, {"pose": []}) would select every event; that is
+    # what DELETE ?all=1 is for
+    if ids is None and all(value is None for value in filters.values()):
+        raise ValueError("the selection matches every event")
+    return ids, filters
+
+
+def bulk_body():
+    """The request's JSON body regardless of Content-Type; None if malformed."""
+    return request.get_json(force=True, silent=True)
+
+
+def bulk_update():
+    data = bulk_body()
+    try:
+        ids, filters = bulk_selection(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    status = data.get("status")
+    if not isinstance(status, str) or not status.strip():
+        return jsonify({"error": "status must be a non-empty string"}), 400
+
+    updated = event_store.update_many({"status": status.lower()}, ids, **filters)
+    return jsonify({"updated": updated, "version": event_store.version()}), 200
+
+
+def bulk_delete(data):
+    try:
+        ids, filters = bulk_selection(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    deleted = event_store.delete_many(ids, **filters)
+    return jsonify({"deleted": deleted, "version": event_store.version()}), 200
 
+
+@app.route('/api/suspicious_poses', methods=['GET', 'POST', 'PATCH', 'DELETE'])
+def suspicious_poses_handler():
     if request.method == 'GET':
-        db = load_db('suspicious_poses.json', default=[])
-        for idx, event in enumerate(db):
-            event['id'] = idx
-        return jsonify(db), 200
+        return list_suspicious_poses()
 
     if request.method == 'POST':
         new_suspect = request.get_json()
@@ -261,77 +776,156 @@ def suspicious_poses_handler():
             return jsonify({"error": "Missing required keys"}), 400
 
         new_suspect['status'] = new_suspect['status'].lower()
-        db = load_db('suspicious_poses.json', default=[])
-        db.append(new_suspect)
-        save_db(filepath, db)
+        new_suspect = event_store.append(new_suspect)
         return jsonify(new_suspect), 201
 
+    if request.method == 'PATCH':
+        return bulk_update()
+
     if request.method == 'DELETE':
-        save_db(filepath, [])
+        # A body selects events to delete; clearing the log has to be asked
+        # for explicitly, so a body that fails to parse never wipes it
+        if request.get_data():
+            data = bulk_body()
+            if data is None:
+                return jsonify({"error": "body is not valid JSON"}), 400
+            return bulk_delete(data)
+        if request.args.get("all") != "1":
+            return jsonify({"error": "give a selection body, or ?all=1 to delete everything"}), 400
+        event_store.clear()
         return jsonify({"success": True, "message": "All logs deleted"}), 200
 
 
-@app.route('/api/suspicious_poses/<int:event_idx>', methods=['PATCH', 'DELETE'])
-def update_event(event_idx):
-    db = load_db('suspicious_poses.json', default=[])
-
-    if event_idx < 0 or event_idx >= len(db):
-        return jsonify({"error": "Event not found"}), 404
-
+@app.route('/api/suspicious_poses/<int:event_id>', methods=['PATCH', 'DELETE'])
+def update_event(event_id):
     if request.method == 'PATCH':
         data = request.get_json()
 
         if "status" in data:
-            db[event_idx]["status"] = data["status"].lower()
-            save_db(os.path.join(DB_DIR, 'suspicious_poses.json'), db)
-            return jsonify(db[event_idx]), 200
+            updated = event_store.update(event_id, {"status": data["status"].lower()})
+            if updated is None:
+                return jsonify({"error": "Event not found"}), 404
+            return jsonify(updated), 200
+
+        if event_store.get(event_id) is None:
+            return jsonify({"error": "Event not found"}), 404
 
     elif request.method == 'DELETE':
-        deleted = db.pop(event_idx)
-        save_db(os.path.join(DB_DIR, 'suspicious_poses.json'), db)
+        deleted = event_store.delete(event_id)
+        if deleted is None:
+            return jsonify({"error": "Event not found"}), 404
         return jsonify(deleted), 200
 
     return jsonify({"error": "No valid fields to update"}), 400
 
 
-@app.route("/api/export", methods=['GET'])
-def export_data():
-    db = load_db('suspicious_poses.json')
+EXPORT_HEADERS = ["ID", "Timestamp", "Pose", "Confidence", "Status"]
+EXPORT_WIDTH_SAMPLE = 1000
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+EXPORT_FORMATS = {
+    "xlsx": ("suspicious_poses.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv": ("suspicious_poses.csv", "text/csv"),
+    "ndjson": ("suspicious_poses.ndjson", "application/x-ndjson")
+}
+
+
+def export_row(log):
+    return [
+        log['id'],
+        log.get('timestamp', 'N/A'),
+        log.get('pose', 'N/A'),
+        log.get('confidence', 'N/A'),
+        log.get('status', 'N/A'),
+    ]
+
+
+def export_csv(events):
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_HEADERS)
+    for log in events:
+        writer.writerow(export_row(log))
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_ndjson(events):
+    lines = []
+    size = 0
+    for log in events:
+        line = json.dumps(log) + "\n"
+        lines.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_SIZE:
+            yield "".join(lines)
+            lines, size = [], 0
+    yield "".join(lines)
+
+
+def export_xlsx(events):
+    # Write-only workbooks stream rows to a temp file instead of keeping cells
+    # in memory; column widths have to be set before the first row, so they
+    # come from a sampled prefix of the export.
+    import openpyxl
+    from openpyxl.cell import WriteOnlyCell
+
+    sample = list(itertools.islice(events, EXPORT_WIDTH_SAMPLE))
+    rows = (export_row(log) for log in itertools.chain(sample, events))
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Suspicious Poses")
+
+    widths = [len(h) for h in EXPORT_HEADERS]
+    for log in sample:
+        widths = [max(w, len(str(v))) for w, v in zip(widths, export_row(log))]
+    for col, width in enumerate(widths, start=1):
+        ws.column_dimensions[openpyxl.utils.get_column_letter(col)].width = width + 2
+
+    header = []
+    for title in EXPORT_HEADERS:
+        cell = WriteOnlyCell(ws, value=title)
+        cell.font = openpyxl.styles.Font(bold=True)
+        cell.alignment = openpyxl.styles.Alignment(horizontal="center")
+        header.append(cell)
+    ws.append(header)
 
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Suspicious Poses"
+    for row in rows:
+        ws.append(row)
 
-    headers = ["ID", "Timestamp", "Pose", "Confidence", "Status"]
-    ws.append(headers)
+    with tempfile.TemporaryFile() as output:
+        wb.save(output)
+        output.seek(0)
+        while True:
+            chunk = output.read(EXPORT_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
 
-    for col in range(1, len(headers) + 1):
-        cell = ws.cell(row=1, column=col)
-        cell.font = openpyxl.styles.Font(bold=True)
-        cell.alignment = openpyxl.styles.Alignment(horizontal="center")
 
-    for idx, log in enumerate(db):
-        ws.append([
-            idx,
-            log.get('timestamp', 'N/A'),
-            log.get('pose', 'N/A'),
-            log.get('confidence', 'N/A'),
-            log.get('status', 'N/A'),
-        ])
-
-    for column_cells in ws.columns:
-        length = max(len(str(cell.value)) if cell.value is not None else 0 for cell in column_cells)
-        ws.column_dimensions[column_cells[0].column_letter].width = length + 2
-
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-
-    return send_file(
-        output,
-        as_attachment=True,
-        download_name="suspicious_poses.xlsx",
-        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+@app.route("/api/export", methods=['GET'])
+def export_data():
+    export_format = request.args.get("format", "xlsx").lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+
+    try:
+        filters = event_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    events = event_store.iter_events(**filters)
+    writer = {"xlsx": export_xlsx, "csv": export_csv, "ndjson": export_ndjson}[export_format]
+    download_name, mimetype = EXPORT_FORMATS[export_format]
+
+    # No Content-Length: the body goes out chunked as rows are read
+    return Response(
+        stream_with_context(writer(events)),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={download_name}"}
     )
 
 
@@ -339,76 +933,348 @@ def export_data():
 @socketio.on("join")
 def handle_join(room_name):
     join_room(room_name)
+    # Camera rooms receive motion changes; send the current state right away
+    if isinstance(room_name, str) and room_name.startswith("camera:"):
+        camera = capture_manager.get(room_name[len("camera:"):]) if capture_manager else None
+        if camera is not None:
+            emit("motion", analysis_hint(camera))
+
+
+@socketio.on("disconnect")
+def handle_disconnect(*args):
+    keypoint_events.remove(request.sid)
+    # Streams with a stream_id are keyed "sid/stream_id"
+    for registry in (pose_trackers, multi_pose_trackers):
+        for key in registry.keys():
+            if key == request.sid or key.startswith(request.sid + "/"):
+                registry.pop(key)
+    for key in keypoint_inbox.keys():
+        if key == request.sid or key.startswith(request.sid + "/"):
+            keypoint_inbox.remove(key)
+
+
+def decode_keypoints(payload, channels=None):
+    """
+    (N, 17, 2) float array from a keypoints payload: nested [[x, y], ...]
+    lists, or packed little-endian float32 bytes with `channels` values per
+    keypoint (x, y or x, y, score). Binary payloads are read in place.
+    NaN or infinite coordinates are rejected; they would stay in a tracker's
+    smoothed state for good.
+    """
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        if len(payload) % 4:
+            raise ValueError("binary keypoints must be float32")
+        values = np.frombuffer(payload, dtype='<f4')
+        if channels is None:
+            # A single frame is unambiguous; batches must say
+            channels = {34: 2, 51: 3}.get(values.size)
+        if channels not in (2, 3) or values.size == 0 or values.size % (17 * channels):
+            raise ValueError("expected 17x2 or 17x3 float32 values per frame")
+        kp = values.reshape(-1, 17, channels)[:, :, :2]
+    else:
+        kp = np.array(payload, dtype=float)
+        if kp.ndim == 2:
+            kp = kp[None]
+        if kp.ndim != 3 or kp.shape[0] == 0 or kp.shape[1] != 17 or kp.shape[2] not in (2, 3):
+            raise ValueError("expected 17 keypoints of shape (17,2)")
+        kp = kp[:, :, :2]
+
+    if not np.isfinite(kp).all():
+        raise ValueError("keypoints must be finite numbers")
+    return kp
 
 
 @socketio.on("keypoints")
 def handle_keypoints(data):
+    """
+    Single frame: {"keypoints": [[x, y], ...] or float32 bytes}, or the bytes
+    on their own. Batch: {"batch": frames, "channels": 2|3, "timestamps": [...]}
+    with several consecutive frames of one stream, answered by one
+    "pose_batch" event. Multi-person: {"poses": M poses of one frame,
+    "channels": 2|3}, answered by a "poses" event with one result per
+    person carrying a track_id that is stable across frames.
+
+    Detection runs on the keypoint worker pool. A stream that sends faster
+    than it is served has its older frames dropped unanswered; the
+    "keypoint_rate" event tells the client how often to send instead.
+    """
+    if isinstance(data, (bytes, bytearray)):
+        data = {"keypoints": data}
+    if not isinstance(data, dict):
+        emit("pose", {"error": "invalid keypoints", "detail": "expected an object or float32 bytes"})
+        return
+
+    batched = "batch" in data
+    multi = "poses" in data
     try:
-        kp = np.array(data["keypoints"], dtype=float)
-        if kp.shape != (17, 2):
-            emit("pose", {"error": "expected 17 keypoints of shape (17,2)"})
-            return
+        if multi and len(data["poses"]) == 0:
+            # Nobody in frame; still ages the stream's tracks
+            frames = np.empty((0, 17, 2))
+        elif multi:
+            frames = decode_keypoints(data["poses"], data.get("channels"))
+        else:
+            frames = decode_keypoints(data["batch"] if batched else data["keypoints"], data.get("channels"))
+            if not batched and len(frames) != 1:
+                raise ValueError("expected 17 keypoints of shape (17,2)")
     except Exception as e:
-        emit("pose", {"error": "invalid keypoints", "detail": str(e)})
+        emit("poses" if multi else "pose", {"error": "invalid keypoints", "detail": str(e)})
         return
 
-    result = detect_action(kp)
-    emit("pose", result)
+    # One motion history per client, or per camera when the client sends several
+    stream_id = data.get("stream_id")
+    key = request.sid if stream_id is None else f"{request.sid}/{stream_id}"
+    keypoint_events.inc(request.sid, amount=len(frames))
 
+    kind = "multi" if multi else "batch" if batched else "single"
+    stamp = data.get("timestamps" if batched else "timestamp")
+    keypoint_inbox.submit(key, (request.sid, kind, frames, stamp))
+
+
+def process_keypoints(key, item, skipped):
+    """Run on a keypoint worker; skipped frames widen the motion interval."""
+    sid, kind, frames, stamp = item
+    start = time.perf_counter()
+    if kind == "multi":
+        result = multi_pose_trackers.get(key).detect(frames, delta_time=1.0 + skipped)
+        detect_latency.observe(time.perf_counter() - start, kind)
+        socketio.emit("poses", {"tracks": result, "timestamp": stamp}, to=sid)
+        return
+
+    tracker = pose_trackers.get(key)
+    if kind == "batch":
+        result = tracker.detect_sequence(frames)
+        detect_latency.observe(time.perf_counter() - start, kind)
+        socketio.emit("pose_batch", {"results": result, "timestamps": stamp}, to=sid)
+    else:
+        result = tracker.detect(frames[0], delta_time=1.0 + skipped)
+        detect_latency.observe(time.perf_counter() - start, kind)
+        socketio.emit("pose", result, to=sid)
 
-@socketio.on("high_confidence_pose")
-def handle_high_conf_pose(data):
-    pose = data.get("pose", "unknown")
-    confidence = data.get("confidence", 0)
-    snapshot_b64 = data.get("snapshot")
 
-    now = time.time()
-    last_time = last_saved_time.get(pose, 0)
+def advertise_keypoint_rate(key, rate):
+    sid, _, stream_id = key.partition("/")
+    socketio.emit("keypoint_rate", dict(rate, stream_id=stream_id or None), to=sid)
 
-    if now - last_time < SNAPSHOT_COOLDOWN:
-        emit("pose", {"status": "cooldown", "pose": pose})
+
+def format_time(seconds):
+    return datetime.datetime.fromtimestamp(seconds).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def close_episode(episode):
+    """Final update of an episode's event: end time, peak confidence, sample count."""
+    episode.closed = True
+    if episode.event_id is None:
+        # Not logged yet; log_episode() finishes it once it is
         return
+    event_store.update(episode.event_id, {
+        "confidence": int(round(episode.peak * 100)),
+        "end": format_time(episode.end),
+        "duration_s": round(episode.duration(), 1),
+        "samples": episode.samples
+    })
+
+
+def save_episode_image(episode, snapshot_b64, confidence):
+    """
+    Queue a snapshot as the episode's image if it is the best one so far.
+    Every improvement overwrites the same file, so an episode has one image.
+    Returns the filename, or None if nothing was queued.
+    """
+    if not episodes.claim_image(episode, confidence):
+        return None
+
+    if episode.image is None:
+        # Episodes are per (stream, pose): the stream's hash keeps two cameras
+        # alerting on the same pose in the same second apart
+        stream = hashlib.blake2b(str(episode.stream).encode(), digest_size=4).hexdigest()
+        episode.image = (
+            f"{episode.pose}_{int(confidence*100)}_{int(episode.start)}_{stream}{snapshot_writer.extension}"
+        )
+
+    def on_done(saved):
+        if saved:
+            episode.image_written = True
+            if link_episode_image(episode):
+                announce_event(episode)
+
+    if not snapshot_writer.submit(snapshot_b64, episode.image, on_done=on_done):
+        # Let a later snapshot of this episode have another go
+        episodes.release_image(episode, confidence)
+        return None
+    return episode.image
+
+
+def link_episode_image(episode):
+    """Point the episode's event at its image once both the event and the file exist; True if it did."""
+    if episode.image_written and not episode.image_saved and episode.event_id is not None:
+        episode.image_saved = True
+        event_store.update(episode.event_id, {"image-path": episode.image})
+        return True
+    return False
+
+
+def announce_event(episode):
+    """
+    Tell dashboards an episode's event is stored. "image-path" is only set
+    once the image can be served; alerts go out before either exists.
+    """
+    socketio.emit("event_logged", {
+        "id": episode.event_id,
+        "version": event_store.version(),
+        "timestamp": format_time(episode.start),
+        "image-path": episode.image if episode.image_saved else None
+    })
+
+
+def log_episode(episode, entry, stream_id, event_time):
+    """Append an opened episode's event, then everything that was waiting for its id."""
+    episode.event_id = log_suspicious_pose(**entry)["id"]
+    link_episode_image(episode)
+    record_clip(episode, stream_id, event_time)
+    if episode.closed:
+        close_episode(episode)
+    announce_event(episode)
+
+
+def record_clip(episode, stream_id, event_time=None):
+    """Queue a pre/post-event clip from the alerting camera (the default one unless stream_id names a camera)."""
+    # Only a running camera has frames buffered; never start one for a clip
+    if capture_manager is None:
+        return
+    camera = capture_manager.get(stream_id) or capture_manager.get(DEFAULT_CAMERA)
+    if camera is None or camera.clip_buffer is None or not len(camera.clip_buffer):
+        return
+    event_id = episode.event_id
 
-    last_saved_time[pose] = now
+    def on_done(saved):
+        if saved:
+            event_store.update(event_id, {"clip-path": saved})
 
-    filename = None
-    image_path = None
+    clip_recorder.submit(
+        camera.clip_buffer, f"{episode.pose}_{int(episode.start)}_{event_id}.avi", on_done, event_time
+    )
 
-    if snapshot_b64:
-        try:
-            if "," in snapshot_b64:
-                _, snapshot_b64 = snapshot_b64.split(",", 1)
-            img_data = base64.b64decode(snapshot_b64)
-            filename = f"{pose}_{int(confidence*100)}_{int(time.time())}.png"
-            filepath = os.path.join(IMG_DIR, filename)
-            with open(filepath, "wb") as f:
-                f.write(img_data)
 
-            image_path = os.path.join("db", "imgs", filename)
-        except Exception as e:
-            emit("pose", {"error": f"Failed to save snapshot: {e}"})
-            return
+@socketio.on("high_confidence_pose")
+def handle_high_conf_pose(data):
+    pose = data.get("pose", "unknown")
+    confidence = data.get("confidence", 0)
+    snapshot_b64 = data.get("snapshot")
+    stream_id = data.get("stream_id")
 
-    log_suspicious_pose(pose, confidence * 100, snapshot_filename=filename)
+    # Clients naming their camera share its episodes; otherwise one per client
+    episode, status = episodes.observe(request.sid if stream_id is None else stream_id, pose, confidence)
+    if episode is None:
+        emit("pose", {"status": status, "pose": pose})
+        return
 
-    emit("pose", {"status": "saved", "pose": pose, "confidence": int(confidence*100)})
+    event_time = time.monotonic()
+    if snapshot_b64:
+        save_episode_image(episode, snapshot_b64, confidence)
 
-    emit("alert", {
+    # Replies go out before anything touches the disk; a new episode's
+    # event_id is None here, and it and the image path arrive with
+    # "event_logged" once they exist
+    emit("pose", {
+        "status": status,
         "pose": pose,
-        "confidence": confidence,
-        "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "image-path": filename
-    }, broadcast=True)
-
+        "confidence": int(confidence*100),
+        "event_id": episode.event_id
+    })
+
+    # One broadcast per episode rather than one per sample
+    if status == "opened":
+        emit("alert", {
+            "id": episode.event_id,
+            "pose": pose,
+            "confidence": confidence,
+            "timestamp": format_time(episode.start),
+            # Not servable yet; "event_logged" carries it once it is
+            "image-path": None
+        }, broadcast=True)
+
+        extra = {"start": format_time(episode.start), "end": format_time(episode.end), "samples": 1}
+        if stream_id is not None:
+            extra["stream_id"] = stream_id
+        entry = {"pose": pose, "conf": confidence * 100, "timestamp": format_time(episode.start), "extra": extra}
+        # Appended on the snapshot writer's thread; only a saturated writer
+        # puts the store write back on this one
+        if not snapshot_writer.call(lambda: log_episode(episode, entry, stream_id, event_time)):
+            log_episode(episode, entry, stream_id, event_time)
+
+
+def create_app(db_dir=None, img_dir=None, clip_dir=None, cred_dir=None):
+    """
+    Open the stores and start the background workers; safe to call more than
+    once. Cameras stay closed until start_capture() or the first request.
+    The directories default to the ones under db/; benchmarks and tests pass
+    their own so the real log and snapshots are never opened.
+    """
+    global event_store, image_store, snapshot_writer, clip_recorder, episodes, keypoint_inbox
+    global DB_DIR, IMG_DIR, CLIP_DIR, CRED_DIR, EMAILS_DIR
+    dirs = {"DB_DIR": db_dir, "IMG_DIR": img_dir, "CLIP_DIR": clip_dir, "CRED_DIR": cred_dir}
+    with _setup_lock:
+        if event_store is not None:
+            if any(path is not None and path != globals()[name] for name, path in dirs.items()):
+                raise RuntimeError("create_app() already ran with other directories")
+            return app
+        DB_DIR = db_dir or DB_DIR
+        IMG_DIR = img_dir or IMG_DIR
+        CLIP_DIR = clip_dir or CLIP_DIR
+        if cred_dir is not None:
+            CRED_DIR = EMAILS_DIR = cred_dir
+        for directory in (DB_DIR, CRED_DIR, IMG_DIR, CLIP_DIR):
+            os.makedirs(directory, exist_ok=True)
+
+        # Suspicious pose log; imports the old suspicious_poses.json on first start
+        event_store = EventStore(
+            os.path.join(DB_DIR, 'suspicious_poses.db'),
+            legacy_json=os.path.join(DB_DIR, 'suspicious_poses.json')
+        )
+        image_store = ImageStore(
+            IMG_DIR, os.path.join(DB_DIR, 'images.db'), IMAGE_QUOTA_MB * 1024 * 1024,
+            IMAGE_MAX_AGE_DAYS * 86400, THUMBNAIL_HEIGHT,
+            protect=lambda names: event_store.images_with_status(names, "unreviewed")
+        )
+        image_store.start()
+        snapshot_writer = SnapshotWriter(
+            IMG_DIR, SNAPSHOT_FORMAT, SNAPSHOT_QUALITY, SNAPSHOT_QUEUE_SIZE,
+            on_write=lambda seconds, ok: snapshot_latency.observe(seconds, "ok" if ok else "failed"),
+            image_store=image_store
+        )
+        clip_recorder = ClipRecorder(CLIP_DIR, CLIP_PRE_SECONDS, CLIP_POST_SECONDS, CLIP_QUEUE_SIZE)
+        keypoint_inbox = LatestInbox(
+            process_keypoints, KEYPOINT_WORKERS, KEYPOINT_MAX_AGE,
+            KEYPOINT_MIN_INTERVAL_MS / 1000, KEYPOINT_MAX_INTERVAL_MS / 1000,
+            on_rate=advertise_keypoint_rate,
+            max_clients=MAX_POSE_TRACKERS, idle_timeout=POSE_TRACKER_IDLE_TIMEOUT
+        )
+        episodes = EpisodeEngine(
+            open_threshold=HIGH_CONFIDENCE_THRESHOLD,
+            close_threshold=EPISODE_CLOSE_THRESHOLD,
+            close_after=EPISODE_CLOSE_AFTER,
+            max_duration=EPISODE_MAX_DURATION,
+            max_open=MAX_OPEN_EPISODES,
+            on_close=close_episode
+        )
+        episodes.start()
+    return app
 
 
 if __name__ == "__main__":
-    creds = load_credentials()
+    # With the reloader on, the watching parent only restarts the child that
+    # actually serves; it should neither hash credentials nor open cameras
+    if not DEBUG or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        import bcrypt
+        create_app()
+        creds = load_credentials()
+
+        if not creds[0]["password"].startswith("$2b$"):
+            hashed_password = bcrypt.hashpw(creds[0]["password"].encode("utf-8"), bcrypt.gensalt())
+            creds[0]["password"] = hashed_password.decode("utf-8")
+            save_credentials(creds)
 
-    if not creds[0]["password"].startswith("$2b$"):
-        hashed_password = bcrypt.hashpw(creds[0]["password"].encode("utf-8"), bcrypt.gensalt())
-        creds[0]["password"] = hashed_password.decode("utf-8")
-        save_credentials(creds)
+        start_capture()
 
     print("Running WebSocket Pose server on ws://localhost:5000 (threading mode)")
-    socketio.run(app, host="0.0.0.0", port=5000, debug=True)
+    socketio.run(app, host="0.0.0.0", port=5000, debug=DEBUG)
@@ -0,0 +1,452 @@
+"""
+Benchmarks for the detector, the event store, the HTTP endpoints, the
+keypoints/high_confidence_pose socket events and api.py's startup time.
+
+    python bench.py                          # everything, default sizes
+    python bench.py --only detector,store --sizes 1000,100000
+    python bench.py --keypoints recorded.npy --out results.json
+    python bench.py --only socket --url http://localhost:5000 --cameras 32
+    python bench.py --only startup --repeat 10
+
+Results are written as JSON (stdout, or --out) so runs from different
+versions can be diffed. The store and endpoint benchmarks run against a
+throwaway database in a temp directory, never the real log.
+"""
+import argparse
+import base64
+import datetime
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from detector import MultiPoseTracker, PoseTracker, detect_action, detect_action_batch, detect_sequence
+from store import EventStore
+
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000)
+POSES = ("left_punch", "right_punch", "left_kick", "right_kick", "lying", "firearm")
+STATUSES = ("unreviewed", "reviewed", "dismissed")
+
+# 1x1 PNG used as the snapshot in high_confidence_pose events
+SNAPSHOT_PNG = "data:image/png;base64," + base64.b64encode(bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360606060000000050001a5f645400000000049454e44ae426082"
+)).decode("ascii")
+
+
+def summarize(samples):
+    """Latency stats in microseconds from a list of durations in seconds."""
+    us = np.asarray(samples) * 1e6
+    return {
+        "n": len(us),
+        "mean_us": round(float(us.mean()), 2),
+        "p50_us": round(float(np.percentile(us, 50)), 2),
+        "p95_us": round(float(np.percentile(us, 95)), 2),
+        "p99_us": round(float(np.percentile(us, 99)), 2),
+        "min_us": round(float(us.min()), 2)
+    }
+
+
+def measure(fn, repeat, warmup=10):
+    for _ in range(min(warmup, repeat)):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+# ---------------------------
+# Inputs
+# ---------------------------
+def synthetic_keypoints(frames, people=1, seed=0):
+    """(frames, people, 17, 2) random-walk poses in a 1280x720 image."""
+    rng = np.random.default_rng(seed)
+    origin = rng.uniform((200, 100), (1080, 500), (people, 1, 2))
+    skeleton = rng.uniform(-80, 80, (people, 17, 2))
+    drift = np.cumsum(rng.normal(0, 4, (frames, people, 17, 2)), axis=0)
+    return origin + skeleton + drift
+
+
+def load_keypoints(path):
+    """(frames, 17, 2) from a .npy/.npz (key "keypoints") or JSON/NDJSON file."""
+    if path.endswith(".npy"):
+        kp = np.load(path)
+    elif path.endswith(".npz"):
+        kp = np.load(path)["keypoints"]
+    else:
+        with open(path) as f:
+            if path.endswith(".ndjson"):
+                frames = [json.loads(line) for line in f if line.strip()]
+                frames = [frame.get("keypoints", frame) if isinstance(frame, dict) else frame for frame in frames]
+            else:
+                frames = json.load(f)
+        kp = np.array(frames, dtype=float)
+    if kp.ndim != 3 or kp.shape[1:] not in ((17, 2), (17, 3)):
+        raise ValueError(f"{path}: expected frames of 17 keypoints, got shape {kp.shape}")
+    return kp[:, :, :2]
+
+
+def random_events(n, seed=0):
+    rng = np.random.default_rng(seed)
+    start = datetime.datetime(2024, 1, 1)
+    seconds = np.sort(rng.integers(0, 365 * 86400, n))
+    poses = rng.integers(0, len(POSES), n)
+    statuses = rng.integers(0, len(STATUSES), n)
+    confidences = rng.integers(50, 100, n)
+    for i in range(n):
+        yield {
+            "timestamp": (start + datetime.timedelta(seconds=int(seconds[i]))).strftime("%Y-%m-%d %H:%M:%S"),
+            "pose": POSES[poses[i]],
+            "confidence": int(confidences[i]),
+            "status": STATUSES[statuses[i]],
+            "image-path": f"{POSES[poses[i]]}_{int(confidences[i])}_{i}.png"
+        }
+
+
+def fill_store(store, n):
+    """Bulk-load n events in one transaction (appending one by one at 1M would take hours)."""
+    conn = store._conn()
+    with store._write_lock:
+        with conn:
+            conn.executemany(
+                "INSERT INTO events (timestamp, pose, confidence, status, image_path, extra) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (store._to_row(event) for event in random_events(n))
+            )
+        store.cache.invalidate()
+
+
+def bench_app(workdir):
+    """The api module, set up on directories under workdir instead of db/."""
+    import api
+
+    api.create_app(*(os.path.join(workdir, name) for name in ("logs", "imgs", "clips", "credentials")))
+    return api
+
+
+# ---------------------------
+# Benchmarks
+# ---------------------------
+def bench_detector(frames, repeat):
+    kp = frames[:, 0] if frames.ndim == 4 else frames
+    n = len(kp)
+    results = {"frames": n}
+
+    tracker = PoseTracker()
+    i = itertools.count()
+    results["detect_action"] = measure(lambda: detect_action(kp[next(i) % n], tracker=tracker), repeat)
+
+    start = time.perf_counter()
+    detect_sequence(kp)
+    elapsed = time.perf_counter() - start
+    results["detect_sequence"] = {
+        "frames": n,
+        "total_ms": round(elapsed * 1000, 2),
+        "per_frame_us": round(elapsed / n * 1e6, 2),
+        "frames_per_s": round(n / elapsed, 1)
+    }
+
+    last = np.roll(kp[:, [9, 10, 15, 16]], 1, axis=0)
+    start = time.perf_counter()
+    detect_action_batch(kp, last)
+    elapsed = time.perf_counter() - start
+    results["detect_action_batch"] = {
+        "poses": n,
+        "total_ms": round(elapsed * 1000, 2),
+        "per_pose_us": round(elapsed / n * 1e6, 2),
+        "poses_per_s": round(n / elapsed, 1)
+    }
+    return results
+
+
+def bench_multi_pose(people, repeat):
+    frames = synthetic_keypoints(repeat + 10, people, seed=1)
+    tracker = MultiPoseTracker()
+    i = itertools.count()
+    return {"people": people, "detect": measure(lambda: tracker.detect(frames[next(i) % len(frames)]), repeat)}
+
+
+def bench_store(sizes, repeat, workdir):
+    results = []
+    for size in sizes:
+        path = os.path.join(workdir, f"store_{size}.db")
+        store = EventStore(path)
+
+        start = time.perf_counter()
+        fill_store(store, size)
+        fill_s = time.perf_counter() - start
+
+        events = iter(random_events(repeat + 10, seed=size))
+        results.append({
+            "events": size,
+            "fill_s": round(fill_s, 2),
+            # Recent appends may still sit in the write-ahead log
+            "db_bytes": os.path.getsize(path) + (os.path.getsize(path + "-wal") if os.path.exists(path + "-wal") else 0),
+            "append": measure(lambda: store.append(next(events)), repeat),
+            "latest": measure(store.latest, repeat),
+            "count": measure(store.count, repeat),
+            "recent_50": measure(lambda: store.recent(50), repeat),
+            "query_page_100": measure(lambda: store.query(limit=100), repeat),
+            "query_filtered_100": measure(
+                lambda: store.query(pose="lying", status="unreviewed", min_confidence=80, limit=100), repeat
+            ),
+            "query_since": measure(lambda: store.query(since=store.version() - 5), repeat)
+        })
+        store._conn().close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    return results
+
+
+def bench_endpoints(sizes, repeat, workdir):
+    api = bench_app(workdir)
+    results = []
+    client = api.app.test_client()
+    for size in sizes:
+        # The app's own store is refilled rather than replaced: the image
+        # store's protect() is wired to it
+        api.event_store.clear()
+        fill_store(api.event_store, size)
+
+        def get(url):
+            response = client.get(url)
+            # Drain streamed bodies so the whole export is timed
+            response.get_data()
+            assert response.status_code in (200, 304), (url, response.status_code)
+
+        entry = {
+            "events": size,
+            "latest": measure(lambda: get("/api/latest"), repeat),
+            "suspicious_poses_page": measure(lambda: get("/api/suspicious_poses?limit=100"), repeat),
+            "suspicious_poses_since": measure(
+                lambda: get(f"/api/suspicious_poses?since={api.event_store.version() - 5}"), repeat
+            ),
+        }
+        # Full-history endpoints are timed a few times only
+        full_repeat = max(1, min(repeat, 5 if size <= 100000 else 1))
+        entry["suspicious_poses_full"] = measure(lambda: get("/api/suspicious_poses"), full_repeat, warmup=0)
+        for export_format in ("csv", "ndjson", "xlsx"):
+            entry[f"export_{export_format}"] = measure(
+                lambda: get(f"/api/export?format={export_format}"), full_repeat, warmup=0
+            )
+        results.append(entry)
+    return results
+
+
+def bench_socket_local(cameras, frames_per_camera, alerts_per_camera, workdir):
+    """Drives the socket handlers in-process, one test client per camera."""
+    api = bench_app(workdir)
+    logged_before = api.event_store.count()
+
+    clients = [api.socketio.test_client(api.app) for _ in range(cameras)]
+    kp = synthetic_keypoints(frames_per_camera, cameras).astype('<f4')
+
+    samples = []
+    start = time.perf_counter()
+    for frame in range(frames_per_camera):
+        for camera, client in enumerate(clients):
+            t = time.perf_counter()
+            client.emit("keypoints", {"keypoints": kp[frame, camera].tobytes(), "channels": 2})
+            samples.append(time.perf_counter() - t)
+    keypoints_s = time.perf_counter() - start
+    # Detection is asynchronous; let the workers drain before reading counters
+    while api.keypoint_inbox.stats()["waiting"] or api.keypoint_inbox.stats()["busy"]:
+        time.sleep(0.01)
+    keypoint_inbox = api.keypoint_inbox.stats()
+    for client in clients:
+        client.get_received()
+
+    alert_samples = []
+    for _ in range(alerts_per_camera):
+        for client in clients:
+            t = time.perf_counter()
+            client.emit("high_confidence_pose", {"pose": "lying", "confidence": 0.9, "snapshot": SNAPSHOT_PNG})
+            alert_samples.append(time.perf_counter() - t)
+    api.snapshot_writer._queue.join()
+    for client in clients:
+        client.disconnect()
+
+    total = cameras * frames_per_camera
+    return {
+        "mode": "in-process",
+        "cameras": cameras,
+        "keypoints": {**summarize(samples), "events_per_s": round(total / keypoints_s, 1)},
+        "keypoint_inbox": keypoint_inbox,
+        "high_confidence_pose": summarize(alert_samples),
+        "snapshot_writer": api.snapshot_writer.stats(),
+        "events_logged": api.event_store.count() - logged_before
+    }
+
+
+def bench_socket_remote(url, cameras, frames_per_camera, alerts_per_camera, fps):
+    """
+    Drives a running server with one socketio.Client per camera, paced to
+    fps, then sends alerts_per_camera high_confidence_pose events each.
+    """
+    import socketio
+
+    kp = synthetic_keypoints(frames_per_camera, cameras).astype('<f4')
+    samples, alert_samples, errors = [], [], []
+    lock = threading.Lock()
+
+    def camera(index):
+        client = socketio.Client()
+        replied = threading.Event()
+        client.on("pose", lambda data: replied.set())
+        try:
+            client.connect(url, transports=["websocket"])
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+            return
+        def round_trip(event, payload, into):
+            replied.clear()
+            t = time.perf_counter()
+            client.emit(event, payload)
+            if not replied.wait(5):
+                with lock:
+                    errors.append(f"{event} timeout")
+                return None
+            elapsed = time.perf_counter() - t
+            with lock:
+                into.append(elapsed)
+            return elapsed
+
+        interval = 1.0 / fps if fps else 0.0
+        for frame in range(frames_per_camera):
+            elapsed = round_trip("keypoints", {"keypoints": kp[frame, index].tobytes(), "channels": 2}, samples)
+            if elapsed is not None and interval > elapsed:
+                time.sleep(interval - elapsed)
+        # Each camera opens its own episode, so every first alert is broadcast
+        alert = {"pose": "lying", "confidence": 0.9, "snapshot": SNAPSHOT_PNG, "stream_id": f"bench-{index}"}
+        for _ in range(alerts_per_camera):
+            round_trip("high_confidence_pose", alert, alert_samples)
+        client.disconnect()
+
+    threads = [threading.Thread(target=camera, args=(i,)) for i in range(cameras)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    result = {"mode": "remote", "url": url, "cameras": cameras, "target_fps": fps, "errors": len(errors)}
+    if samples:
+        result["round_trip"] = summarize(samples)
+        result["events_per_s"] = round(len(samples) / elapsed, 1)
+    if alert_samples:
+        result["high_confidence_pose"] = summarize(alert_samples)
+    return result
+
+
+STARTUP_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import api
+imported = time.perf_counter()
+api.create_app(*sys.argv[1:])
+print(imported - start, time.perf_counter() - imported)
+"""
+
+
+def bench_startup(repeat, workdir):
+    """Fresh interpreters importing api and calling create_app(), as a worker restart or test run does."""
+    imports, creates, totals = [], [], []
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    dirs = [os.path.join(workdir, "startup", name) for name in ("logs", "imgs", "clips", "credentials")]
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT, *dirs], capture_output=True, text=True, cwd=cwd, check=True
+        ).stdout.split()
+        totals.append(time.perf_counter() - start)
+        imports.append(float(output[-2]))
+        creates.append(float(output[-1]))
+    return {
+        "import": summarize(imports),
+        "create_app": summarize(creates),
+        "process": summarize(totals)
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count()
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", default="detector,store,endpoints,socket,startup",
+                        help="comma-separated subset of detector,store,endpoints,socket,startup")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="event-log sizes for the store and endpoint benchmarks")
+    parser.add_argument("--repeat", type=int, default=200, help="timed calls per measurement")
+    parser.add_argument("--keypoints", help="recorded keypoints (.npy, .npz, .json or .ndjson)")
+    parser.add_argument("--people", type=int, default=20, help="poses per frame for the multi-person benchmark")
+    parser.add_argument("--cameras", type=int, default=16, help="simulated cameras for the socket benchmark")
+    parser.add_argument("--frames", type=int, default=100, help="keypoint frames per simulated camera")
+    parser.add_argument("--alerts", type=int, default=5, help="high_confidence_pose events per simulated camera")
+    parser.add_argument("--url", help="drive a running server instead of the in-process handlers")
+    parser.add_argument("--fps", type=float, default=0, help="per-camera send rate with --url (0 = as fast as possible)")
+    parser.add_argument("--out", help="write results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    only = set(args.only.split(","))
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    results = {"environment": environment(), "args": vars(args)}
+
+    with tempfile.TemporaryDirectory(prefix="pose-bench-") as workdir:
+        if "detector" in only:
+            frames = synthetic_keypoints(max(args.repeat, 1000))[:, 0]
+            results["detector"] = {"synthetic": bench_detector(frames, args.repeat)}
+            if args.keypoints:
+                results["detector"]["recorded"] = bench_detector(load_keypoints(args.keypoints), args.repeat)
+            results["detector"]["multi_pose"] = bench_multi_pose(args.people, args.repeat)
+        if "store" in only:
+            results["store"] = bench_store(sizes, args.repeat, workdir)
+        if "endpoints" in only:
+            results["endpoints"] = bench_endpoints(sizes, args.repeat, workdir)
+        if "socket" in only:
+            if args.url:
+                results["socket"] = bench_socket_remote(args.url, args.cameras, args.frames, args.alerts, args.fps)
+            else:
+                results["socket"] = bench_socket_local(args.cameras, args.frames, args.alerts, workdir)
+        if "startup" in only:
+            # Each run is a new interpreter, so a handful is plenty
+            results["startup"] = bench_startup(max(1, min(args.repeat, 10)), workdir)
+
+    output = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
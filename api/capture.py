@@ -0,0 +1,620 @@
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+import framebus
+from framebus import FrameRing
+
+MJPEG_BOUNDARY = b'--frame'
+
+# Output tiers viewers can pick: name -> (max height in px or None, JPEG quality)
+DEFAULT_TIERS = {
+    "full": (None, 95),
+    "720p": (720, 80),
+    "360p": (360, 70)
+}
+DEFAULT_TIER = "full"
+
+
+def mjpeg_part(jpeg):
+    return MJPEG_BOUNDARY + b'\r\nContent-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n'
+
+
+def scaled_size(shape, max_height=None):
+    """(width, height) a frame of this shape is encoded at for a tier's max_height."""
+    height, width = shape[:2]
+    if max_height and height > max_height:
+        return max(1, round(width * max_height / height)), max_height
+    return width, height
+
+
+def encode_jpeg(frame, max_height=None, quality=95):
+    size = scaled_size(frame.shape, max_height)
+    if size != (frame.shape[1], frame.shape[0]):
+        frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("JPEG encoding failed")
+    return buffer.tobytes()
+
+
+class FrameBroadcaster:
+    """
+    Latest-frame slot shared by the capture thread and any number of viewers.
+
+    The capture thread publishes decoded frames; nothing is encoded until a
+    viewer asks for a frame newer than what it already has. Each tier is then
+    encoded at most once per published frame and the multipart chunk is
+    shared by every viewer of that tier. Viewers always receive the newest
+    frame, so a slow client skips frames instead of queueing them.
+
+    A frame published with valid, a callable that turns False once the
+    frame's memory is reused (a FrameRing view), is only cached if it was
+    still intact after encoding.
+
+    close() ends every viewer's stream; the next publish() reopens it.
+    """
+
+    def __init__(self, tiers=None):
+        self.tiers = tiers or DEFAULT_TIERS
+        self._cond = threading.Condition()
+        self.seq = 0
+        self.frame = None
+        self.valid = None
+        self.viewers = 0
+        self.closed = False
+        # tier -> (seq, jpeg, part); one lock per tier so only viewers of the
+        # same tier wait on each other's encode
+        self._encoded = {}
+        self._tier_locks = {tier: threading.Lock() for tier in self.tiers}
+        self.encodes = 0
+
+    def publish(self, frame, valid=None):
+        with self._cond:
+            self.seq += 1
+            self.frame = frame
+            self.valid = valid
+            self.closed = False
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self.frame = self.valid = None
+            self._cond.notify_all()
+
+    def wait(self, last_seq, timeout=None):
+        """Block until a frame newer than last_seq exists; returns its seq, or None on timeout or close."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.seq > last_seq or self.closed, timeout) or self.closed:
+                return None
+            return self.seq
+
+    def encoded(self, tier=DEFAULT_TIER):
+        """(seq, jpeg, part) of the newest frame in the given tier, or None."""
+        with self._tier_locks[tier]:
+            with self._cond:
+                seq, frame, valid = self.seq, self.frame, self.valid
+            if frame is None:
+                return None
+
+            cached = self._encoded.get(tier)
+            if cached is not None and cached[0] == seq:
+                return cached
+
+            max_height, quality = self.tiers[tier]
+            jpeg = encode_jpeg(frame, max_height, quality)
+            if valid is not None and not valid():
+                # Overwritten mid-encode; a newer frame is on its way
+                return None
+            cached = (seq, jpeg, mjpeg_part(jpeg))
+            self._encoded[tier] = cached
+            self.encodes += 1
+            return cached
+
+    def stream(self, max_fps=None, tier=DEFAULT_TIER, timeout=5.0):
+        """Generator of multipart chunks for one viewer, paced to max_fps."""
+        interval = 1.0 / max_fps if max_fps else 0.0
+        last_seq = 0
+        next_send = 0.0
+
+        with self._cond:
+            self.viewers += 1
+        try:
+            while True:
+                if self.wait(last_seq, timeout) is None:
+                    if self.closed:
+                        return
+                    continue
+
+                delay = next_send - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+                # Encodes (or reuses) whatever frame is newest by now
+                encoded = self.encoded(tier)
+                if encoded is None:
+                    time.sleep(0.005)
+                    continue
+                last_seq, _, part = encoded
+                next_send = time.monotonic() + interval
+                yield part
+        finally:
+            with self._cond:
+                self.viewers -= 1
+
+
+class ClipBuffer:
+    """
+    Ring of recent encoded JPEG frames bounded by total bytes, not frame
+    count, so memory stays fixed whatever the resolution or quality.
+    Entries are (monotonic time, jpeg bytes, (width, height)).
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._frames = deque()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._frames)
+
+    def append(self, timestamp, jpeg, size):
+        with self._lock:
+            self._frames.append((timestamp, jpeg, size))
+            self.bytes += len(jpeg)
+            while self.bytes > self.max_bytes and self._frames:
+                self.bytes -= len(self._frames.popleft()[1])
+
+    def between(self, start, end):
+        """Frames with start <= timestamp <= end, oldest first."""
+        with self._lock:
+            return [frame for frame in self._frames if start <= frame[0] <= end]
+
+    def duration(self):
+        with self._lock:
+            return self._frames[-1][0] - self._frames[0][0] if self._frames else 0.0
+
+
+class MotionDetector:
+    """
+    Cheap motion estimate from a small grayscale copy of each frame.
+
+    Frames are shrunk to `width` px (a plain linear resize followed by a blur;
+    an area resize of a 1080p frame costs ~100x more) and compared with a
+    running-average background model. The score is the fraction of pixels
+    that differ by more than pixel_threshold; boxes are the changed regions
+    in full-frame pixel coordinates, ignoring blobs under min_area of the
+    frame.
+    """
+
+    def __init__(self, width=160, alpha=0.05, pixel_threshold=25, min_area=0.002):
+        self.width = width
+        self.alpha = alpha
+        self.pixel_threshold = pixel_threshold
+        self.min_area = min_area
+        self._background = None
+        self._kernel = np.ones((3, 3), np.uint8)
+
+    def reset(self):
+        self._background = None
+
+    def update(self, frame):
+        """Returns (score, boxes) for one BGR frame; boxes are [x, y, w, h]."""
+        height, width = frame.shape[:2]
+        small_size = (self.width, max(1, round(height * self.width / width)))
+        small = cv2.resize(frame, small_size, interpolation=cv2.INTER_LINEAR)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        small = cv2.GaussianBlur(small, (5, 5), 0)
+
+        if self._background is None or self._background.shape != small.shape:
+            self._background = small.astype(np.float32)
+            return 0.0, []
+
+        diff = cv2.absdiff(small, cv2.convertScaleAbs(self._background))
+        cv2.accumulateWeighted(small, self._background, self.alpha)
+        _, mask = cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)
+        score = cv2.countNonZero(mask) / mask.size
+        if not score:
+            return 0.0, []
+
+        mask = cv2.dilate(mask, self._kernel, iterations=2)
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        scale = width / small_size[0]
+        min_pixels = self.min_area * mask.size
+        boxes = [
+            [round(x * scale), round(y * scale), round(w * scale), round(h * scale)]
+            for x, y, w, h in map(cv2.boundingRect, contours)
+            if w * h >= min_pixels
+        ]
+        return score, boxes
+
+
+class CameraCapture:
+    """
+    Reader thread for one camera.
+
+    Owns its VideoCapture, reconnects with exponential backoff and publishes
+    every decoded frame into its own FrameBroadcaster. With a MotionDetector
+    attached, each frame also gets a motion score and boxes, and the camera
+    counts as active until MOTION_HOLD seconds after the last moving frame;
+    on_motion(camera) is called whenever that flips. With a ClipBuffer, up to
+    clip_fps frames a second of the clip tier are kept for alert clips; they
+    come from the broadcaster's per-tier cache, so viewers of that tier and
+    the recorder share one encode.
+    """
+
+    RECONNECT_MIN = 1.0
+    RECONNECT_MAX = 30.0
+    # Consecutive failed reads before the stream is reopened
+    MAX_READ_FAILURES = 50
+    # Fraction of changed pixels that counts as motion
+    MOTION_THRESHOLD = 0.005
+    MOTION_HOLD = 2.0
+
+    def __init__(self, camera_id, address, tiers=None, motion=None, on_motion=None,
+                 clip_buffer=None, clip_tier=DEFAULT_TIER, clip_fps=10):
+        self.camera_id = camera_id
+        self.address = address
+        self.broadcaster = FrameBroadcaster(tiers)
+        self.motion = motion
+        self.on_motion = on_motion
+        self.clip_buffer = clip_buffer
+        self.clip_tier = clip_tier
+        self.clip_interval = 1.0 / clip_fps
+        self._last_clip_frame = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.connected = False
+        self.frames = 0
+        self.read_failures = 0
+        self.reconnects = 0
+        self.fps = 0.0
+        self.last_frame_time = None
+        self._window_start, self._window_frames = time.monotonic(), 0
+
+        self.motion_score = 0.0
+        self.motion_boxes = []
+        self.motion_active = motion is None
+        self.last_motion_time = None
+        self.static_frames = 0
+
+    def start(self):
+        # An unconfigured camera would only spin reconnecting
+        if self.address is None or self.address == "":
+            return
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self.capture_frames, name=f"capture-{self.camera_id}", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.broadcaster.close()
+
+    def _open(self):
+        cap = cv2.VideoCapture(self.address)
+        if cap.isOpened():
+            return cap
+        cap.release()
+        return None
+
+    def capture_frames(self):
+        cap = None
+        backoff = self.RECONNECT_MIN
+        failures = 0
+
+        while not self._stop.is_set():
+            if cap is None:
+                cap = self._open()
+                if cap is None:
+                    self.connected = False
+                    self.reconnects += 1
+                    self._stop.wait(backoff)
+                    backoff = min(backoff * 2, self.RECONNECT_MAX)
+                    continue
+                self.connected = True
+                backoff = self.RECONNECT_MIN
+                failures = 0
+
+            ret, frame = cap.read()
+            if not ret:
+                self.read_failures += 1
+                failures += 1
+                if failures >= self.MAX_READ_FAILURES:
+                    cap.release()
+                    cap = None
+                    self.connected = False
+                self._stop.wait(0.1)
+                continue
+            failures = 0
+            self._handle_frame(frame, time.monotonic())
+
+        if cap is not None:
+            cap.release()
+        self.connected = False
+
+    def _handle_frame(self, frame, now, valid=None):
+        # Encoding is deferred until a viewer asks for this frame
+        self.broadcaster.publish(frame, valid)
+
+        if self.motion is not None:
+            self._update_motion(frame, now)
+        if self.clip_buffer is not None and now - self._last_clip_frame >= self.clip_interval:
+            self._last_clip_frame = now
+            self._buffer_clip_frame(frame, now)
+        self.frames += 1
+        self.last_frame_time = now
+        self._window_frames += 1
+        if now - self._window_start >= 1.0:
+            self.fps = self._window_frames / (now - self._window_start)
+            self._window_start, self._window_frames = now, 0
+
+    def _update_motion(self, frame, now):
+        self.motion_score, self.motion_boxes = self.motion.update(frame)
+        if self.motion_score >= self.MOTION_THRESHOLD:
+            self.last_motion_time = now
+        else:
+            self.static_frames += 1
+
+        active = self.last_motion_time is not None and now - self.last_motion_time < self.MOTION_HOLD
+        if active != self.motion_active:
+            self.motion_active = active
+            if self.on_motion is not None:
+                try:
+                    self.on_motion(self)
+                except Exception as e:
+                    print(f"Motion callback failed for {self.camera_id}: {e}")
+
+    def _buffer_clip_frame(self, frame, now):
+        encoded = self.broadcaster.encoded(self.clip_tier)
+        if encoded is None:
+            return
+        max_height = self.broadcaster.tiers[self.clip_tier][0]
+        self.clip_buffer.append(now, encoded[1], scaled_size(frame.shape, max_height))
+
+    def motion_state(self):
+        return {
+            "camera": self.camera_id,
+            "enabled": self.motion is not None,
+            "active": self.motion_active,
+            "score": round(self.motion_score, 4),
+            "boxes": self.motion_boxes
+        }
+
+    def stats(self):
+        age = None
+        if self.last_frame_time is not None:
+            age = round(time.monotonic() - self.last_frame_time, 3)
+        # The fps window only closes on a frame, so a stalled camera reads 0
+        fps = self.fps if age is not None and age < 2.0 else 0.0
+        return {
+            "id": self.camera_id,
+            "connected": self.connected,
+            "fps": round(fps, 2),
+            "frames": self.frames,
+            "read_failures": self.read_failures,
+            "reconnects": self.reconnects,
+            "last_frame_age": age,
+            "viewers": self.broadcaster.viewers,
+            "encodes": self.broadcaster.encodes,
+            "motion_active": self.motion_active,
+            "motion_score": round(self.motion_score, 4),
+            "static_frames": self.static_frames,
+            "clip_buffer_bytes": self.clip_buffer.bytes if self.clip_buffer is not None else 0,
+            "clip_buffer_seconds": round(self.clip_buffer.duration(), 1) if self.clip_buffer is not None else 0.0
+        }
+
+
+class ProcessCameraCapture(CameraCapture):
+    """
+    CameraCapture whose VideoCapture runs in a worker process.
+
+    The worker (this module run as a script) decodes into a FrameRing; a
+    follower thread here hands each new frame to the broadcaster, motion
+    detector and clip buffer as a zero-copy view of the shared slot. Decoding
+    never holds this process's GIL, and cameras spread over cores. Connection
+    counters come from the ring header, and a worker that dies is restarted.
+    """
+
+    WORKER_RESTART_DELAY = 1.0
+
+    def __init__(self, camera_id, address, tiers=None, motion=None, on_motion=None,
+                 clip_buffer=None, clip_tier=DEFAULT_TIER, clip_fps=10, slots=4, slot_bytes=1920 * 1080 * 3):
+        super().__init__(camera_id, address, tiers, motion, on_motion, clip_buffer, clip_tier, clip_fps)
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.ring = None
+        self.process = None
+        # Read end of the current worker's frame-notify pipe
+        self._notify = None
+        self.worker_restarts = 0
+        self.oversize_frames = 0
+
+    def start(self):
+        if self.address is None or self.address == "":
+            return
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            if self.ring is None:
+                self.ring = FrameRing.create(self.slots, self.slot_bytes)
+            self._thread = threading.Thread(
+                target=self.follow_frames, name=f"capture-{self.camera_id}", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        super().stop(timeout)
+        if self.process is not None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
+        if self._notify is not None:
+            os.close(self._notify)
+            self._notify = None
+        if self.ring is not None:
+            self.broadcaster.close()
+            self.ring.close()
+            self.ring = None
+
+    def _spawn(self):
+        # The address goes through the environment so stream credentials stay out of ps
+        env = dict(os.environ, CAPTURE_ADDRESS=self.address)
+        if self._notify is not None:
+            os.close(self._notify)
+        self._notify, notify_write = os.pipe()
+        # Shared with the worker; a full pipe must not stall its capture loop
+        os.set_blocking(notify_write, False)
+        try:
+            self.process = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), self.camera_id, self.ring.name, str(os.getpid()),
+                 str(notify_write)],
+                env=env, pass_fds=(notify_write,)
+            )
+        finally:
+            os.close(notify_write)
+
+    def follow_frames(self):
+        ring = self.ring
+        last_seq = ring.latest
+
+        while not self._stop.is_set():
+            if self.process is None or self.process.poll() is not None:
+                if self.process is not None:
+                    self.worker_restarts += 1
+                    if self._stop.wait(self.WORKER_RESTART_DELAY):
+                        break
+                self._spawn()
+
+            try:
+                seq = ring.wait(last_seq, timeout=0.5, notify=self._notify)
+            except EOFError:
+                # The worker exited; reap it so the check above restarts it
+                try:
+                    self.process.wait(1.0)
+                except subprocess.TimeoutExpired:
+                    pass
+                seq = None
+            counters = ring.counters()
+            self.connected = counters["connected"]
+            self.read_failures = counters["read_failures"]
+            self.reconnects = counters["reconnects"]
+            self.oversize_frames = counters["oversize"]
+            if seq is None:
+                continue
+
+            last_seq = seq
+            frame = ring.read(seq)
+            if frame is None:
+                # Lapped by the writer while waking up; take the next one
+                continue
+            self._handle_frame(frame[1], time.monotonic(), lambda seq=seq: ring.valid(seq))
+
+        self.connected = False
+
+    def stats(self):
+        stats = super().stats()
+        stats.update({
+            "frame_bus": self.ring.name if self.ring is not None else None,
+            "worker_pid": self.process.pid if self.process is not None else None,
+            "worker_restarts": self.worker_restarts,
+            "oversize_frames": self.oversize_frames
+        })
+        return stats
+
+
+class RingWriterCapture(CameraCapture):
+    """The worker side of ProcessCameraCapture: decoded frames go straight into the ring."""
+
+    def __init__(self, camera_id, address, ring):
+        super().__init__(camera_id, address)
+        self.ring = ring
+
+    def _handle_frame(self, frame, now, valid=None):
+        self.ring.write(frame, now)
+
+
+def run_worker(camera_id, ring_name, parent_pid, notify_fd=None):
+    try:
+        ring = FrameRing.attach(ring_name)
+    except FileNotFoundError:
+        # The parent shut down before this worker got going
+        return
+    ring.notify_fd = notify_fd
+    capture = RingWriterCapture(camera_id, os.environ.get("CAPTURE_ADDRESS", ""), ring)
+    signal.signal(signal.SIGTERM, lambda *args: capture.stop())
+
+    def report():
+        # Counters and a heartbeat for the parent; exit if the parent is gone
+        while not capture._stop.wait(0.5):
+            ring.set_counters(capture.read_failures, capture.reconnects, capture.connected)
+            if os.getppid() != parent_pid:
+                capture.stop()
+
+    threading.Thread(target=report, name="capture-report", daemon=True).start()
+    capture.capture_frames()
+    ring.set_counters(capture.read_failures, capture.reconnects, False)
+
+
+class CaptureManager:
+    """
+    Runs one CameraCapture per configured camera (id -> stream address), each
+    with its own MotionDetector when motion is enabled. clip_buffer_bytes is
+    the total budget for alert clip rings, split evenly across cameras. With
+    processes, each camera decodes in its own worker process into a FrameRing
+    of ring_slots frames of up to ring_slot_bytes each; on hosts the ring does
+    not support (see framebus.SUPPORTED) cameras decode in threads instead.
+    """
+
+    def __init__(self, cameras, tiers=None, motion=False, on_motion=None,
+                 clip_buffer_bytes=0, clip_tier=DEFAULT_TIER, clip_fps=10,
+                 processes=False, ring_slots=4, ring_slot_bytes=1920 * 1080 * 3):
+        per_camera = clip_buffer_bytes // max(1, len(cameras))
+        if processes and not framebus.SUPPORTED:
+            print("Frame ring needs an x86 host; decoding cameras in threads instead")
+            processes = False
+        self.cameras = {}
+        for camera_id, address in cameras.items():
+            args = (
+                camera_id, address, tiers, MotionDetector() if motion else None, on_motion,
+                ClipBuffer(per_camera) if per_camera else None, clip_tier, clip_fps
+            )
+            self.cameras[camera_id] = (
+                ProcessCameraCapture(*args, ring_slots, ring_slot_bytes) if processes else CameraCapture(*args)
+            )
+
+    def start(self):
+        for camera in self.cameras.values():
+            camera.start()
+
+    def stop(self, timeout=None):
+        for camera in self.cameras.values():
+            camera.stop(timeout)
+
+    def get(self, camera_id):
+        return self.cameras.get(camera_id)
+
+    def stats(self):
+        return [camera.stats() for camera in self.cameras.values()]
+
+
+if __name__ == "__main__":
+    # Capture worker: capture.py CAMERA_ID RING_NAME PARENT_PID [NOTIFY_FD], address in $CAPTURE_ADDRESS
+    run_worker(sys.argv[1], sys.argv[2], int(sys.argv[3]), int(sys.argv[4]) if len(sys.argv) > 4 else None)
@@ -0,0 +1,155 @@
+import os
+import queue
+import struct
+import threading
+import time
+
+AVIF_HASINDEX = 0x10
+AVIIF_KEYFRAME = 0x10
+
+
+def _chunk(fourcc, data):
+    # RIFF chunks are word aligned
+    return fourcc + struct.pack("<I", len(data)) + data + (b"\0" if len(data) % 2 else b"")
+
+
+def _list(kind, data):
+    return _chunk(b"LIST", kind + data)
+
+
+def write_mjpeg_avi(f, jpegs, fps, width, height):
+    """
+    Write already-encoded JPEG frames to an open binary file as an
+    MJPEG-in-AVI clip. The JPEG bytes go into the container unchanged;
+    cv2.VideoWriter would decode and re-encode every frame.
+    """
+    rate = max(1, round(fps * 1000))
+    n = len(jpegs)
+    largest = max(len(jpeg) for jpeg in jpegs)
+
+    avih = struct.pack(
+        "<10I16x",
+        round(1e6 / fps), largest * round(fps), 0, AVIF_HASINDEX, n, 0, 1, largest, width, height
+    )
+    strh = b"vidsMJPG" + struct.pack(
+        "<IHHIIIIIIiI4h",
+        0, 0, 0, 0, 1000, rate, 0, n, largest, -1, 0, 0, 0, width, height
+    )
+    strf = struct.pack("<IiiHH4sIiiII", 40, width, height, 1, 24, b"MJPG", width * height * 3, 0, 0, 0, 0)
+    hdrl = _list(b"hdrl", _chunk(b"avih", avih) + _list(b"strl", _chunk(b"strh", strh) + _chunk(b"strf", strf)))
+
+    # idx1 offsets are relative to the "movi" fourcc
+    index = []
+    offset = 4
+    movi_size = 4
+    for jpeg in jpegs:
+        index.append(struct.pack("<4sIII", b"00dc", AVIIF_KEYFRAME, offset, len(jpeg)))
+        padded = 8 + len(jpeg) + len(jpeg) % 2
+        offset += padded
+        movi_size += padded
+    idx1 = _chunk(b"idx1", b"".join(index))
+
+    riff_size = 4 + len(hdrl) + 8 + movi_size + len(idx1)
+    f.write(b"RIFF" + struct.pack("<I", riff_size) + b"AVI ")
+    f.write(hdrl)
+    f.write(b"LIST" + struct.pack("<I", movi_size) + b"movi")
+    for jpeg in jpegs:
+        f.write(_chunk(b"00dc", jpeg))
+    f.write(idx1)
+
+
+class ClipRecorder:
+    """
+    Bounded background queue that turns a camera's ClipBuffer into a
+    pre/post-event clip.
+
+    A job waits until post_seconds after the event, then takes the buffered
+    frames from pre_seconds before to post_seconds after it and writes them
+    as MJPEG-in-AVI. Jobs hold no frames while queued, and one worker writes
+    one clip at a time, so memory beyond the camera rings stays bounded by a
+    single clip. submit() never blocks; a full queue counts as a drop.
+    """
+
+    def __init__(self, clip_dir, pre_seconds=5.0, post_seconds=5.0, max_queue=16):
+        self.clip_dir = clip_dir
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self._queue = queue.Queue(maxsize=max_queue)
+
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.empty = 0
+        self.last_write_ms = None
+
+        threading.Thread(target=self._run, name="clip-recorder", daemon=True).start()
+
+    def submit(self, clip_buffer, filename, on_done=None, event_time=None):
+        """
+        Queue a clip around event_time (time.monotonic(), default now).
+        on_done(filename or None) runs on the recorder thread. Returns False
+        if the queue is full.
+        """
+        event_time = time.monotonic() if event_time is None else event_time
+        try:
+            self._queue.put_nowait((clip_buffer, filename, on_done, event_time))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def _write(self, clip_buffer, filename, event_time):
+        frames = clip_buffer.between(event_time - self.pre_seconds, event_time + self.post_seconds)
+        if not frames:
+            return False
+
+        # A reconnect can change the resolution; keep frames matching the last one
+        size = frames[-1][2]
+        frames = [frame for frame in frames if frame[2] == size]
+        span = frames[-1][0] - frames[0][0]
+        fps = (len(frames) - 1) / span if span > 0 else 1.0
+
+        filepath = os.path.join(self.clip_dir, filename)
+        tmp_path = filepath + ".tmp"
+        with open(tmp_path, "wb") as f:
+            write_mjpeg_avi(f, [jpeg for _, jpeg, _ in frames], fps, *size)
+        os.replace(tmp_path, filepath)
+        return True
+
+    def _run(self):
+        while True:
+            clip_buffer, filename, on_done, event_time = self._queue.get()
+            delay = event_time + self.post_seconds - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+            start = time.perf_counter()
+            try:
+                if self._write(clip_buffer, filename, event_time):
+                    self.written += 1
+                else:
+                    self.empty += 1
+                    filename = None
+            except Exception as e:
+                print(f"Failed to write clip {filename}: {e}")
+                self.failed += 1
+                filename = None
+            self.last_write_ms = round((time.perf_counter() - start) * 1000, 2)
+
+            if on_done is not None:
+                try:
+                    on_done(filename)
+                except Exception as e:
+                    print(f"Clip callback failed: {e}")
+            self._queue.task_done()
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "capacity": self._queue.maxsize,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "empty": self.empty,
+            "last_write_ms": self.last_write_ms
+        }
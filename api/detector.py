@@ -1,304 +1,516 @@
+import threading
+import time
+from collections import OrderedDict
+
 import numpy as np
 
 # ---------------------------
-# Last positions (global)
+# Thresholds
 # ---------------------------
-_last_left_wrist = None
-_last_right_wrist = None
-_last_left_ankle = None
-_last_right_ankle = None
+THRESHOLD_PUNCH = 0.55
+THRESHOLD_KICK = 0.5
+THRESHOLD_LYING = 0.45
+THRESHOLD_FIREARM = 0.6
+
+# Keypoints whose previous position drives the speed terms: lw, rw, la, ra
+MOTION_JOINTS = (9, 10, 15, 16)
 
 # ---------------------------
 # Utility functions
 # ---------------------------
-def vector_angle(a, b, c):
+# _dot/_norm work on the last axis so the single-pose and batched paths share
+# the exact same arithmetic (BLAS dot/norm may fuse multiply-adds differently).
+def _dot(u, v):
+    return u[..., 0] * v[..., 0] + u[..., 1] * v[..., 1]
+
+def _norm(v):
+    return np.sqrt(_dot(v, v))
+
+def _angle(a, b, c):
     ba = a - b
     bc = c - b
-    denom = (np.linalg.norm(ba) * np.linalg.norm(bc) + 1e-6)
-    cosv = np.clip(np.dot(ba, bc) / denom, -1.0, 1.0)
-    return float(np.degrees(np.arccos(cosv)))
+    denom = _norm(ba) * _norm(bc) + 1e-6
+    cosv = np.clip(_dot(ba, bc) / denom, -1.0, 1.0)
+    return np.degrees(np.arccos(cosv))
+
+def _clip01(x):
+    # Same result as np.clip(x, 0.0, 1.0) at a fraction of the call overhead
+    return np.minimum(np.maximum(x, 0.0), 1.0)
+
+def vector_angle(a, b, c):
+    return float(_angle(a, b, c))
 
 def compute_speed(prev, curr, delta_time=1.0):
     if prev is None:
         return 0.0
-    return float(np.linalg.norm(curr - prev) / delta_time)
+    return float(_norm(curr - prev) / delta_time)
 
-def midpoint(a, b):
-    return (a + b) / 2.0
+# ---------------------------
+# Feature extraction
+# ---------------------------
+# Columns of the feature matrix built once per frame and shared by every rule.
+# Left/right pairs are adjacent so rules can score both sides in one operation.
+FEATURES = (
+    "left_elbow_angle", "right_elbow_angle",
+    "left_knee_angle", "right_knee_angle",
+    "left_wrist_speed", "right_wrist_speed",
+    "left_ankle_speed", "right_ankle_speed",
+    "left_arm_forward", "right_arm_forward",    # wrist ahead of shoulder (px)
+    "left_wrist_height", "right_wrist_height",  # |wrist.y - shoulder.y| (px)
+    "left_leg_dx", "right_leg_dx",              # ankle.x - hip.x (px)
+    "left_ankle_lift", "right_ankle_lift",      # ankle raised above knee (px)
+    "torso_angle",
+    "vertical_span",
+    "arm_asymmetry"                             # |left reach - right reach| (px)
+)
+FEATURE_INDEX = {name: i for i, name in enumerate(FEATURES)}
+
+
+class PoseFeatures:
+    """(N, len(FEATURES)) feature matrix with column access by name."""
+
+    def __init__(self, values):
+        self.values = values
+
+    def __getitem__(self, name):
+        return self.values[:, FEATURE_INDEX[name]]
+
+    def sides(self, name):
+        # (N, 2) view of the left_<name>, right_<name> columns
+        i = FEATURE_INDEX["left_" + name]
+        return self.values[:, i:i + 2]
+
+    def __len__(self):
+        return len(self.values)
+
+
+def extract_features(kp, last_positions=None, delta_time=1.0):
+    """
+    kp: (N, 17, 2) keypoints.
+    last_positions: (N, 4, 2) previous MOTION_JOINTS positions, NaN = no history.
+    delta_time: scalar or (N,) array.
+    """
+    n = kp.shape[0]
+    if last_positions is None:
+        last_positions = np.full((n, 4, 2), np.nan)
+    dt = np.asarray(delta_time, dtype=float)
+    if dt.ndim:
+        dt = dt[:, None]
+
+    x = kp[:, :, 0]
+    y = kp[:, :, 1]
+    values = np.empty((n, len(FEATURES)))
+
+    # Elbows (shoulder-elbow-wrist) and knees (hip-knee-ankle) in one call
+    values[:, 0:4] = _angle(kp[:, [5, 6, 11, 12]], kp[:, [7, 8, 13, 14]], kp[:, [9, 10, 15, 16]])
+
+    # Rows without history score 0.0, like compute_speed(None, ...)
+    speed = _norm(kp[:, MOTION_JOINTS] - last_positions) / dt
+    values[:, 4:8] = np.where(np.isnan(speed), 0.0, speed)
+
+    values[:, 8:10] = x[:, [5, 10]] - x[:, [9, 6]]
+    values[:, 10:12] = np.abs(y[:, [9, 10]] - y[:, [5, 6]])
+    values[:, 12:14] = x[:, [15, 16]] - x[:, [11, 12]]
+    values[:, 14:16] = y[:, [13, 14]] - y[:, [15, 16]]
+
+    torso = (kp[:, 11] + kp[:, 12]) / 2.0 - (kp[:, 5] + kp[:, 6]) / 2.0
+    values[:, 16] = np.abs(np.degrees(np.arctan2(torso[:, 1], torso[:, 0])))
+    values[:, 17] = y.max(axis=1) - y.min(axis=1)
+    # (Lw.x - Ls.x) - (Rw.x - Rs.x) == -(left forward + right forward)
+    values[:, 18] = np.abs(values[:, 8] + values[:, 9])
+
+    return PoseFeatures(values)
 
 # ---------------------------
-# Lying detection
+# Rule registry
 # ---------------------------
-def torso_horizontal(kp):
-    shoulder_mid = midpoint(kp[5], kp[6])
-    hip_mid = midpoint(kp[11], kp[12])
-    v = hip_mid - shoulder_mid
-    dx, dy = v[0], v[1]
-    angle = abs(np.degrees(np.arctan2(dy, dx)))
-    return angle
-
-def vertical_height_range(kp):
-    ys = np.array([pt[1] for pt in kp])
-    return float(ys.max() - ys.min())
+# Registered rules in tie-break order: (labels, threshold, scorer)
+_RULES = []
+
+def register_rule(labels, threshold):
+    """
+    Decorator registering scorer(features) for one label or a tuple of labels.
+
+    The scorer returns an (N,) array for a single label, or an (N, len(labels))
+    array. A label is reported when its confidence exceeds threshold.
+    """
+    if isinstance(labels, str):
+        labels = (labels,)
+
+    def decorator(scorer):
+        _RULES[:] = [rule for rule in _RULES if rule[0] != labels]
+        _RULES.append((labels, threshold, scorer))
+        return scorer
+    return decorator
+
+def action_labels():
+    return tuple(label for labels, _, _ in _RULES for label in labels)
+
+def score_features(features):
+    """(N, len(action_labels())) unclipped confidences, one column per label."""
+    n = len(features)
+    columns = [scorer(features).reshape(n, len(labels)) for labels, _, scorer in _RULES]
+    return np.concatenate(columns, axis=1)
+
+def rule_thresholds():
+    """{label: threshold} for every registered label, in action_labels() order."""
+    return {label: threshold for labels, threshold, _ in _RULES for label in labels}
+
+def select_labels(conf, thresholds=None):
+    """
+    Label per row of conf; thresholds optionally overrides rule_thresholds()
+    for some labels (e.g. when re-scoring recorded footage).
+    """
+    merged = rule_thresholds()
+    if thresholds:
+        unknown = set(thresholds) - set(merged)
+        if unknown:
+            raise ValueError(f"unknown labels: {', '.join(sorted(unknown))}")
+        merged.update(thresholds)
+    # argmax returns the first maximum, same tie-break as max() over candidates
+    thresholds = np.array(list(merged.values()))
+    masked = np.where(conf > thresholds, conf, -np.inf)
+    best = masked.argmax(axis=1)
+    names = np.array(action_labels() + ("neutral",))
+    return names[np.where(np.isfinite(masked.max(axis=1)), best, len(thresholds))]
 
 # ---------------------------
 # Punch detection
 # ---------------------------
-def detect_punch_conf(kp, last_positions, delta_time=1.0):
-    Ls, Rs = kp[5], kp[6]
-    Le, Re = kp[7], kp[8]
-    Lw, Rw = kp[9], kp[10]
+@register_rule(("left_punch", "right_punch"), THRESHOLD_PUNCH)
+def punch(f):
+    s_angle = _clip01((f.sides("elbow_angle") - 140.0) / 40.0)
+    s_forward = _clip01((f.sides("arm_forward") - 10.0) / 60.0)
+    s_speed = _clip01(f.sides("wrist_speed") / 30.0)
+    s_height = np.where(f.sides("wrist_height") < 60.0, 0.5, 0.0)
+    return _clip01((s_angle + s_forward + s_speed + s_height) / 4.0)
 
-    left_elbow_angle = vector_angle(Ls, Le, Lw)
-    right_elbow_angle = vector_angle(Rs, Re, Rw)
-
-    left_speed = compute_speed(last_positions.get("lw"), Lw, delta_time)
-    right_speed = compute_speed(last_positions.get("rw"), Rw, delta_time)
-
-    right_forward = Rw[0] - Rs[0]
-    left_forward = Ls[0] - Lw[0]
-
-    height_thresh = 60.0
-    right_height_ok = abs(Rw[1] - Rs[1]) < height_thresh
-    left_height_ok = abs(Lw[1] - Ls[1]) < height_thresh
+# ---------------------------
+# Kick detection
+# ---------------------------
+KICK_FRONT_THRESH = 50.0
+
+def kick_type(dx, is_left):
+    # The left leg is mirrored: forward is towards -x
+    if is_left:
+        dx = -dx
+    if dx > KICK_FRONT_THRESH:
+        return "front"
+    if dx < -KICK_FRONT_THRESH:
+        return "back"
+    return "none"
+
+@register_rule(("left_kick", "right_kick"), THRESHOLD_KICK)
+def kick(f):
+    dx = np.abs(f.sides("leg_dx"))
+    s_angle = _clip01((f.sides("knee_angle") - 140.0) / 40.0)
+    s_forward = _clip01(np.where(dx > KICK_FRONT_THRESH, (dx - KICK_FRONT_THRESH) / 100.0, 0.0))
+    s_speed = _clip01(f.sides("ankle_speed") / 40.0)
+    s_lift = np.where(f.sides("ankle_lift") > 20.0, 0.5, 0.0)
+    return _clip01((s_angle + s_forward + s_speed + s_lift) / 4.0)
 
-    def score(angle, forward, speed, height_ok):
-        s_angle = np.clip((angle - 140.0) / 40.0, 0.0, 1.0)
-        s_forward = np.clip((forward - 10.0) / 60.0, 0.0, 1.0)
-        s_speed = np.clip(speed / 30.0, 0.0, 1.0)
-        s_height = 0.5 if height_ok else 0.0
-        return np.clip((s_angle + s_forward + s_speed + s_height) / 4.0, 0.0, 1.0)
+# ---------------------------
+# Lying detection
+# ---------------------------
+@register_rule("lying", THRESHOLD_LYING)
+def lying(f):
+    torso_angle_threshold = 30.0
+    y_span_threshold = 120.0
+    torso_ang = f["torso_angle"]
+    y_span = f["vertical_span"]
+    s_angle = _clip01((torso_angle_threshold - torso_ang) / torso_angle_threshold)
+    s_height = _clip01((y_span_threshold - y_span) / y_span_threshold)
+    return np.where(
+        (torso_ang < torso_angle_threshold) & (y_span < y_span_threshold),
+        _clip01((s_angle + s_height) / 2.0),
+        0.0
+    )
 
-    left_conf = score(left_elbow_angle, left_forward, left_speed, left_height_ok)
-    right_conf = score(right_elbow_angle, right_forward, right_speed, right_height_ok)
+# ---------------------------
+# Firearm pose detection
+# ---------------------------
+@register_rule("firearm", THRESHOLD_FIREARM)
+def firearm(f):
+    s_angle = _clip01((f.sides("elbow_angle") - 150.0) / 30.0)
+    s_height = np.where(f.sides("wrist_height") < 40.0, 0.5, 0.0)  # wrists level with shoulders
+    s_forward = np.where(f.sides("arm_forward") > 20.0, 0.5, 0.0)  # arms extended
+    s_speed = np.where(f.sides("wrist_speed") < 5.0, 0.5, 0.0)     # slow is better
+    arms = _clip01((s_angle + s_height + s_forward + s_speed) / 4.0)
+    firearm_conf = (arms[:, 0] + arms[:, 1]) / 2.0
+    # Penalize asymmetric arms
+    return np.where(f["arm_asymmetry"] < 25.0, firearm_conf, firearm_conf * 0.7)
 
-    return left_conf, right_conf
 
 # ---------------------------
-# Kick detection
+# Per-stream motion history
 # ---------------------------
-def detect_kick_conf(kp, last_positions, delta_time=1.0):
-    Lh, Rh = kp[11], kp[12]
-    Lk, Rk = kp[13], kp[14]
-    La, Ra = kp[15], kp[16]
-
-    left_knee_angle = vector_angle(Lh, Lk, La)
-    right_knee_angle = vector_angle(Rh, Rk, Ra)
-
-    left_speed = compute_speed(last_positions.get("la"), La, delta_time)
-    right_speed = compute_speed(last_positions.get("ra"), Ra, delta_time)
-
-    lift_thresh = 20.0
-    left_lift = (La[1] < Lk[1] - lift_thresh)
-    right_lift = (Ra[1] < Rk[1] - lift_thresh)
-
-    left_dx = La[0] - Lh[0]
-    right_dx = Ra[0] - Rh[0]
-
-    front_thresh = 50.0
-    side_thresh = 60.0
-
-    def leg_type_and_forward_score(dx, is_left):
-        if not is_left:
-            if dx > front_thresh:
-                return "front", (dx - front_thresh)/100.0
-            if dx < -front_thresh:
-                return "back", (-dx - front_thresh)/100.0
-            if abs(dx) > side_thresh:
-                return "side", (abs(dx)-side_thresh)/100.0
-            return "none", 0.0
-        else:
-            if dx < -front_thresh:
-                return "front", (-dx - front_thresh)/100.0
-            if dx > front_thresh:
-                return "back", (dx - front_thresh)/100.0
-            if abs(dx) > side_thresh:
-                return "side", (abs(dx)-side_thresh)/100.0
-            return "none", 0.0
-
-    left_type, left_forward_score = leg_type_and_forward_score(left_dx, True)
-    right_type, right_forward_score = leg_type_and_forward_score(right_dx, False)
-
-    def kick_score(knee_angle, forward_score, speed, lifted):
-        s_angle = np.clip((knee_angle - 140.0)/40.0, 0.0, 1.0)
-        s_forward = np.clip(forward_score, 0.0, 1.0)
-        s_speed = np.clip(speed/40.0, 0.0, 1.0)
-        s_lift = 0.5 if lifted else 0.0
-        return np.clip((s_angle + s_forward + s_speed + s_lift)/4.0, 0.0, 1.0)
-
-    left_conf = kick_score(left_knee_angle, left_forward_score, left_speed, left_lift)
-    right_conf = kick_score(right_knee_angle, right_forward_score, right_speed, right_lift)
-
-    return left_conf, right_conf, left_type, right_type
+class PoseTracker:
+    """Owns the wrist/ankle history of a single stream."""
+
+    def __init__(self):
+        # Previous MOTION_JOINTS positions, NaN until the first frame
+        self.last_positions = np.full((4, 2), np.nan)
+        self.last_seen = time.monotonic()
+        self._lock = threading.Lock()
+
+    def update(self, kp):
+        self.last_positions = kp[list(MOTION_JOINTS)].copy()
+        self.last_seen = time.monotonic()
+
+    def detect(self, keypoints, delta_time=1.0):
+        # Only frames of the same stream serialize here
+        with self._lock:
+            return detect_action(keypoints, delta_time, tracker=self)
+
+    def detect_sequence(self, keypoints, delta_time=1.0):
+        with self._lock:
+            return detect_sequence(keypoints, delta_time, tracker=self)
+
+
+class TrackerRegistry:
+    """
+    Bounded map of stream id -> PoseTracker.
+
+    Least recently used trackers are dropped once max_trackers is reached,
+    and trackers idle for longer than idle_timeout seconds are swept lazily.
+    """
+
+    def __init__(self, max_trackers=1024, idle_timeout=60.0, factory=PoseTracker):
+        self.max_trackers = max_trackers
+        self.idle_timeout = idle_timeout
+        self.factory = factory
+        self._trackers = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            tracker = self._trackers.get(key)
+            if tracker is None:
+                tracker = self.factory()
+                self._trackers[key] = tracker
+            else:
+                self._trackers.move_to_end(key)
+            tracker.last_seen = now
+            self._evict(now)
+            return tracker
+
+    def pop(self, key):
+        with self._lock:
+            return self._trackers.pop(key, None)
+
+    def keys(self):
+        with self._lock:
+            return list(self._trackers)
+
+    def __len__(self):
+        return len(self._trackers)
+
+    def _evict(self, now):
+        # Entries are kept in last-used order, so idle ones sit at the front
+        while self._trackers:
+            key, oldest = next(iter(self._trackers.items()))
+            if len(self._trackers) <= self.max_trackers and now - oldest.last_seen < self.idle_timeout:
+                break
+            del self._trackers[key]
+
+
+class MultiPoseTracker:
+    """
+    Track-id association and motion history for M people in one stream.
+
+    Detections are matched to existing tracks greedily on a vectorized cost
+    matrix: centroid distance divided by the larger of the two bounding box
+    diagonals. Pairs costing more than max_match_cost start new tracks, and
+    tracks unseen for idle_timeout seconds are dropped. All track state lives
+    in parallel arrays so a frame costs a handful of array operations.
+    """
+
+    def __init__(self, max_tracks=64, idle_timeout=2.0, max_match_cost=0.5):
+        self.max_tracks = max_tracks
+        self.idle_timeout = idle_timeout
+        self.max_match_cost = max_match_cost
+        self.last_seen = time.monotonic()
+        self._lock = threading.Lock()
+        self._next_id = 1
+
+        self.track_ids = np.empty(0, dtype=int)
+        self.centroids = np.empty((0, 2))
+        self.scales = np.empty(0)
+        self.history = np.empty((0, len(MOTION_JOINTS), 2))
+        self.seen = np.empty(0)
+
+    def __len__(self):
+        return len(self.track_ids)
+
+    def _match(self, centroids, scales):
+        """Track row for every detection, -1 where it starts a new track."""
+        matches = np.full(len(centroids), -1)
+        if not len(self.track_ids) or not len(centroids):
+            return matches
+
+        dist = _norm(centroids[:, None] - self.centroids[None])
+        cost = dist / np.maximum(np.maximum(scales[:, None], self.scales[None]), 1.0)
+
+        order = np.argsort(cost, axis=None)
+        order = order[cost.ravel()[order] <= self.max_match_cost]
+        det_used = np.zeros(len(centroids), dtype=bool)
+        track_used = np.zeros(len(self.track_ids), dtype=bool)
+        for det, track in zip(*np.unravel_index(order, cost.shape)):
+            if not det_used[det] and not track_used[track]:
+                matches[det] = track
+                det_used[det] = track_used[track] = True
+        return matches
+
+    def detect(self, poses, delta_time=1.0, now=None):
+        """
+        poses: (M, 17, 2). Returns one {"track_id", "label", "confidences",
+        "bbox"} dict per pose, in input order.
+        """
+        kp = np.asarray(poses, dtype=float)
+        now = time.monotonic() if now is None else now
+
+        with self._lock:
+            self.last_seen = now
+            live = now - self.seen < self.idle_timeout
+            if not live.all():
+                self._keep(live)
+
+            lo, hi = kp.min(axis=1), kp.max(axis=1)
+            centroids = (lo + hi) / 2.0
+            scales = _norm(hi - lo)
+
+            matches = self._match(centroids, scales)
+            matched = matches >= 0
+            last_positions = np.full((len(kp), len(MOTION_JOINTS), 2), np.nan)
+            last_positions[matched] = self.history[matches[matched]]
+
+            conf = score_features(extract_features(kp, last_positions, delta_time))
+            labels = select_labels(conf)
+
+            # Assign ids to new people, then write back every track
+            ids = np.empty(len(kp), dtype=int)
+            ids[matched] = self.track_ids[matches[matched]]
+            new = np.flatnonzero(~matched)
+            ids[new] = np.arange(self._next_id, self._next_id + len(new))
+            self._next_id += len(new)
+
+            keep = np.ones(len(self.track_ids), dtype=bool)
+            keep[matches[matched]] = False
+            self.track_ids = np.concatenate([self.track_ids[keep], ids])
+            self.centroids = np.concatenate([self.centroids[keep], centroids])
+            self.scales = np.concatenate([self.scales[keep], scales])
+            self.history = np.concatenate([self.history[keep], kp[:, MOTION_JOINTS]])
+            self.seen = np.concatenate([self.seen[keep], np.full(len(kp), now)])
+            if len(self.track_ids) > self.max_tracks:
+                self._keep(np.argsort(self.seen)[-self.max_tracks:])
+
+        names = action_labels()
+        conf = _clip01(conf).tolist()
+        bboxes = np.concatenate([lo, hi], axis=1).tolist()
+        return [
+            {
+                "track_id": int(ids[i]),
+                "label": str(labels[i]),
+                "confidences": dict(zip(names, conf[i])),
+                "bbox": bboxes[i]
+            }
+            for i in range(len(kp))
+        ]
+
+    def _keep(self, index):
+        self.track_ids = self.track_ids[index]
+        self.centroids = self.centroids[index]
+        self.scales = self.scales[index]
+        self.history = self.history[index]
+        self.seen = self.seen[index]
+
+
+# Used when detect_action is called without a tracker
+_default_tracker = PoseTracker()
+
 
 # ---------------------------
-# Firearm pose detection
+# Unified action detector
 # ---------------------------
-def detect_firearm_pose_conf(kp, last_positions=None, delta_time=1.0):
-    Ls, Rs = kp[5], kp[6]
-    Le, Re = kp[7], kp[8]
-    Lw, Rw = kp[9], kp[10]
+def _action_result(label, conf, f):
+    """detect_action's result dict for one row of scores and features."""
+    confidences = dict(zip(action_labels(), _clip01(conf).tolist()))
 
-    left_elbow_angle = vector_angle(Ls, Le, Lw)
-    right_elbow_angle = vector_angle(Rs, Re, Rw)
+    extra = {
+        "left_kick_type": kick_type(f[FEATURE_INDEX["left_leg_dx"]], True),
+        "right_kick_type": kick_type(f[FEATURE_INDEX["right_leg_dx"]], False),
+        "torso_angle_deg": float(f[FEATURE_INDEX["torso_angle"]]),
+        "vertical_span_px": float(f[FEATURE_INDEX["vertical_span"]]),
+        "left_wrist_speed": float(f[FEATURE_INDEX["left_wrist_speed"]]),
+        "right_wrist_speed": float(f[FEATURE_INDEX["right_wrist_speed"]]),
+        "arm_symmetry": bool(f[FEATURE_INDEX["arm_asymmetry"]] < 25.0)
+    }
 
-    # Wrists roughly horizontal with shoulders
-    height_thresh = 40.0
-    left_height_ok = abs(Lw[1] - Ls[1]) < height_thresh
-    right_height_ok = abs(Rw[1] - Rs[1]) < height_thresh
+    return {"label": str(label), "confidences": confidences, "extra": extra}
 
-    # Wrists forward (X-axis)
-    left_forward_ok = (Ls[0] - Lw[0]) > 20.0
-    right_forward_ok = (Rw[0] - Rs[0]) > 20.0
 
-    # **New: wrist speed**
-    left_speed = compute_speed(last_positions.get("lw") if last_positions else None, Lw, delta_time)
-    right_speed = compute_speed(last_positions.get("rw") if last_positions else None, Rw, delta_time)
-    left_speed_ok = left_speed < 5.0  # slow movement
-    right_speed_ok = right_speed < 5.0
+def detect_action(keypoints, delta_time=1.0, tracker=None):
+    if tracker is None:
+        tracker = _default_tracker
 
-    # **New: arm symmetry**
-    arm_symmetry = abs((Lw[0]-Ls[0]) - (Rw[0]-Rs[0])) < 20.0
+    kp = np.asarray(keypoints, dtype=float)
+    features = extract_features(kp[None], tracker.last_positions[None], delta_time)
+    conf = score_features(features)
+    label = select_labels(conf)[0]
 
-    def arm_score(angle, height_ok, forward_ok, speed_ok):
-        s_angle = np.clip((angle - 150.0)/30.0, 0.0, 1.0)
-        s_height = 0.5 if height_ok else 0.0
-        s_forward = 0.5 if forward_ok else 0.0
-        s_speed = 0.5 if speed_ok else 0.0
-        return np.clip((s_angle + s_height + s_forward + s_speed)/4.0, 0.0, 1.0)
+    tracker.update(kp)
 
-    left_conf = arm_score(left_elbow_angle, left_height_ok, left_forward_ok, left_speed_ok)
-    right_conf = arm_score(right_elbow_angle, right_height_ok, right_forward_ok, right_speed_ok)
+    return _action_result(label, conf[0], features.values[0])
 
-    firearm_conf = (left_conf + right_conf)/2.0
-    # Penalize if arms not symmetric
-    if not arm_symmetry:
-        firearm_conf *= 0.7
 
-    return firearm_conf
+def detect_sequence(keypoints, delta_time=1.0, tracker=None):
+    """
+    detect_action over consecutive frames of one stream in a single pass.
 
+    Each frame's previous positions are the frame before it (the tracker's
+    history for the first one), so the results equal calling detect_action
+    frame by frame.
+    """
+    if tracker is None:
+        tracker = _default_tracker
 
-# ---------------------------
-# Unified action detector
-# ---------------------------
-def detect_action(keypoints, delta_time=1.0):
-    global _last_left_wrist, _last_right_wrist, _last_left_ankle, _last_right_ankle
-
-    kp = np.array(keypoints)
-    last_wrists = {"lw": _last_left_wrist, "rw": _last_right_wrist}
-    last_ankles = {"la": _last_left_ankle, "ra": _last_right_ankle}
-
-    # -------------------------
-    # Punch / Kick Detection
-    # -------------------------
-    left_punch_conf, right_punch_conf = detect_punch_conf(kp, last_wrists, delta_time)
-    left_kick_conf, right_kick_conf, left_kick_type, right_kick_type = detect_kick_conf(kp, last_ankles, delta_time)
-
-    # -------------------------
-    # Lying Detection
-    # -------------------------
-    torso_ang = torso_horizontal(kp)
-    y_span = vertical_height_range(kp)
-    torso_angle_threshold = 30.0
-    y_span_threshold = 120.0
-    lying_conf = 0.0
-    if (torso_ang < torso_angle_threshold) and (y_span < y_span_threshold):
-        s_angle = np.clip((torso_angle_threshold - torso_ang)/torso_angle_threshold, 0.0, 1.0)
-        s_height = np.clip((y_span_threshold - y_span)/y_span_threshold, 0.0, 1.0)
-        lying_conf = np.clip((s_angle + s_height)/2.0, 0.0, 1.0)
-
-    # -------------------------
-    # Improved Firearm Detection
-    # -------------------------
-    Ls, Rs = kp[5], kp[6]
-    Le, Re = kp[7], kp[8]
-    Lw, Rw = kp[9], kp[10]
-
-    left_elbow_angle = vector_angle(Ls, Le, Lw)
-    right_elbow_angle = vector_angle(Rs, Re, Rw)
-
-    # Wrist horizontal alignment
-    height_thresh = 40.0
-    left_height_ok = abs(Lw[1] - Ls[1]) < height_thresh
-    right_height_ok = abs(Rw[1] - Rs[1]) < height_thresh
-
-    # Forward extension
-    left_forward_ok = (Ls[0] - Lw[0]) > 20.0
-    right_forward_ok = (Rw[0] - Rs[0]) > 20.0
-
-    # Wrist speed (slow is better)
-    left_speed = compute_speed(last_wrists.get("lw"), Lw, delta_time)
-    right_speed = compute_speed(last_wrists.get("rw"), Rw, delta_time)
-    left_speed_ok = left_speed < 5.0
-    right_speed_ok = right_speed < 5.0
-
-    # Arm symmetry
-    arm_symmetry = abs((Lw[0]-Ls[0]) - (Rw[0]-Rs[0])) < 25.0
-
-    def arm_score(angle, height_ok, forward_ok, speed_ok):
-        s_angle = np.clip((angle - 150.0)/30.0, 0.0, 1.0)
-        s_height = 0.5 if height_ok else 0.0
-        s_forward = 0.5 if forward_ok else 0.0
-        s_speed = 0.5 if speed_ok else 0.0
-        return np.clip((s_angle + s_height + s_forward + s_speed)/4.0, 0.0, 1.0)
-
-    left_conf = arm_score(left_elbow_angle, left_height_ok, left_forward_ok, left_speed_ok)
-    right_conf = arm_score(right_elbow_angle, right_height_ok, right_forward_ok, right_speed_ok)
-
-    firearm_conf = (left_conf + right_conf)/2.0
-    if not arm_symmetry:
-        firearm_conf *= 0.7  # penalize asymmetry
-
-    # -------------------------
-    # Update last positions
-    # -------------------------
-    _last_left_wrist = kp[9].copy()
-    _last_right_wrist = kp[10].copy()
-    _last_left_ankle = kp[15].copy()
-    _last_right_ankle = kp[16].copy()
-
-    # -------------------------
-    # Thresholds & candidate selection
-    # -------------------------
-    threshold_punch = 0.55
-    threshold_kick = 0.5
-    threshold_lying = 0.45
-    threshold_firearm = 0.6
-
-    candidates = []
-    if left_punch_conf > threshold_punch:
-        candidates.append(("left_punch", left_punch_conf))
-    if right_punch_conf > threshold_punch:
-        candidates.append(("right_punch", right_punch_conf))
-    if left_kick_conf > threshold_kick:
-        candidates.append(("left_kick", left_kick_conf))
-    if right_kick_conf > threshold_kick:
-        candidates.append(("right_kick", right_kick_conf))
-    if lying_conf > threshold_lying:
-        candidates.append(("lying", lying_conf))
-    if firearm_conf > threshold_firearm:
-        candidates.append(("firearm", firearm_conf))
-
-    label = "neutral" if not candidates else max(candidates, key=lambda x: x[1])[0]
-
-    confidences = {
-        "left_punch": float(np.clip(left_punch_conf, 0.0, 1.0)),
-        "right_punch": float(np.clip(right_punch_conf, 0.0, 1.0)),
-        "left_kick": float(np.clip(left_kick_conf, 0.0, 1.0)),
-        "right_kick": float(np.clip(right_kick_conf, 0.0, 1.0)),
-        "lying": float(np.clip(lying_conf, 0.0, 1.0)),
-        "firearm": float(np.clip(firearm_conf, 0.0, 1.0))
-    }
+    kp = np.asarray(keypoints, dtype=float)
+    last_positions = np.empty((len(kp), len(MOTION_JOINTS), 2))
+    last_positions[0] = tracker.last_positions
+    last_positions[1:] = kp[:-1, MOTION_JOINTS]
 
-    extra = {
-        "left_kick_type": left_kick_type,
-        "right_kick_type": right_kick_type,
-        "torso_angle_deg": float(torso_ang),
-        "vertical_span_px": float(y_span),
-        "left_wrist_speed": float(left_speed),
-        "right_wrist_speed": float(right_speed),
-        "arm_symmetry": arm_symmetry
-    }
+    features = extract_features(kp, last_positions, delta_time)
+    conf = score_features(features)
+    labels = select_labels(conf)
+
+    tracker.update(kp[-1])
+
+    return [_action_result(labels[i], conf[i], features.values[i]) for i in range(len(kp))]
 
-    return {"label": label, "confidences": confidences, "extra": extra}
 
+# ---------------------------
+# Batched action detector
+# ---------------------------
+def detect_action_batch(keypoints, last_positions=None, delta_time=1.0):
+    """
+    Vectorized detect_action over a stack of poses.
+
+    keypoints: (N, 17, 2) array.
+    last_positions: optional (N, 4, 2) array of the previous lw, rw, la, ra
+        positions (see MOTION_JOINTS); NaN rows mean "no history".
+    delta_time: scalar or (N,) array, e.g. timestamps - previous timestamps.
+
+    Returns (labels, confidences): an (N,) array of label strings and an
+    (N, R) float array whose columns follow action_labels(). Scores match
+    detect_action row for row; no tracker state is read or updated.
+    """
+    kp = np.asarray(keypoints, dtype=float)
+    if kp.ndim != 3 or kp.shape[1:] != (17, 2):
+        raise ValueError("expected keypoints of shape (N, 17, 2)")
+
+    if last_positions is not None:
+        last_positions = np.asarray(last_positions, dtype=float)
+
+    conf = score_features(extract_features(kp, last_positions, delta_time))
+    return select_labels(conf), _clip01(conf)
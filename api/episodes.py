@@ -0,0 +1,173 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class Episode:
+    """One incident of a pose on one stream, from the first alert to the last."""
+
+    def __init__(self, stream, pose, confidence, now):
+        self.stream = stream
+        self.pose = pose
+        self.start = now
+        self.end = now
+        self.peak = confidence
+        self.samples = 1
+        # Set by the owner once the episode's event and image exist
+        self.event_id = None
+        self.image = None
+        self.image_confidence = None
+        self.image_fallback = None
+        self.image_written = False
+        self.image_saved = False
+        self.closed = False
+
+    def duration(self):
+        return self.end - self.start
+
+
+class EpisodeEngine:
+    """
+    Coalesces per-frame alerts into episodes keyed by (stream, pose).
+
+    An episode opens on a sample at or above open_threshold and is extended
+    by any later sample at or above close_threshold, so confidence wobbling
+    around the alert threshold does not split an incident. It closes once no
+    supporting sample arrived for close_after seconds, or after max_duration
+    so a never-ending incident still produces a record. At most max_open
+    episodes are tracked; past that the least recently active one is closed.
+
+    observe() runs on the alert path; closing happens on sweep(), normally
+    from the background thread started by start(), and calls on_close(episode).
+    """
+
+    def __init__(self, open_threshold=0.8, close_threshold=0.6, close_after=10.0,
+                 max_duration=300.0, max_open=1024, on_close=None):
+        if close_threshold > open_threshold:
+            raise ValueError("close_threshold must not exceed open_threshold")
+        self.open_threshold = open_threshold
+        self.close_threshold = close_threshold
+        self.close_after = close_after
+        self.max_duration = max_duration
+        self.max_open = max_open
+        self.on_close = on_close
+
+        # (stream, pose) -> Episode, least recently active first
+        self._open = OrderedDict()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.opened = 0
+        self.extended = 0
+        self.ignored = 0
+        self.closed = 0
+
+    def __len__(self):
+        return len(self._open)
+
+    def observe(self, stream, pose, confidence, now=None):
+        """
+        Feed one alert sample. Returns (episode, status) with status
+        "opened", "extended" or "ignored" (episode is None when ignored).
+        """
+        now = time.time() if now is None else now
+        key = (stream, pose)
+        closed = []
+
+        with self._lock:
+            episode = self._open.get(key)
+            if episode is not None and (
+                now - episode.end > self.close_after or now - episode.start >= self.max_duration
+            ):
+                closed.append(self._open.pop(key))
+                episode = None
+
+            if episode is not None and confidence >= self.close_threshold:
+                episode.end = now
+                episode.samples += 1
+                episode.peak = max(episode.peak, confidence)
+                self._open.move_to_end(key)
+                self.extended += 1
+                status = "extended"
+            elif episode is None and confidence >= self.open_threshold:
+                episode = self._open[key] = Episode(stream, pose, confidence, now)
+                self.opened += 1
+                status = "opened"
+                while len(self._open) > self.max_open:
+                    closed.append(self._open.popitem(last=False)[1])
+            else:
+                episode = None
+                self.ignored += 1
+                status = "ignored"
+
+        self._closed(closed)
+        return episode, status
+
+    def claim_image(self, episode, confidence):
+        """True if a snapshot at this confidence beats the episode's current one."""
+        with self._lock:
+            if episode.image_confidence is not None and confidence <= episode.image_confidence:
+                return False
+            episode.image_fallback = episode.image_confidence
+            episode.image_confidence = confidence
+            return True
+
+    def release_image(self, episode, confidence):
+        """Undo claim_image() for a snapshot that was never queued, unless a better one was claimed since."""
+        with self._lock:
+            if episode.image_confidence == confidence:
+                episode.image_confidence = episode.image_fallback
+
+    def sweep(self, now=None):
+        """Close every episode that timed out; returns them."""
+        now = time.time() if now is None else now
+        with self._lock:
+            expired = [
+                key for key, episode in self._open.items()
+                if now - episode.end > self.close_after or now - episode.start >= self.max_duration
+            ]
+            closed = [self._open.pop(key) for key in expired]
+        self._closed(closed)
+        return closed
+
+    def close_all(self):
+        with self._lock:
+            closed = list(self._open.values())
+            self._open.clear()
+        self._closed(closed)
+        return closed
+
+    def _closed(self, episodes):
+        # Callbacks run outside the lock; they usually write to the store
+        for episode in episodes:
+            self.closed += 1
+            if self.on_close is not None:
+                try:
+                    self.on_close(episode)
+                except Exception as e:
+                    print(f"Episode close callback failed: {e}")
+
+    def start(self, interval=1.0):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(interval,), name="episode-sweeper", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            self.sweep()
+
+    def stats(self):
+        return {
+            "open": len(self._open),
+            "opened": self.opened,
+            "extended": self.extended,
+            "ignored": self.ignored,
+            "closed": self.closed
+        }
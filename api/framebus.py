@@ -0,0 +1,203 @@
+import os
+import platform
+import select
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+MAGIC = 0x5355424D415246  # "FRAMBUS"
+# Header words (uint64)
+H_MAGIC, H_SLOTS, H_SLOT_BYTES, H_LATEST, H_FRAMES, H_READ_FAILURES, H_RECONNECTS, H_CONNECTED, H_OVERSIZE, \
+    H_HEARTBEAT = range(10)
+HEADER_WORDS = 16
+ALIGN = 64
+
+# The seqlock below has no explicit fences (NumPy stores cannot issue any),
+# so it needs a host that keeps stores in program order
+SUPPORTED = platform.machine().lower() in ("x86_64", "amd64", "i386", "i686", "x86")
+
+
+def _align(n):
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+class FrameRing:
+    """
+    Ring of decoded frames in a multiprocessing.shared_memory segment, written
+    by one capture process and read zero-copy by any number of others.
+
+    Every slot carries the sequence number of the frame in it. The writer
+    clears a slot's sequence before overwriting it and sets it once the
+    pixels and shape are in place, then advances the ring's latest sequence.
+    A reader looks a frame up by sequence and gets a read-only NumPy view of
+    the slot, which holds that frame until the writer comes round again,
+    slots - 1 frames later. Anything derived from a view (an encode, a
+    motion score) should be checked with valid(seq) before it is trusted.
+    This relies on stores becoming visible in program order, as they do on
+    x86; create() and attach() refuse to run anywhere else (see SUPPORTED).
+
+    A writer given a notify_fd (the write end of a pipe) writes a byte there
+    after each frame, so a reader can block in wait(..., notify=read_end)
+    instead of polling.
+
+    Frames are uint8, at most slot_bytes large; the writer counts and skips
+    bigger ones. The header also holds the capture process's counters, so
+    nothing but the segment name is ever passed between processes.
+    """
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        self.notify_fd = None
+        self.header = np.ndarray((HEADER_WORDS,), np.uint64, shm.buf)
+        if self.header[H_MAGIC] != MAGIC:
+            raise ValueError(f"{shm.name} is not a frame ring")
+        self.slots = int(self.header[H_SLOTS])
+        self.slot_bytes = int(self.header[H_SLOT_BYTES])
+
+        offset = HEADER_WORDS * 8
+        self.slot_seq = np.ndarray((self.slots,), np.uint64, shm.buf, offset)
+        offset += self.slots * 8
+        # height, width, channels (0 for single-channel 2-D frames)
+        self.slot_shape = np.ndarray((self.slots, 3), np.uint32, shm.buf, offset)
+        offset += self.slots * 12
+        self.slot_time = np.ndarray((self.slots,), np.float64, shm.buf, _align(offset))
+        offset = _align(_align(offset) + self.slots * 8)
+        self.slot_bytes_aligned = _align(self.slot_bytes)
+        self.data = np.ndarray((self.slots, self.slot_bytes_aligned), np.uint8, shm.buf, offset)
+
+    @classmethod
+    def create(cls, slots=4, slot_bytes=1920 * 1080 * 3, name=None):
+        _check_supported()
+        size = (
+            _align(_align(HEADER_WORDS * 8 + slots * 20) + slots * 8)
+            + slots * _align(slot_bytes)
+        )
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        header = np.ndarray((HEADER_WORDS,), np.uint64, shm.buf)
+        header[:] = 0
+        header[H_SLOTS] = slots
+        header[H_SLOT_BYTES] = slot_bytes
+        header[H_MAGIC] = MAGIC
+        del header
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        _check_supported()
+        shm = shared_memory.SharedMemory(name=name)
+        # Only the creator may unlink; without this the attaching process's
+        # resource tracker removes the segment when that process exits
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return cls(shm, owner=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def latest(self):
+        return int(self.header[H_LATEST])
+
+    def write(self, frame, timestamp=None):
+        """Copy a frame into the next slot; returns its sequence or None if it does not fit."""
+        if frame.dtype != np.uint8 or frame.nbytes > self.slot_bytes or frame.ndim not in (2, 3):
+            self.header[H_OVERSIZE] += 1
+            return None
+        seq = self.latest + 1
+        slot = seq % self.slots
+
+        self.slot_seq[slot] = 0
+        target = self.data[slot, :frame.nbytes].reshape(frame.shape)
+        np.copyto(target, frame)
+        self.slot_shape[slot] = (frame.shape[0], frame.shape[1], frame.shape[2] if frame.ndim == 3 else 0)
+        self.slot_time[slot] = time.monotonic() if timestamp is None else timestamp
+        self.slot_seq[slot] = seq
+        self.header[H_LATEST] = seq
+        self.header[H_FRAMES] += 1
+        if self.notify_fd is not None:
+            try:
+                os.write(self.notify_fd, b"\0")
+            except BlockingIOError:
+                # Pipe full: the reader has wakeups pending already
+                pass
+        return seq
+
+    def read(self, seq=None):
+        """(seq, view, monotonic timestamp) of a frame (default the newest), or None if gone."""
+        seq = self.latest if seq is None else seq
+        if seq <= 0:
+            return None
+        slot = seq % self.slots
+        if self.slot_seq[slot] != seq:
+            return None
+
+        height, width, channels = (int(v) for v in self.slot_shape[slot])
+        shape = (height, width, channels) if channels else (height, width)
+        view = self.data[slot, :height * width * max(channels, 1)].reshape(shape)
+        view.flags.writeable = False
+        timestamp = float(self.slot_time[slot])
+        # The writer may have started on this slot while the shape was read
+        if self.slot_seq[slot] != seq:
+            return None
+        return seq, view, timestamp
+
+    def valid(self, seq):
+        """True while the frame with this sequence has not been overwritten."""
+        return self.slot_seq[seq % self.slots] == seq
+
+    def wait(self, last_seq, timeout=None, notify=None, poll=0.002):
+        """
+        Block until a frame newer than last_seq exists; returns its seq or
+        None on timeout. With notify (the read end of the writer's pipe) this
+        sleeps until the writer signals, and raises EOFError once the writer
+        has closed its end; without it, it polls every poll seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            seq = self.latest
+            if seq > last_seq:
+                return seq
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+            if notify is None:
+                time.sleep(poll if remaining is None else min(poll, remaining))
+                continue
+            if select.select([notify], [], [], remaining)[0]:
+                if not os.read(notify, 4096):
+                    raise EOFError("frame writer closed its notify pipe")
+
+    def counters(self):
+        return {
+            "frames": int(self.header[H_FRAMES]),
+            "read_failures": int(self.header[H_READ_FAILURES]),
+            "reconnects": int(self.header[H_RECONNECTS]),
+            "connected": bool(self.header[H_CONNECTED]),
+            "oversize": int(self.header[H_OVERSIZE]),
+            # Monotonic milliseconds of the capture process's last sign of life
+            "heartbeat_ms": int(self.header[H_HEARTBEAT])
+        }
+
+    def set_counters(self, read_failures, reconnects, connected):
+        self.header[H_READ_FAILURES] = read_failures
+        self.header[H_RECONNECTS] = reconnects
+        self.header[H_CONNECTED] = int(connected)
+        self.header[H_HEARTBEAT] = int(time.monotonic() * 1000)
+
+    def close(self):
+        # Views into the segment must go before it can be unmapped
+        self.header = self.slot_seq = self.slot_shape = self.slot_time = self.data = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # A reader still holds a view; the mapping goes when that does
+            pass
+        if self.owner:
+            self.shm.unlink()
+
+
+def _check_supported():
+    if not SUPPORTED:
+        raise RuntimeError(f"FrameRing needs an x86 host, not {platform.machine()}")
@@ -0,0 +1,254 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+THUMB_DIR = "thumbs"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    name TEXT PRIMARY KEY,
+    bytes INTEGER,
+    etag TEXT,
+    created REAL,
+    accessed REAL
+);
+CREATE INDEX IF NOT EXISTS images_accessed ON images (accessed);
+CREATE INDEX IF NOT EXISTS images_created ON images (created);
+"""
+
+
+def content_etag(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class ImageStore:
+    """
+    Quota and index for the snapshot directory.
+
+    Every saved image gets a row in a small SQLite index (size, content hash
+    used as a strong ETag, creation and last access time) and a JPEG
+    thumbnail under thumbs/. evict() removes images older than max_age
+    seconds, then least recently accessed ones until the directory is back
+    under max_bytes, working from the index alone. Images for which
+    protect(names) says so (those of unreviewed events) are never evicted,
+    so the quota can be exceeded while they pile up. 0 / None disables
+    either limit. Images added less than grace seconds ago are never
+    evicted either: their event is only linked once the file is written, so
+    protect() cannot vouch for them yet.
+
+    Accesses are buffered in memory and written to the index on the next
+    evict(), so serving an image costs no write.
+    """
+
+    def __init__(self, img_dir, index_path, max_bytes=0, max_age=None, thumb_height=160,
+                 thumb_quality=70, protect=None, grace=60.0):
+        self.img_dir = img_dir
+        self.thumb_dir = os.path.join(img_dir, THUMB_DIR)
+        self.index_path = index_path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.thumb_height = thumb_height
+        self.thumb_quality = thumb_quality
+        self.protect = protect
+        self.grace = grace
+        os.makedirs(self.thumb_dir, exist_ok=True)
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+        self._touched = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.evicted = 0
+        self.evicted_bytes = 0
+        self.protected = 0
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            conn.executescript(_SCHEMA)
+        if conn.execute("SELECT COUNT(*) FROM images").fetchone()[0] == 0:
+            self._index_existing()
+        self.total_bytes = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM images").fetchone()[0]
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.index_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _index_existing(self):
+        """One-time scan so images saved before the index existed count towards the quota."""
+        rows = []
+        for entry in os.scandir(self.img_dir):
+            if not entry.is_file() or entry.name.endswith(".tmp"):
+                continue
+            with open(entry.path, "rb") as f:
+                etag = content_etag(f.read())
+            mtime = entry.stat().st_mtime
+            rows.append((entry.name, entry.stat().st_size, etag, mtime, mtime))
+        with self._conn() as conn:
+            conn.executemany("INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?)", rows)
+
+    def thumb_path(self, name):
+        return os.path.join(self.thumb_dir, name + ".jpg")
+
+    def _write_thumb(self, name, data):
+        # Imported here so opening the store does not pay for loading cv2
+        import cv2
+        img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError(f"{name} is not a decodable image")
+        height, width = img.shape[:2]
+        if height > self.thumb_height:
+            size = (max(1, round(width * self.thumb_height / height)), self.thumb_height)
+            img = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+        ok, buffer = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, self.thumb_quality])
+        if not ok:
+            raise ValueError(f"Failed to encode thumbnail for {name}")
+        path = self.thumb_path(name)
+        with open(path + ".tmp", "wb") as f:
+            f.write(buffer.tobytes())
+        os.replace(path + ".tmp", path)
+
+    def add(self, name, data):
+        """
+        Index an image just written to img_dir (re-adding a name replaces
+        it), then thumbnail it and enforce limits. The index row comes first
+        so a file whose thumbnail fails is still served and counted; the
+        thumbnail is retried on the first request for it.
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._conn()
+            with conn:
+                old = conn.execute("SELECT bytes FROM images WHERE name = ?", (name,)).fetchone()
+                conn.execute(
+                    "INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?)",
+                    (name, len(data), content_etag(data), now, now)
+                )
+            self.total_bytes += len(data) - (old["bytes"] if old else 0)
+        try:
+            self._write_thumb(name, data)
+        except Exception as e:
+            print(f"Failed to thumbnail {name}: {e}")
+        if self.max_bytes and self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def get(self, name):
+        """Index entry {name, bytes, etag, created, accessed} or None."""
+        row = self._conn().execute("SELECT * FROM images WHERE name = ?", (name,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def thumbnail(self, name):
+        """Path of name's thumbnail, generating it if an older image has none."""
+        path = self.thumb_path(name)
+        if not os.path.exists(path):
+            with open(os.path.join(self.img_dir, name), "rb") as f:
+                self._write_thumb(name, f.read())
+        return path
+
+    def touch(self, name):
+        with self._lock:
+            self._touched[name] = time.time()
+
+    def _flush_touches(self, conn):
+        with self._lock:
+            touched, self._touched = self._touched, {}
+        if touched:
+            with conn:
+                conn.executemany(
+                    "UPDATE images SET accessed = ? WHERE name = ?", ((t, name) for name, t in touched.items())
+                )
+
+    def _evict_rows(self, conn, query, params, done, batch_size=256):
+        """
+        Evict rows of query (ordered, with LIMIT ? OFFSET ? placeholders last)
+        until done() holds, skipping protected images.
+        """
+        evicted = []
+        skipped = 0
+        while not done():
+            rows = conn.execute(query, params + (batch_size, skipped)).fetchall()
+            if not rows:
+                break
+            protected = self.protect([row["name"] for row in rows]) if self.protect is not None else set()
+            for row in rows:
+                if done():
+                    break
+                if row["name"] in protected:
+                    # Still in the table, so later pages start after it
+                    skipped += 1
+                    self.protected += 1
+                    continue
+                self._remove(conn, row["name"], row["bytes"])
+                evicted.append(row["name"])
+        return evicted
+
+    def evict(self, now=None):
+        """Apply max_age, then max_bytes; returns the evicted names."""
+        now = time.time() if now is None else now
+        with self._evict_lock:
+            conn = self._conn()
+            self._flush_touches(conn)
+            evicted = []
+            if self.max_age:
+                evicted += self._evict_rows(
+                    conn, "SELECT name, bytes FROM images WHERE created < ? ORDER BY created LIMIT ? OFFSET ?",
+                    (now - self.max_age,), lambda: False
+                )
+            if self.max_bytes:
+                evicted += self._evict_rows(
+                    conn, "SELECT name, bytes FROM images WHERE created < ? ORDER BY accessed LIMIT ? OFFSET ?",
+                    (now - self.grace,), lambda: self.total_bytes <= self.max_bytes
+                )
+            return evicted
+
+    def _remove(self, conn, name, size):
+        for path in (os.path.join(self.img_dir, name), self.thumb_path(name)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            with conn:
+                conn.execute("DELETE FROM images WHERE name = ?", (name,))
+            self.total_bytes -= size
+        self.evicted += 1
+        self.evicted_bytes += size
+
+    def start(self, interval=60.0):
+        """Run evict() every interval seconds so max_age applies without new writes."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(interval,), name="image-evictor", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.evict()
+            except Exception as e:
+                print(f"Image eviction failed: {e}")
+
+    def stats(self):
+        return {
+            "images": self._conn().execute("SELECT COUNT(*) FROM images").fetchone()[0],
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "evicted": self.evicted,
+            "evicted_bytes": self.evicted_bytes,
+            "protected_skips": self.protected
+        }
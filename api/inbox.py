@@ -0,0 +1,195 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class LatestInbox:
+    """
+    Per-client mailbox that keeps only the newest unprocessed item, drained
+    by a fixed pool of worker threads.
+
+    A client never has more than one item waiting and one being processed,
+    so under overload work is dropped at the door instead of queueing up and
+    answers never lag by more than roughly one service time per busy client.
+    Items older than max_age when a worker reaches them are discarded too.
+    handler(key, item, skipped) gets the number of items replaced since the
+    last one processed for that key, so per-frame motion can be scaled.
+
+    Every client also gets a target interval between submissions: the
+    observed service time times the number of clients that sent something in
+    the last rate_period seconds, spread over the workers, clamped to [min_interval, max_interval]. on_rate(key, rate) is
+    called after processing when that figure moved by more than 25% or
+    rate_period seconds have passed since the client was last told.
+
+    Like TrackerRegistry, at most max_clients keys are tracked: the least
+    recently submitting ones are forgotten past that, and keys that have not
+    submitted for idle_timeout seconds are swept lazily on submit.
+    """
+
+    def __init__(self, handler, workers=4, max_age=1.0, min_interval=0.05, max_interval=2.0,
+                 rate_period=5.0, on_rate=None, max_clients=1024, idle_timeout=60.0):
+        self.handler = handler
+        self.workers = workers
+        self.max_age = max_age
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.rate_period = rate_period
+        self.on_rate = on_rate
+        self.max_clients = max_clients
+        self.idle_timeout = idle_timeout
+
+        self._cond = threading.Condition()
+        # key -> (item, submitted at, items replaced before it)
+        self._pending = {}
+        self._busy = set()
+        self._ready = deque()
+        # key -> counters, in last-submitted order
+        self._clients = OrderedDict()
+        # Smoothed handler time in seconds
+        self.service_time = 0.0
+
+        for i in range(workers):
+            threading.Thread(target=self._run, name=f"keypoint-worker-{i}", daemon=True).start()
+
+    def _client(self, key):
+        client = self._clients.get(key)
+        if client is None:
+            client = self._clients[key] = {
+                "received": 0, "processed": 0, "dropped": 0, "expired": 0,
+                "latency_ms": None, "last_submit": 0.0, "advertised": None, "advertised_at": 0.0
+            }
+        return client
+
+    def submit(self, key, item):
+        """Store item as key's newest frame; returns False if it replaced an unprocessed one."""
+        now = time.monotonic()
+        with self._cond:
+            client = self._client(key)
+            self._clients.move_to_end(key)
+            client["received"] += 1
+            client["last_submit"] = now
+            self._evict(now)
+            previous = self._pending.get(key)
+            skipped = 0
+            if previous is not None:
+                client["dropped"] += 1
+                skipped = previous[2] + 1
+            self._pending[key] = (item, now, skipped)
+            if previous is None and key not in self._busy:
+                self._ready.append(key)
+                self._cond.notify()
+        return previous is None
+
+    def remove(self, key):
+        """Forget key's waiting frame and counters."""
+        with self._cond:
+            self._pending.pop(key, None)
+            self._clients.pop(key, None)
+
+    def _evict(self, now):
+        # Entries are kept in last-submitted order, so idle ones sit at the front
+        while self._clients:
+            key, oldest = next(iter(self._clients.items()))
+            if len(self._clients) <= self.max_clients and now - oldest["last_submit"] < self.idle_timeout:
+                break
+            del self._clients[key]
+            self._pending.pop(key, None)
+
+    def keys(self):
+        with self._cond:
+            return list(self._clients)
+
+    def target_interval(self):
+        """Seconds between frames that shares the workers evenly between active clients."""
+        with self._cond:
+            since = time.monotonic() - self.rate_period
+            active = sum(1 for client in self._clients.values() if client["last_submit"] >= since)
+            interval = self.service_time * max(1, active) / self.workers
+        return min(self.max_interval, max(self.min_interval, interval))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._ready)
+                key = self._ready.popleft()
+                pending = self._pending.pop(key, None)
+                if pending is None:
+                    # Removed while waiting
+                    continue
+                item, submitted, skipped = pending
+                self._busy.add(key)
+
+            start = time.monotonic()
+            expired = start - submitted > self.max_age
+            if not expired:
+                try:
+                    self.handler(key, item, skipped)
+                except Exception as e:
+                    print(f"Keypoint handler failed for {key}: {e}")
+            end = time.monotonic()
+
+            rate = None
+            with self._cond:
+                self._busy.discard(key)
+                # A frame that arrived while this one ran goes to the back of the line
+                if key in self._pending:
+                    self._ready.append(key)
+                    self._cond.notify()
+
+                client = self._clients.get(key)
+                if client is not None:
+                    if expired:
+                        client["expired"] += 1
+                    else:
+                        client["processed"] += 1
+                        client["latency_ms"] = round((end - submitted) * 1000, 2)
+                        self.service_time += 0.1 * ((end - start) - self.service_time)
+                        rate = self._rate_update(client, end)
+
+            if rate is not None and self.on_rate is not None:
+                try:
+                    self.on_rate(key, rate)
+                except Exception as e:
+                    print(f"Keypoint rate callback failed for {key}: {e}")
+
+    def _rate_update(self, client, now):
+        interval = self.target_interval()
+        advertised = client["advertised"]
+        changed = advertised is None or abs(interval - advertised) > 0.25 * advertised
+        if not changed and now - client["advertised_at"] < self.rate_period:
+            return None
+        client["advertised"] = interval
+        client["advertised_at"] = now
+        return {
+            "interval_ms": round(interval * 1000),
+            "target_fps": round(1.0 / interval, 2),
+            "received": client["received"],
+            "processed": client["processed"],
+            "dropped": client["dropped"],
+            "expired": client["expired"]
+        }
+
+    def client_stats(self, key):
+        with self._cond:
+            client = self._clients.get(key)
+            if client is None:
+                return None
+            return {
+                k: v for k, v in client.items() if k not in ("last_submit", "advertised", "advertised_at")
+            }
+
+    def stats(self):
+        with self._cond:
+            clients = list(self._clients.values())
+            return {
+                "workers": self.workers,
+                "clients": len(clients),
+                "waiting": len(self._ready),
+                "busy": len(self._busy),
+                "service_ms": round(self.service_time * 1000, 3),
+                "target_interval_ms": round(self.target_interval() * 1000),
+                "received": sum(c["received"] for c in clients),
+                "processed": sum(c["processed"] for c in clients),
+                "dropped": sum(c["dropped"] for c in clients),
+                "expired": sum(c["expired"] for c in clients)
+            }
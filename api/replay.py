@@ -0,0 +1,247 @@
+"""
+Re-score recorded keypoint sequences offline.
+
+    python replay.py recorded.ndjson --out scored.ndjson
+    python replay.py recorded.npz --out scored.npz --workers 8
+    python replay.py recorded.npz --out scored.npz --threshold lying=0.5 --delta-time timestamps
+
+Input is either NDJSON, one frame per line:
+
+    {"stream_id": "cam1", "timestamp": 1718000000.25, "keypoints": [[x, y], ...]}
+
+or an .npz with a `keypoints` (N, 17, 2|3) array and optional `stream_ids`
+and `timestamps` (N,) arrays. Output rows follow the input order and carry
+the label and the clipped confidences, as NDJSON or .npz depending on --out.
+
+Each stream is scored exactly like the live keypoints handler would: frames
+are taken in timestamp order, every frame's motion history is the previous
+frame of the same stream, and history is dropped after a gap longer than
+the tracker idle timeout. Because that history only ever reaches one frame
+back, it is resolved up front and the scoring itself splits into
+independent chunks that run on a process pool.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+from detector import MOTION_JOINTS, action_labels, extract_features, score_features, select_labels, _clip01
+
+# Same as POSE_TRACKER_IDLE_TIMEOUT in api.py
+DEFAULT_IDLE_TIMEOUT = 60.0
+DEFAULT_CHUNK_SIZE = 50000
+
+
+# ---------------------------
+# Input / output
+# ---------------------------
+def load_ndjson(path):
+    keypoints, stream_ids, timestamps = [], [], []
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                frame = json.loads(line)
+                keypoints.append(frame["keypoints"])
+            except (ValueError, KeyError, TypeError) as e:
+                raise ValueError(f"{path}:{line_number}: {e}") from None
+            stream_ids.append(str(frame.get("stream_id", "")))
+            timestamps.append(frame.get("timestamp"))
+
+    if any(ts is None for ts in timestamps):
+        timestamps = None
+    return (
+        np.array(keypoints, dtype=float),
+        np.array(stream_ids),
+        None if timestamps is None else np.array(timestamps, dtype=float)
+    )
+
+
+def load_npz(path):
+    with np.load(path) as data:
+        keypoints = np.asarray(data["keypoints"], dtype=float)
+        stream_ids = data["stream_ids"].astype(str) if "stream_ids" in data else np.full(len(keypoints), "")
+        timestamps = np.asarray(data["timestamps"], dtype=float) if "timestamps" in data else None
+    return keypoints, stream_ids, timestamps
+
+
+def load(path):
+    keypoints, stream_ids, timestamps = load_npz(path) if path.endswith(".npz") else load_ndjson(path)
+    if keypoints.ndim != 3 or keypoints.shape[1] != 17 or keypoints.shape[2] not in (2, 3):
+        raise ValueError(f"{path}: expected frames of 17 keypoints, got shape {keypoints.shape}")
+    if len(stream_ids) != len(keypoints) or (timestamps is not None and len(timestamps) != len(keypoints)):
+        raise ValueError(f"{path}: stream_ids/timestamps must have one entry per frame")
+    return keypoints[:, :, :2], stream_ids, timestamps
+
+
+def write_ndjson(path, labels, confidences, stream_ids, timestamps):
+    names = action_labels()
+    conf = confidences.tolist()
+    with open(path, "w") as f:
+        for i, label in enumerate(labels.tolist()):
+            f.write(json.dumps({
+                "stream_id": stream_ids[i],
+                "timestamp": None if timestamps is None else float(timestamps[i]),
+                "label": label,
+                "confidences": dict(zip(names, conf[i]))
+            }) + "\n")
+
+
+def write_npz(path, labels, confidences, stream_ids, timestamps):
+    # Labels are stored as indexes into label_names, which is action_labels()
+    # followed by "neutral"; confidence columns follow action_labels()
+    names = np.array(action_labels() + ("neutral",))
+    index = {name: i for i, name in enumerate(names.tolist())}
+    found, codes = np.unique(labels, return_inverse=True)
+    arrays = {
+        "labels": np.array([index[label] for label in found.tolist()], np.uint8)[codes],
+        "confidences": confidences.astype(np.float32),
+        "label_names": names,
+        "stream_ids": stream_ids
+    }
+    if timestamps is not None:
+        arrays["timestamps"] = timestamps
+    np.savez(path, **arrays)
+
+
+# ---------------------------
+# Scoring
+# ---------------------------
+def stream_order(stream_ids, timestamps):
+    """Row order grouping each stream's frames, in time order within a stream."""
+    _, stream_index = np.unique(stream_ids, return_inverse=True)
+    if timestamps is None:
+        return np.argsort(stream_index, kind="stable")
+    return np.lexsort((timestamps, stream_index))
+
+
+def motion_history(keypoints, stream_ids, timestamps, idle_timeout):
+    """
+    (N, 4, 2) previous MOTION_JOINTS positions for rows already in stream
+    order, NaN on each stream's first frame and after idle gaps.
+    """
+    last_positions = np.full((len(keypoints), len(MOTION_JOINTS), 2), np.nan)
+    if len(keypoints) < 2:
+        return last_positions
+
+    continues = stream_ids[1:] == stream_ids[:-1]
+    if timestamps is not None and idle_timeout:
+        continues &= np.diff(timestamps) <= idle_timeout
+    rows = np.flatnonzero(continues) + 1
+    last_positions[rows] = keypoints[rows - 1][:, MOTION_JOINTS]
+    return last_positions
+
+
+def frame_intervals(stream_ids, timestamps):
+    """Per-row delta_time from timestamps; 1.0 where there is no valid previous frame."""
+    dt = np.ones(len(stream_ids))
+    if len(stream_ids) > 1:
+        gaps = np.diff(timestamps)
+        valid = (stream_ids[1:] == stream_ids[:-1]) & (gaps > 0)
+        dt[1:][valid] = gaps[valid]
+    return dt
+
+
+def score_chunk(args):
+    keypoints, last_positions, delta_time, thresholds = args
+    conf = score_features(extract_features(keypoints, last_positions, delta_time))
+    return select_labels(conf, thresholds), _clip01(conf)
+
+
+def replay(keypoints, stream_ids, timestamps=None, delta_time="frame", idle_timeout=DEFAULT_IDLE_TIMEOUT,
+           thresholds=None, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Score every frame; returns (labels, confidences) in input order.
+
+    delta_time is "frame" (1.0 per frame, like the live handler) or
+    "timestamps" (seconds since the stream's previous frame).
+    """
+    if delta_time == "timestamps" and timestamps is None:
+        raise ValueError("delta_time='timestamps' needs timestamps")
+
+    order = stream_order(stream_ids, timestamps)
+    kp = keypoints[order]
+    ids = stream_ids[order]
+    ts = None if timestamps is None else timestamps[order]
+
+    last_positions = motion_history(kp, ids, ts, idle_timeout)
+    dt = frame_intervals(ids, ts) if delta_time == "timestamps" else np.ones(len(kp))
+
+    chunks = [
+        (kp[start:start + chunk_size], last_positions[start:start + chunk_size], dt[start:start + chunk_size], thresholds)
+        for start in range(0, len(kp), chunk_size)
+    ]
+    if workers == 1 or len(chunks) <= 1:
+        results = [score_chunk(chunk) for chunk in chunks]
+    else:
+        with Pool(workers) as pool:
+            results = pool.map(score_chunk, chunks)
+
+    if not results:
+        return np.empty(0, dtype=str), np.empty((0, len(action_labels())))
+    scored_labels = np.concatenate([chunk_labels for chunk_labels, _ in results])
+    scored_conf = np.concatenate([chunk_conf for _, chunk_conf in results])
+    labels, confidences = np.empty_like(scored_labels), np.empty_like(scored_conf)
+    labels[order] = scored_labels
+    confidences[order] = scored_conf
+    return labels, confidences
+
+
+def parse_thresholds(values):
+    thresholds = {}
+    for value in values or ():
+        label, sep, threshold = value.partition("=")
+        if not sep:
+            raise ValueError(f"--threshold expects LABEL=VALUE, got {value!r}")
+        thresholds[label] = float(threshold)
+    return thresholds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="recorded keypoints (.ndjson or .npz)")
+    parser.add_argument("--out", required=True, help="scored output (.ndjson or .npz)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="scoring processes")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="frames per pool task")
+    parser.add_argument("--delta-time", choices=("frame", "timestamps"), default="frame",
+                        help="speed per frame like the live server, or per second from timestamps")
+    parser.add_argument("--idle-timeout", type=float, default=DEFAULT_IDLE_TIMEOUT,
+                        help="seconds without frames after which a stream's motion history resets (0 = never)")
+    parser.add_argument("--threshold", action="append", metavar="LABEL=VALUE",
+                        help="override a rule threshold, e.g. lying=0.5 (repeatable)")
+    args = parser.parse_args(argv)
+
+    try:
+        thresholds = parse_thresholds(args.threshold)
+        start = time.perf_counter()
+        keypoints, stream_ids, timestamps = load(args.input)
+        loaded = time.perf_counter()
+        labels, confidences = replay(
+            keypoints, stream_ids, timestamps, args.delta_time, args.idle_timeout,
+            thresholds, args.workers, args.chunk_size
+        )
+        scored = time.perf_counter()
+        writer = write_npz if args.out.endswith(".npz") else write_ndjson
+        writer(args.out, labels, confidences, stream_ids, timestamps)
+    except (OSError, ValueError) as e:
+        print(f"replay: {e}", file=sys.stderr)
+        return 1
+
+    frames = len(labels)
+    print(
+        f"{frames} frames from {len(np.unique(stream_ids))} streams: "
+        f"load {loaded - start:.2f}s, score {scored - loaded:.2f}s "
+        f"({frames / max(scored - loaded, 1e-9) * 60:,.0f} frames/min), "
+        f"write {time.perf_counter() - scored:.2f}s",
+        file=sys.stderr
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
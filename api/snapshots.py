@@ -0,0 +1,152 @@
+import base64
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+# Re-encoding targets: format -> (file extension, cv2 quality flag name).
+# cv2 is only imported once something is re-encoded; it is slow to load.
+SNAPSHOT_FORMATS = {
+    "jpeg": (".jpg", "IMWRITE_JPEG_QUALITY"),
+    "webp": (".webp", "IMWRITE_WEBP_QUALITY")
+}
+
+
+def decode_data_url(snapshot_b64):
+    """Raw bytes of a base64 snapshot, with or without a data: URL prefix."""
+    if "," in snapshot_b64:
+        _, snapshot_b64 = snapshot_b64.split(",", 1)
+    return base64.b64decode(snapshot_b64)
+
+
+class SnapshotWriter:
+    """
+    Bounded background queue that decodes, optionally re-encodes and writes
+    alert snapshots, then runs the job's callback (e.g. logging the event).
+    call() queues plain store writes on the same thread, so an event logged
+    through it is in the store before any snapshot submitted after it lands.
+
+    submit() never blocks: when the queue is full the job is rejected and
+    counted as dropped so a burst of alerts cannot stall the socket handlers.
+    """
+
+    def __init__(self, img_dir, image_format=None, quality=85, max_queue=64, workers=1, on_write=None,
+                 image_store=None):
+        if image_format is not None and image_format not in SNAPSHOT_FORMATS:
+            raise ValueError(f"image_format must be one of {', '.join(SNAPSHOT_FORMATS)}")
+        self.img_dir = img_dir
+        self.image_format = image_format
+        self.quality = quality
+        # on_write(seconds, ok) after every write attempt, e.g. for metrics
+        self.on_write = on_write
+        # ImageStore that indexes and thumbnails every written snapshot
+        self.image_store = image_store
+        self._queue = queue.Queue(maxsize=max_queue)
+
+        self.written = 0
+        self.dropped = 0
+        # call() jobs turned away; the caller runs those itself, so they are
+        # not dropped snapshots
+        self.calls_rejected = 0
+        self.failed = 0
+        self.last_write_ms = None
+
+        for i in range(workers):
+            threading.Thread(target=self._run, name=f"snapshot-writer-{i}", daemon=True).start()
+
+    @property
+    def extension(self):
+        return SNAPSHOT_FORMATS[self.image_format][0] if self.image_format else ".png"
+
+    def submit(self, snapshot_b64, filename, on_done=None):
+        """
+        Queue one snapshot. on_done(filename or None) runs on the writer
+        thread once the file is on disk (None if it could not be written).
+        Returns False if the queue is full.
+        """
+        try:
+            self._queue.put_nowait((snapshot_b64, filename, on_done))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def call(self, fn):
+        """Queue fn() behind the pending snapshots; returns False if the queue is full."""
+        try:
+            self._queue.put_nowait((None, None, fn))
+        except queue.Full:
+            self.calls_rejected += 1
+            return False
+        return True
+
+    def _encode(self, data):
+        if self.image_format is None:
+            return data
+        import cv2
+        img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError("Snapshot is not a decodable image")
+        ext, flag = SNAPSHOT_FORMATS[self.image_format]
+        ok, buffer = cv2.imencode(ext, img, [getattr(cv2, flag), self.quality])
+        if not ok:
+            raise ValueError(f"Failed to encode snapshot as {self.image_format}")
+        return buffer.tobytes()
+
+    def _write(self, snapshot_b64, filename):
+        data = self._encode(decode_data_url(snapshot_b64))
+        filepath = os.path.join(self.img_dir, filename)
+        # Write then rename so /imgs never serves a half-written file
+        tmp_path = filepath + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, filepath)
+        if self.image_store is not None:
+            try:
+                self.image_store.add(filename, data)
+            except Exception as e:
+                print(f"Failed to index snapshot {filename}: {e}")
+
+    def _run(self):
+        while True:
+            snapshot_b64, filename, on_done = self._queue.get()
+            if snapshot_b64 is None:
+                try:
+                    on_done()
+                except Exception as e:
+                    print(f"Snapshot writer job failed: {e}")
+                self._queue.task_done()
+                continue
+
+            start = time.perf_counter()
+            try:
+                self._write(snapshot_b64, filename)
+                self.written += 1
+            except Exception as e:
+                print(f"Failed to save snapshot {filename}: {e}")
+                self.failed += 1
+                filename = None
+            elapsed = time.perf_counter() - start
+            self.last_write_ms = round(elapsed * 1000, 2)
+            if self.on_write is not None:
+                self.on_write(elapsed, filename is not None)
+
+            if on_done is not None:
+                try:
+                    on_done(filename)
+                except Exception as e:
+                    print(f"Snapshot callback failed: {e}")
+            self._queue.task_done()
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "capacity": self._queue.maxsize,
+            "written": self.written,
+            "dropped": self.dropped,
+            "calls_rejected": self.calls_rejected,
+            "failed": self.failed,
+            "last_write_ms": self.last_write_ms
+        }
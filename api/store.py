@@ -0,0 +1,591 @@
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# Columns stored natively; any other event key goes to the JSON "extra" column
+EVENT_FIELDS = ("timestamp", "pose", "confidence", "status", "image-path")
+_COLUMNS = {"image-path": "image_path"}
+
+# Newest events kept in memory for /api/latest and recent-event queries
+RECENT_CACHE_SIZE = 500
+
+# Deleted ids remembered for `since` delta queries; older deltas must reload
+MAX_TOMBSTONES = 10000
+
+_SCHEMA = [
+    # 1: events table and lookup indexes
+    """
+    CREATE TABLE IF NOT EXISTS events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TEXT,
+        pose TEXT,
+        confidence NUMERIC,
+        status TEXT,
+        image_path TEXT,
+        extra TEXT
+    );
+    CREATE INDEX IF NOT EXISTS events_timestamp ON events (timestamp);
+    CREATE INDEX IF NOT EXISTS events_pose ON events (pose);
+    CREATE INDEX IF NOT EXISTS events_status ON events (status);
+    """,
+    # 2: change tracking. Every write bumps meta.version and stamps the row's
+    # seq with it; deletes leave a tombstone. Triggers keep this in sync for
+    # any statement touching the table.
+    """
+    CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER);
+    CREATE TABLE IF NOT EXISTS tombstones (id INTEGER PRIMARY KEY, seq INTEGER);
+    CREATE INDEX IF NOT EXISTS tombstones_seq ON tombstones (seq);
+    ALTER TABLE events ADD COLUMN seq INTEGER;
+    UPDATE events SET seq = id;
+    CREATE INDEX IF NOT EXISTS events_seq ON events (seq);
+    INSERT OR REPLACE INTO meta VALUES ('version', (SELECT COALESCE(MAX(id), 0) FROM events));
+    INSERT OR REPLACE INTO meta VALUES ('tombstone_floor', 0);
+
+    CREATE TRIGGER IF NOT EXISTS events_insert AFTER INSERT ON events BEGIN
+        UPDATE meta SET value = value + 1 WHERE key = 'version';
+        UPDATE events SET seq = (SELECT value FROM meta WHERE key = 'version') WHERE id = NEW.id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS events_update
+    AFTER UPDATE OF timestamp, pose, confidence, status, image_path, extra ON events BEGIN
+        UPDATE meta SET value = value + 1 WHERE key = 'version';
+        UPDATE events SET seq = (SELECT value FROM meta WHERE key = 'version') WHERE id = NEW.id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS events_delete AFTER DELETE ON events BEGIN
+        UPDATE meta SET value = value + 1 WHERE key = 'version';
+        INSERT OR REPLACE INTO tombstones VALUES (OLD.id, (SELECT value FROM meta WHERE key = 'version'));
+    END;
+    """
+]
+
+# Rollup dimensions: name -> SQL bucket expression over an events row ({row}
+# is NEW, OLD or events). Every rollup row also carries the pose and status,
+# so cross tabs like day x status need no extra dimension.
+CONFIDENCE_BUCKET = 10
+ROLLUP_DIMENSIONS = {
+    "all": "''",
+    "day": "COALESCE(substr({row}.timestamp, 1, 10), '')",
+    "hour": "COALESCE(substr({row}.timestamp, 1, 13), '')",
+    "camera": "COALESCE(json_extract({row}.extra, '$.stream_id'), '')",
+    "confidence": (
+        f"COALESCE(MIN(MAX(CAST({{row}}.confidence AS INTEGER), 0), 99) "
+        f"/ {CONFIDENCE_BUCKET} * {CONFIDENCE_BUCKET}, '')"
+    )
+}
+
+
+def _rollup_rebuild_sql():
+    selects = " UNION ALL ".join(
+        f"SELECT '{name}', {bucket.format(row='events')}, COALESCE(pose, ''), COALESCE(status, ''), COUNT(*) "
+        f"FROM events GROUP BY 2, 3, 4"
+        for name, bucket in ROLLUP_DIMENSIONS.items()
+    )
+    return f"DELETE FROM rollups; INSERT INTO rollups (dimension, bucket, pose, status, count) {selects};"
+
+
+def _rollup_trigger_sql(row, delta):
+    statements = []
+    for name, bucket in ROLLUP_DIMENSIONS.items():
+        key = f"'{name}', {bucket.format(row=row)}, COALESCE({row}.pose, ''), COALESCE({row}.status, '')"
+        statements.append(
+            f"INSERT INTO rollups (dimension, bucket, pose, status, count) VALUES ({key}, {delta}) "
+            f"ON CONFLICT (dimension, bucket, pose, status) DO UPDATE SET count = count + {delta};"
+        )
+        if delta < 0:
+            # By primary key; a scan of the whole table per row made bulk edits crawl
+            statements.append(
+                f"DELETE FROM rollups WHERE (dimension, bucket, pose, status) = ({key}) AND count <= 0;"
+            )
+    return "\n".join(statements)
+
+
+_ROLLUP_TRIGGERS = f"""
+    CREATE TRIGGER IF NOT EXISTS rollups_insert AFTER INSERT ON events BEGIN
+        {_rollup_trigger_sql("NEW", 1)}
+    END;
+    CREATE TRIGGER IF NOT EXISTS rollups_update
+    AFTER UPDATE OF timestamp, pose, confidence, status, extra ON events
+    WHEN OLD.timestamp IS NOT NEW.timestamp OR OLD.pose IS NOT NEW.pose
+        OR OLD.status IS NOT NEW.status OR OLD.confidence IS NOT NEW.confidence
+        OR json_extract(OLD.extra, '$.stream_id') IS NOT json_extract(NEW.extra, '$.stream_id')
+    BEGIN
+        {_rollup_trigger_sql("OLD", -1)}
+        {_rollup_trigger_sql("NEW", 1)}
+    END;
+    CREATE TRIGGER IF NOT EXISTS rollups_delete AFTER DELETE ON events BEGIN
+        {_rollup_trigger_sql("OLD", -1)}
+    END;
+"""
+
+_SCHEMA.append(
+    # 3: per-bucket counts for /api/stats, kept current by triggers so chart
+    # queries read O(buckets) rows instead of the whole log
+    f"""
+    CREATE TABLE IF NOT EXISTS rollups (
+        dimension TEXT, bucket TEXT, pose TEXT, status TEXT, count INTEGER,
+        PRIMARY KEY (dimension, bucket, pose, status)
+    ) WITHOUT ROWID;
+    {_rollup_rebuild_sql()}
+
+    {_ROLLUP_TRIGGERS}
+    """
+)
+
+_SCHEMA.append(
+    # 4: image lookups for snapshot eviction
+    """
+    CREATE INDEX IF NOT EXISTS events_image_path ON events (image_path);
+    """
+)
+
+SCHEMA_VERSION = len(_SCHEMA)
+
+
+def _column(field):
+    return _COLUMNS.get(field, field)
+
+
+class TailCache:
+    """
+    Write-through copy of the newest events, bounded to `capacity` entries.
+
+    The cache always holds a contiguous tail of the log: every stored event
+    with an id >= the oldest cached id. `complete` means it holds the whole
+    log, so an empty cache is an authoritative "no events" answer.
+    """
+
+    def __init__(self, capacity=RECENT_CACHE_SIZE):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._events = OrderedDict()
+        self._loaded = False
+        self.complete = False
+
+    def load(self, newest_first, complete):
+        self._events = OrderedDict((e["id"], e) for e in reversed(newest_first))
+        self.complete = complete
+        self._loaded = True
+
+    def invalidate(self):
+        self._events.clear()
+        self._loaded = False
+
+    def append(self, event):
+        if not self._loaded:
+            return
+        self._events[event["id"]] = event
+        if len(self._events) > self.capacity:
+            self._events.popitem(last=False)
+            self.complete = False
+
+    def replace(self, event):
+        if event["id"] in self._events:
+            self._events[event["id"]] = event
+
+    def remove(self, event_id):
+        self._events.pop(event_id, None)
+
+    def clear(self):
+        self._events.clear()
+        self.complete = True
+        self._loaded = True
+
+    def recent(self, n):
+        """Newest-first list of n events, or None when the cache cannot answer."""
+        if self._loaded and (n <= len(self._events) or self.complete):
+            self.hits += 1
+            events = reversed(self._events.values())
+            return [dict(e) for _, e in zip(range(n), events)]
+        self.misses += 1
+        return None
+
+    def stats(self):
+        return {
+            "size": len(self._events),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+class EventStore:
+    """
+    SQLite-backed suspicious pose log.
+
+    Every append, update and delete is a single indexed statement in its own
+    transaction, so the cost no longer grows with the size of the history.
+    Ids are assigned by AUTOINCREMENT and never reused, even after deletes.
+    """
+
+    def __init__(self, path, legacy_json=None, cache_size=RECENT_CACHE_SIZE):
+        self.path = path
+        self._local = threading.local()
+        # Held across each write and its cache update so the cache sees
+        # writes in commit order
+        self._write_lock = threading.Lock()
+        self.cache = TailCache(cache_size)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for step in range(version, SCHEMA_VERSION):
+            # executescript() commits whatever is open before it runs, so the
+            # step opens its own transaction and nothing after it may use
+            # executescript(); the step and its user_version bump land
+            # together or not at all
+            try:
+                conn.executescript("BEGIN; " + _SCHEMA[step])
+                if step == 0 and legacy_json:
+                    self._migrate_json(conn, legacy_json)
+                conn.execute(f"PRAGMA user_version = {step + 1}")
+                conn.commit()
+            except BaseException:
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
+
+    def _conn(self):
+        # One connection per thread; WAL lets readers run alongside a writer
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+        return conn
+
+    def _migrate_json(self, conn, legacy_json):
+        """One-shot import of the old suspicious_poses.json, in file order."""
+        if not os.path.exists(legacy_json):
+            return
+        try:
+            with open(legacy_json, 'r') as f:
+                events = json.load(f)
+        except (OSError, ValueError):
+            return
+        if not isinstance(events, list):
+            return
+        conn.executemany(
+            "INSERT INTO events (timestamp, pose, confidence, status, image_path, extra) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (self._to_row(event) for event in events if isinstance(event, dict))
+        )
+
+    @staticmethod
+    def _to_row(event):
+        extra = {k: v for k, v in event.items() if k not in EVENT_FIELDS and k != "id"}
+        return (
+            event.get("timestamp"),
+            event.get("pose"),
+            event.get("confidence"),
+            event.get("status"),
+            event.get("image-path"),
+            json.dumps(extra) if extra else None
+        )
+
+    @staticmethod
+    def _to_event(row):
+        event = {
+            "id": row["id"],
+            "timestamp": row["timestamp"],
+            "pose": row["pose"],
+            "confidence": row["confidence"],
+            "status": row["status"]
+        }
+        if row["image_path"] is not None:
+            event["image-path"] = row["image_path"]
+        if row["extra"]:
+            event.update(json.loads(row["extra"]))
+        return event
+
+    # ---------------------------
+    # Writes
+    # ---------------------------
+    def append(self, event):
+        conn = self._conn()
+        with self._write_lock:
+            with conn:
+                cur = conn.execute(
+                    "INSERT INTO events (timestamp, pose, confidence, status, image_path, extra) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    self._to_row(event)
+                )
+                row = conn.execute("SELECT * FROM events WHERE id = ?", (cur.lastrowid,)).fetchone()
+            stored = self._to_event(row)
+            self.cache.append(stored)
+        return dict(stored)
+
+    def update(self, event_id, fields):
+        """
+        Set fields on one event; returns the updated event or None. Native
+        fields are columns, anything else is merged into the extra JSON.
+        """
+        extra = {k: v for k, v in fields.items() if k not in EVENT_FIELDS and k != "id"}
+        fields = {k: v for k, v in fields.items() if k in EVENT_FIELDS}
+        assignments = [f"{_column(k)} = ?" for k in fields]
+        params = list(fields.values())
+        if extra:
+            assignments.append("extra = json_patch(COALESCE(extra, '{}'), ?)")
+            params.append(json.dumps(extra))
+
+        conn = self._conn()
+        with self._write_lock:
+            with conn:
+                if assignments:
+                    conn.execute(
+                        f"UPDATE events SET {', '.join(assignments)} WHERE id = ?",
+                        (*params, event_id)
+                    )
+                row = conn.execute("SELECT * FROM events WHERE id = ?", (event_id,)).fetchone()
+            if row is None:
+                return None
+            stored = self._to_event(row)
+            self.cache.replace(stored)
+        return dict(stored)
+
+    def delete(self, event_id):
+        """Remove one event; returns it, or None if it did not exist."""
+        conn = self._conn()
+        with self._write_lock:
+            with conn:
+                row = conn.execute("SELECT * FROM events WHERE id = ?", (event_id,)).fetchone()
+                if row is None:
+                    return None
+                conn.execute("DELETE FROM events WHERE id = ?", (event_id,))
+                self._prune_tombstones(conn)
+            self.cache.remove(event_id)
+        return self._to_event(row)
+
+    def update_many(self, fields, ids=None, **filters):
+        """
+        Set native fields on every event in ids (if given) that matches the
+        query() filters, in one transaction; returns how many matched. A
+        selection without any condition raises ValueError.
+        """
+        unknown = set(fields) - set(EVENT_FIELDS)
+        if unknown:
+            raise ValueError(f"cannot bulk update {', '.join(sorted(unknown))}")
+        clauses, params = self._where(ids, **filters)
+        if not clauses:
+            raise ValueError("bulk update needs ids or a filter")
+        sql = f"UPDATE events SET {', '.join(f'{_column(k)} = ?' for k in fields)} WHERE " + " AND ".join(clauses)
+
+        conn = self._conn()
+        with self._write_lock:
+            with conn:
+                count = conn.execute(sql, (*fields.values(), *params)).rowcount
+            # Cheaper to reload the tail on the next read than to patch it here
+            if count:
+                self.cache.invalidate()
+        return count
+
+    def delete_many(self, ids=None, **filters):
+        """
+        Remove every event in ids (if given) that matches the query()
+        filters, in one transaction; returns how many were deleted. A
+        selection without any condition raises ValueError; clear() empties
+        the log.
+        """
+        clauses, params = self._where(ids, **filters)
+        if not clauses:
+            raise ValueError("bulk delete needs ids or a filter")
+        sql = "DELETE FROM events WHERE " + " AND ".join(clauses)
+
+        conn = self._conn()
+        with self._write_lock:
+            with conn:
+                count = conn.execute(sql, params).rowcount
+                self._prune_tombstones(conn)
+            if count:
+                self.cache.invalidate()
+        return count
+
+    def clear(self):
+        conn = self._conn()
+        with self._write_lock:
+            with conn:
+                conn.execute("DELETE FROM events")
+                conn.execute("DELETE FROM rollups")
+                # Per-row tombstones are useless after a wipe; deltas from before
+                # this point get a reset instead
+                conn.execute("DELETE FROM tombstones")
+                conn.execute(
+                    "UPDATE meta SET value = (SELECT value FROM meta WHERE key = 'version') "
+                    "WHERE key = 'tombstone_floor'"
+                )
+            self.cache.clear()
+
+    def rebuild_rollups(self):
+        """Recount every rollup from the events table, e.g. after manual edits."""
+        with self._write_lock:
+            self._conn().executescript("BEGIN; " + _rollup_rebuild_sql() + " COMMIT;")
+
+    def _prune_tombstones(self, conn):
+        row = conn.execute(
+            "SELECT seq FROM tombstones ORDER BY seq DESC LIMIT 1 OFFSET ?", (MAX_TOMBSTONES,)
+        ).fetchone()
+        if row is not None:
+            conn.execute("DELETE FROM tombstones WHERE seq <= ?", (row[0],))
+            conn.execute("UPDATE meta SET value = ? WHERE key = 'tombstone_floor'", (row[0],))
+
+    # ---------------------------
+    # Reads
+    # ---------------------------
+    def get(self, event_id):
+        row = self._conn().execute("SELECT * FROM events WHERE id = ?", (event_id,)).fetchone()
+        return self._to_event(row) if row else None
+
+    def latest(self):
+        events = self.recent(1)
+        return events[0] if events else None
+
+    def recent(self, n):
+        """The n newest events, newest first; served from memory when possible."""
+        with self._write_lock:
+            events = self.cache.recent(n)
+            if events is not None:
+                return events
+
+            # Cold or too small: reload the tail (capped at the cache size)
+            limit = max(n, self.cache.capacity)
+            rows = self._conn().execute(
+                "SELECT * FROM events ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+            events = [self._to_event(row) for row in rows]
+            self.cache.load(
+                events[:self.cache.capacity],
+                complete=len(rows) < limit and len(rows) <= self.cache.capacity
+            )
+            return [dict(e) for e in events[:n]]
+
+    def count(self):
+        return self._conn().execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+    def images_with_status(self, names, status):
+        """The subset of image file names referenced by an event with this status."""
+        names = list(names)
+        if not names:
+            return set()
+        rows = self._conn().execute(
+            f"SELECT DISTINCT image_path FROM events "
+            f"WHERE image_path IN ({', '.join('?' * len(names))}) AND lower(status) = ?",
+            (*names, status.lower())
+        ).fetchall()
+        return {row[0] for row in rows}
+
+    def iter_events(self, batch_size=1000, **filters):
+        """
+        Yield events matching query() filters in id order, fetching batch_size
+        rows at a time so neither memory nor a read snapshot is held for the
+        whole log.
+        """
+        after_id = filters.pop("after_id", None)
+        while True:
+            batch = self.query(after_id=after_id, limit=batch_size, **filters)
+            yield from batch
+            if len(batch) < batch_size:
+                return
+            after_id = batch[-1]["id"]
+
+    def version(self):
+        """Monotonic counter bumped by every insert, update and delete."""
+        return self._conn().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def rollup(self, dimension, group_by=("bucket",), start=None, end=None):
+        """
+        Counts from one rollup dimension (see ROLLUP_DIMENSIONS), summed over
+        everything not in group_by ("bucket", "pose" and/or "status"). start
+        and end bound the bucket inclusively, e.g. days or hours. Returns a
+        list of dicts ordered by the group columns.
+        """
+        if dimension not in ROLLUP_DIMENSIONS:
+            raise ValueError(f"dimension must be one of {', '.join(ROLLUP_DIMENSIONS)}")
+        if not group_by or set(group_by) - {"bucket", "pose", "status"}:
+            raise ValueError("group_by must be a subset of bucket, pose, status")
+
+        clauses, params = ["dimension = ?"], [dimension]
+        if start is not None:
+            clauses.append("bucket >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("bucket <= ?")
+            params.append(end)
+
+        columns = ", ".join(group_by)
+        rows = self._conn().execute(
+            f"SELECT {columns}, SUM(count) AS count FROM rollups WHERE {' AND '.join(clauses)} "
+            f"GROUP BY {columns} ORDER BY {columns}",
+            params
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    @staticmethod
+    def _where(ids=None, pose=None, status=None, min_confidence=None, max_confidence=None,
+               start=None, end=None, after_id=None, since=None):
+        """WHERE clauses and parameters for the query() filters."""
+        clauses, params = [], []
+
+        if ids is not None:
+            # One JSON parameter instead of one per id, so any number fits
+            clauses.append("id IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps([int(i) for i in ids]))
+
+        for column, value in (("pose", pose), ("status", status)):
+            if value is None:
+                continue
+            values = [value] if isinstance(value, str) else list(value)
+            clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+
+        for clause, value in (
+            ("confidence >= ?", min_confidence),
+            ("confidence <= ?", max_confidence),
+            ("timestamp >= ?", start),
+            ("timestamp <= ?", end),
+            ("id > ?", after_id),
+            ("seq > ?", since)
+        ):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        return clauses, params
+
+    def query(self, pose=None, status=None, min_confidence=None, max_confidence=None,
+              start=None, end=None, after_id=None, since=None, limit=None):
+        """
+        Events matching every given filter, in id order.
+
+        pose and status accept a single value or a list. start/end bound the
+        timestamp (inclusive, "YYYY-mm-dd HH:MM:SS" strings compare in order).
+        after_id is the pagination cursor; since keeps only rows written after
+        that version().
+        """
+        clauses, params = self._where(
+            pose=pose, status=status, min_confidence=min_confidence, max_confidence=max_confidence,
+            start=start, end=end, after_id=after_id, since=since
+        )
+        sql = "SELECT * FROM events"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        return [self._to_event(row) for row in self._conn().execute(sql, params)]
+
+    def deleted_since(self, since):
+        """
+        Ids deleted after version `since`, or None when tombstones that old
+        have been pruned and the caller has to reload everything.
+        """
+        conn = self._conn()
+        floor = conn.execute("SELECT value FROM meta WHERE key = 'tombstone_floor'").fetchone()[0]
+        if since < floor:
+            return None
+        return [row[0] for row in conn.execute(
+            "SELECT id FROM tombstones WHERE seq > ? ORDER BY seq", (since,)
+        )]
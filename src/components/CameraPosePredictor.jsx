@@ -63,6 +63,24 @@ export default function CameraPosePredictor2() {
     socketRef.current = socket;
 
     let lastEstimateTime = 0;
+    // Server-advised pacing: analysis slows down or stops while the camera is static
+    let analysis = { analyze: true, intervalMs: ESTIMATE_INTERVAL };
+
+    const onMotion = (hint) => {
+      analysis = {
+        analyze: hint.analyze !== false,
+        intervalMs: hint.interval_ms ?? ESTIMATE_INTERVAL,
+      };
+    };
+    socket.on("motion", onMotion);
+
+    // Server-advised load shedding: frames sent faster than this are dropped unanswered
+    let serverIntervalMs = 0;
+    const onKeypointRate = (rate) => {
+      serverIntervalMs = rate.interval_ms ?? 0;
+    };
+    socket.on("keypoint_rate", onKeypointRate);
+    socket.on("connect", () => socket.emit("join", "camera:default"));
 
     const createSnapshotCanvas = (w = 640, h = 480) => {
       const c = document.createElement("canvas");
@@ -171,7 +189,8 @@ export default function CameraPosePredictor2() {
     async function loop() {
       try {
         const now = performance.now();
-        if (detectorRef.current && now - lastEstimateTime > ESTIMATE_INTERVAL) {
+        const intervalMs = Math.max(analysis.intervalMs, serverIntervalMs);
+        if (detectorRef.current && analysis.analyze && now - lastEstimateTime > intervalMs) {
           const img = videoRef.current;
           const canvas = canvasRef.current;
           if (img && canvas && img.complete && img.naturalWidth > 0) {
@@ -189,7 +208,8 @@ export default function CameraPosePredictor2() {
               drawSkeleton(ctx, keypoints);
 
               socket.emit("keypoints", {
-                keypoints: keypoints.map((k) => [k.x, k.y]),
+                keypoints: packKeypoints(keypoints),
+                channels: 3,
               });
             }
           }
@@ -250,6 +270,8 @@ export default function CameraPosePredictor2() {
       }
       if (socketRef.current) {
         socketRef.current.off("pose", onPoseFromServer);
+        socketRef.current.off("motion", onMotion);
+        socketRef.current.off("keypoint_rate", onKeypointRate);
         socketRef.current.disconnect();
         socketRef.current = null;
       }
@@ -283,6 +305,17 @@ export default function CameraPosePredictor2() {
   );
 }
 
+// x, y, score per keypoint as little-endian float32, sent as a binary attachment
+function packKeypoints(keypoints) {
+  const packed = new Float32Array(keypoints.length * 3);
+  keypoints.forEach((k, i) => {
+    packed[i * 3] = k.x;
+    packed[i * 3 + 1] = k.y;
+    packed[i * 3 + 2] = k.score ?? 0;
+  });
+  return packed.buffer;
+}
+
 function drawSkeleton(ctx, keypoints) {
   const adjacentPairs = [
     [5, 7],
@@ -45,6 +45,14 @@ export default function EventModal({ event, onClose, onSave, onDelete }) {
           />
         )}
 
+        {event["clip-path"] && (
+          <p>
+            <a href={`http://localhost:5000/clips/${event["clip-path"]}`} download>
+              Download event clip
+            </a>
+          </p>
+        )}
+
         <div style={{ marginTop: "1rem", display: "flex", gap: "1rem" }}>
           <button onClick={handleSave} className={styles.buttonSave}>
             Save
@@ -9,64 +9,58 @@ import styles from "./Charts.module.css";
 
 const COLORS = ["#0d47a1", "#1565c0", "#42a5f5", "#64b5f6", "#90caf9"];
 
+const isSuspicious = (status) => (status || "").toLowerCase() === "suspicious";
+
 export default function ChartsPage() {
-  const [events, setEvents] = useState([]);
+  const [stats, setStats] = useState(null);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
-    const fetchEvents = async () => {
+    const fetchStats = async () => {
       try {
-        const res = await axios.get("/api/suspicious_poses");
-        setEvents(res.data);
+        // Aggregated server-side; the raw event history is never downloaded
+        const res = await axios.get("/api/stats");
+        setStats(res.data);
       } catch (err) {
         console.error(err);
       } finally {
         setLoading(false);
       }
     };
-    fetchEvents();
+    fetchStats();
   }, []);
 
   const pieData = useMemo(() => {
-    const suspicious = events.filter((e) => e.status === "Suspicious").length;
-    const nonSuspicious = events.length - suspicious;
+    if (!stats) return [];
+    const suspicious = stats.by_status
+      .filter((s) => isSuspicious(s.status))
+      .reduce((sum, s) => sum + s.count, 0);
     return [
       { name: "Suspicious", value: suspicious },
-      { name: "Non-Suspicious", value: nonSuspicious },
+      { name: "Non-Suspicious", value: stats.total - suspicious },
     ];
-  }, [events]);
+  }, [stats]);
 
   const lineData = useMemo(() => {
-    const grouped = {};
-    events.forEach((e) => {
-      const date = e.timestamp.split(" ")[0];
-      if (!grouped[date]) grouped[date] = { date, suspicious: 0, normal: 0 };
-      if (e.status === "Suspicious") grouped[date].suspicious++;
-      else grouped[date].normal++;
+    if (!stats) return [];
+    return stats.by_day.map((d) => {
+      const suspicious = Object.entries(d.statuses)
+        .filter(([status]) => isSuspicious(status))
+        .reduce((sum, [, count]) => sum + count, 0);
+      return { date: d.day, suspicious, normal: d.total - suspicious };
     });
-    return Object.values(grouped).sort((a, b) => new Date(a.date) - new Date(b.date));
-  }, [events]);
+  }, [stats]);
 
-  const poseData = useMemo(() => {
-    const freq = {};
-    events.forEach((e) => {
-      if (!freq[e.pose]) freq[e.pose] = 0;
-      freq[e.pose]++;
-    });
-    return Object.entries(freq)
-      .map(([pose, count]) => ({ pose, count }))
-      .sort((a, b) => b.count - a.count);
-  }, [events]);
+  const poseData = useMemo(() => (stats ? stats.by_pose : []), [stats]);
 
   const topSuspiciousPoses = useMemo(() => {
-    const freq = {};
-    events.filter(e => e.status === "Suspicious")
-      .forEach(e => { freq[e.pose] = (freq[e.pose] || 0) + 1; });
-    return Object.entries(freq)
-      .map(([pose, count]) => ({ pose, count }))
+    if (!stats) return [];
+    return stats.by_pose_status
+      .filter((p) => isSuspicious(p.status))
+      .map(({ pose, count }) => ({ pose, count }))
       .sort((a, b) => b.count - a.count)
       .slice(0, 5);
-  }, [events]);
+  }, [stats]);
 
   if (loading) {
     return (
@@ -79,7 +73,7 @@ export default function ChartsPage() {
     );
   }
 
-  if (!events.length) {
+  if (!stats || !stats.total) {
     return (
       <div className={styles.chartsContainer}>
         <NavBar />
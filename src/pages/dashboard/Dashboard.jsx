@@ -37,29 +37,37 @@ export default function Dashboard() {
   const [showNotification, setShowNotification] = useState(false);
   const [notificationImage, setNotificationImage] = useState(null);
   const [showDeleteConfirmation, setShowDeleteConfirmation] = useState(null);
+  const [selected, setSelected] = useState(new Set());
 
   const audioRef = useRef(null);
   const lastAlertedTimestamp = useRef(null);
+  // store version of the events we hold; polls only ask for what changed since
+  const eventsVersionRef = useRef(null);
+
+  const normalizeEvent = (e) => ({
+    ...e,
+    status: capitalize(e.status),
+    imageUrl: e["image-path"] ? `http://localhost:5000/imgs/${e["image-path"]}` : null
+  });
+
+  const fetchLatest = async () => {
+    const latestRes = await axios.get("/api/latest");
+    setLatestEvent({
+      ...latestRes.data,
+      status: capitalize(latestRes.data.status)
+    });
+  };
 
-  const fetchData = async () => {
+  const fetchAll = async () => {
     try {
       setLoading(true);
-      const [eventsRes, latestRes] = await Promise.all([
+      const [eventsRes] = await Promise.all([
         axios.get("/api/suspicious_poses"),
-        axios.get("/api/latest"),
+        fetchLatest(),
       ]);
 
-      const normalizedEvents = eventsRes.data.map(e => ({
-        ...e,
-        status: capitalize(e.status),
-        imageUrl: e["image-path"] ? `http://localhost:5000/imgs/${e["image-path"]}` : null
-      }));
-
-      setEvents(normalizedEvents);
-      setLatestEvent({
-        ...latestRes.data,
-        status: capitalize(latestRes.data.status)
-      });
+      eventsVersionRef.current = Number(eventsRes.headers["x-events-version"]);
+      setEvents(eventsRes.data.map(normalizeEvent));
     } catch (err) {
       console.error(err);
     } finally {
@@ -67,6 +75,34 @@ export default function Dashboard() {
     }
   };
 
+  const fetchData = async () => {
+    if (eventsVersionRef.current === null || Number.isNaN(eventsVersionRef.current)) {
+      return fetchAll();
+    }
+
+    try {
+      const res = await axios.get("/api/suspicious_poses", {
+        params: { since: eventsVersionRef.current },
+      });
+      const { version, events: changed, deleted, reset } = res.data;
+
+      if (reset) {
+        return fetchAll();
+      }
+      eventsVersionRef.current = version;
+      if (changed.length === 0 && deleted.length === 0) return;
+
+      const removed = new Set([...deleted, ...changed.map((e) => e.id)]);
+      setEvents((prev) =>
+        [...prev.filter((e) => !removed.has(e.id)), ...changed.map(normalizeEvent)]
+          .sort((a, b) => a.id - b.id)
+      );
+      await fetchLatest();
+    } catch (err) {
+      console.error(err);
+    }
+  };
+
   const playAudio = () => {
     if (audioRef.current) {
       // audioRef.current.pause();
@@ -109,8 +145,8 @@ export default function Dashboard() {
 
   const handleDeleteAll = async () => {
     try {
-      await axios.delete('/api/suspicious_poses');
-      await fetchData();
+      await axios.delete('/api/suspicious_poses', { params: { all: 1 } });
+      await fetchAll();
       toast.success("All logs deleted");
     } catch (err) {
       toast.error('Something went wrong.');
@@ -120,6 +156,51 @@ export default function Dashboard() {
     }
   };
 
+  // Bulk triage: one request however many events are selected
+  const handleBulkStatus = async (newStatus) => {
+    try {
+      const res = await axios.patch("/api/suspicious_poses", {
+        ids: [...selected],
+        status: newStatus,
+      });
+      setSelected(new Set());
+      await fetchData();
+      toast.success(`${res.data.updated} events marked ${newStatus}`);
+    } catch (err) {
+      toast.error("Something went wrong.");
+      console.error(err);
+    }
+  };
+
+  const handleDeleteSelected = async () => {
+    try {
+      const res = await axios.delete("/api/suspicious_poses", {
+        data: { ids: [...selected] },
+      });
+      setSelected(new Set());
+      await fetchData();
+      toast.success(`${res.data.deleted} events deleted`);
+    } catch (err) {
+      toast.error("Something went wrong.");
+      console.error(err);
+    }
+  };
+
+  const toggleSelected = (id) => {
+    setSelected((prev) => {
+      const next = new Set(prev);
+      if (next.has(id)) next.delete(id);
+      else next.add(id);
+      return next;
+    });
+  };
+
+  const toggleAll = () => {
+    setSelected((prev) =>
+      prev.size === events.length ? new Set() : new Set(events.map((e) => e.id))
+    );
+  };
+
   const handleDownload = async () => {
     try {
       const response = await axios.get("/api/export", {
@@ -188,17 +269,26 @@ export default function Dashboard() {
       if (data.timestamp !== lastAlertedTimestamp.current) {
         lastAlertedTimestamp.current = data.timestamp;
         setNotificationMsg(`Pose detected: ${data.pose} (Confidence: ${(data.confidence * 100).toFixed(1)}%)`);
-        setNotificationImage(`http://localhost:5000/imgs/${data["image-path"]}`);
+        // The snapshot is still being written; event_logged brings it
+        setNotificationImage(null);
 
         playAudio();
         setShowNotification(true);
-        fetchData();
       }
     });
 
+    // Alerts go out before their event is stored; refresh once it is
+    socket.on("event_logged", (data) => {
+      if (data["image-path"] && data.timestamp === lastAlertedTimestamp.current) {
+        setNotificationImage(`http://localhost:5000/imgs/${data["image-path"]}`);
+      }
+      fetchData();
+    });
+
     return () => {
       socket.off("connect");
       socket.off("alert");
+      socket.off("event_logged");
     };
   }, []);
 
@@ -245,6 +335,30 @@ export default function Dashboard() {
             <div className={styles.tableHeader}>
               <h2 className={styles.subheading}>Recent Events</h2>
               <div className={styles.utilContainer}>
+                {selected.size > 0 && (
+                  <>
+                    <button
+                      className={styles.buttonPrimary}
+                      onClick={() => handleBulkStatus("Suspicious")}
+                    >
+                      Mark {selected.size} Suspicious
+                    </button>
+                    <button
+                      className={styles.buttonPrimary}
+                      onClick={() => handleBulkStatus("Not Suspicious")}
+                    >
+                      Mark {selected.size} Not Suspicious
+                    </button>
+                    <button
+                      className={styles.buttonPrimary}
+                      onClick={handleDeleteSelected}
+                      style={{ display: "flex", alignItems: "center", gap: "0.5rem" }}
+                    >
+                      <MdDelete />
+                      Delete {selected.size}
+                    </button>
+                  </>
+                )}
                 <button
                   className={styles.buttonPrimary}
                   onClick={fetchData}
@@ -279,6 +393,13 @@ export default function Dashboard() {
                 <table className={styles.table}>
                   <thead>
                     <tr>
+                      <th>
+                        <input
+                          type="checkbox"
+                          checked={events.length > 0 && selected.size === events.length}
+                          onChange={toggleAll}
+                        />
+                      </th>
                       <th>Timestamp</th>
                       <th>Pose</th>
                       <th>Confidence</th>
@@ -289,6 +410,13 @@ export default function Dashboard() {
                   <tbody>
                     {events.map((event) => (
                       <tr key={event.id}>
+                        <td>
+                          <input
+                            type="checkbox"
+                            checked={selected.has(event.id)}
+                            onChange={() => toggleSelected(event.id)}
+                          />
+                        </td>
                         <td>{event.timestamp || "N/A"}</td>
                         <td>{event.pose || "N/A"}</td>
                         <td>
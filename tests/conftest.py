@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+# The api modules import each other as top-level modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "api"))
+
+
+@pytest.fixture(scope="session")
+def api_app(tmp_path_factory):
+    """The api module set up once on throwaway directories."""
+    import api
+
+    root = tmp_path_factory.mktemp("api")
+    api.create_app(*(str(root / name) for name in ("logs", "imgs", "clips", "credentials")))
+    return api
+
+
+@pytest.fixture
+def client(api_app):
+    api_app.event_store.clear()
+    return api_app.app.test_client()
+
+
+def make_event(**overrides):
+    event = {"timestamp": "2026-01-01 12:00:00", "pose": "lying", "confidence": 90, "status": "unreviewed"}
+    event.update(overrides)
+    return event
@@ -0,0 +1,174 @@
+import csv
+import io
+import json
+import time
+
+import numpy as np
+import openpyxl
+
+from conftest import make_event
+
+
+def add_events(api_app, n):
+    return [api_app.event_store.append(make_event(confidence=80 + i))["id"] for i in range(n)]
+
+
+def test_bulk_delete_reads_body_whatever_the_content_type(api_app, client):
+    ids = add_events(api_app, 3)
+    response = client.delete("/api/suspicious_poses", data=json.dumps({"ids": ids[:1]}), content_type="text/plain")
+    assert response.status_code == 200
+    assert response.get_json()["deleted"] == 1
+    assert api_app.event_store.count() == 2
+
+
+def test_bulk_delete_rejects_malformed_body(api_app, client):
+    add_events(api_app, 3)
+    response = client.delete("/api/suspicious_poses", data="{\"ids\": [1", content_type="application/json")
+    assert response.status_code == 400
+    assert api_app.event_store.count() == 3
+
+
+def test_delete_everything_needs_all(api_app, client):
+    add_events(api_app, 3)
+    assert client.delete("/api/suspicious_poses").status_code == 400
+    assert api_app.event_store.count() == 3
+    assert client.delete("/api/suspicious_poses?all=1").status_code == 200
+    assert api_app.event_store.count() == 0
+
+
+def test_bulk_selection_must_narrow_the_log(api_app, client):
+    add_events(api_app, 3)
+    for body in ({"filter": {}}, {"filter": {"pose": []}}, {"filter": {"stauts": "dismissed"}}):
+        assert client.delete("/api/suspicious_poses", json=body).status_code == 400
+        assert client.patch("/api/suspicious_poses", json=dict(body, status="x")).status_code == 400
+    assert client.patch("/api/suspicious_poses", json={"ids": [1], "status": None}).status_code == 400
+    assert [e["status"] for e in api_app.event_store.query()] == ["unreviewed"] * 3
+
+
+def test_bulk_update_by_filter(api_app, client):
+    add_events(api_app, 4)
+    response = client.patch(
+        "/api/suspicious_poses", json={"filter": {"min_confidence": 82}, "status": "Suspicious"}
+    )
+    assert response.get_json()["updated"] == 2
+    assert [e["status"] for e in api_app.event_store.query()] == ["unreviewed"] * 2 + ["suspicious"] * 2
+
+
+def test_exports_hold_every_event(api_app, client):
+    add_events(api_app, 5)
+
+    rows = list(csv.reader(io.StringIO(client.get("/api/export?format=csv").get_data(as_text=True))))
+    assert len(rows) == 6
+
+    lines = client.get("/api/export?format=ndjson").get_data(as_text=True).splitlines()
+    assert [json.loads(line)["confidence"] for line in lines] == [80, 81, 82, 83, 84]
+
+    workbook = openpyxl.load_workbook(io.BytesIO(client.get("/api/export?format=xlsx").get_data()))
+    assert workbook.active.max_row == 6
+
+
+def test_keypoints_reject_non_finite_values(api_app):
+    keypoints = np.zeros((17, 2), "<f4")
+    keypoints[5, 0] = np.inf
+    socket = api_app.socketio.test_client(api_app.app)
+    socket.emit("keypoints", {"keypoints": keypoints.tobytes(), "channels": 2})
+    replies = socket.get_received()
+    socket.disconnect()
+    assert replies[0]["name"] == "pose"
+    assert replies[0]["args"][0]["error"] == "invalid keypoints"
+
+
+def test_keypoints_reject_payloads_that_are_not_objects(api_app):
+    socket = api_app.socketio.test_client(api_app.app)
+    for payload in (None, 3, [1, 2]):
+        socket.emit("keypoints", payload)
+    replies = socket.get_received()
+    socket.disconnect()
+    assert [reply["args"][0]["error"] for reply in replies] == ["invalid keypoints"] * 3
+
+
+def test_disconnect_drops_per_stream_trackers(api_app):
+    keypoints = np.random.default_rng(0).uniform(0, 640, (17, 2)).astype("<f4")
+    socket = api_app.socketio.test_client(api_app.app)
+    for stream_id in (None, "a", "b"):
+        payload = {"keypoints": keypoints.tobytes(), "channels": 2}
+        if stream_id is not None:
+            payload["stream_id"] = stream_id
+        socket.emit("keypoints", payload)
+    # Detection is asynchronous; wait for the trackers to exist
+    deadline = time.monotonic() + 5
+    while len([key for key in api_app.pose_trackers.keys() if "/" in key]) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    owned = [key for key in api_app.pose_trackers.keys() if key.endswith(("/a", "/b"))]
+    sid = owned[0].split("/")[0]
+    assert sid in api_app.pose_trackers.keys()
+
+    socket.disconnect()
+    keys = api_app.pose_trackers.keys() + api_app.keypoint_inbox.keys()
+    assert not [key for key in keys if key == sid or key.startswith(sid + "/")]
+
+
+def test_date_only_end_includes_that_day(api_app, client):
+    for day in ("01", "02", "03", "04"):
+        api_app.event_store.append(make_event(timestamp=f"2026-01-{day} 18:30:00"))
+    events = client.get("/api/suspicious_poses?start=2026-01-02&end=2026-01-03").get_json()
+    assert [e["timestamp"][:10] for e in events] == ["2026-01-02", "2026-01-03"]
+
+
+def test_pages_follow_next_after_id(api_app, client):
+    ids = add_events(api_app, 5)
+    seen = []
+    url = "/api/suspicious_poses?limit=2"
+    while url:
+        response = client.get(url)
+        seen += [e["id"] for e in response.get_json()]
+        after = response.headers.get("X-Next-After-Id")
+        url = after and f"/api/suspicious_poses?limit=2&after_id={after}"
+    assert seen == ids
+
+
+def test_unchanged_log_answers_not_modified(api_app, client):
+    add_events(api_app, 2)
+    etag = client.get("/api/suspicious_poses").headers["ETag"]
+    assert client.get("/api/suspicious_poses", headers={"If-None-Match": etag}).status_code == 304
+    add_events(api_app, 1)
+    assert client.get("/api/suspicious_poses", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_since_returns_changes_and_deletions(api_app, client):
+    first, second = add_events(api_app, 2)
+    version = api_app.event_store.version()
+    api_app.event_store.update(second, {"status": "dismissed"})
+    api_app.event_store.delete(first)
+    body = client.get(f"/api/suspicious_poses?since={version}").get_json()
+    assert [e["id"] for e in body["events"]] == [second]
+    assert body["deleted"] == [first] and not body["reset"]
+    assert client.get("/api/suspicious_poses?since=soon").status_code == 400
+
+
+def test_metrics_endpoint_serves_prometheus_text(api_app, client):
+    client.get("/api/latest")
+    response = client.get("/api/metrics")
+    assert response.content_type.startswith("text/plain; version=0.0.4")
+    body = response.get_data(as_text=True)
+    assert 'pose_http_request_duration_seconds_count{method="GET",route="/api/latest",status="200"}' in body
+
+
+def test_stats_come_from_rollups(api_app, client):
+    for i, (pose, day) in enumerate([("lying", "01"), ("lying", "02"), ("firearm", "02"), ("firearm", "03")]):
+        api_app.event_store.append(make_event(
+            timestamp=f"2026-01-{day} 1{i}:00:00", pose=pose, confidence=55 + 10 * i, stream_id="cam1"
+        ))
+    api_app.event_store.update(1, {"status": "suspicious"})
+
+    response = client.get("/api/stats?from=2026-01-02&to=2026-01-02")
+    body = response.get_json()
+    assert body["total"] == 4
+    assert {row["pose"]: row["count"] for row in body["by_pose"]} == {"lying": 2, "firearm": 2}
+    assert body["by_day"] == [{"day": "2026-01-02", "total": 2, "statuses": {"unreviewed": 2}}]
+    assert [row["hour"] for row in body["by_hour"]] == ["2026-01-02 11", "2026-01-02 12"]
+    assert body["by_camera"] == [{"camera": "cam1", "count": 4}]
+    assert body["confidence"]["all"][5:9] == [1, 1, 1, 1]
+
+    etag = response.headers["ETag"]
+    assert client.get("/api/stats", headers={"If-None-Match": etag}).status_code == 304
@@ -0,0 +1,52 @@
+import threading
+
+import numpy as np
+
+from capture import FrameBroadcaster, MotionDetector
+
+
+def test_stream_ends_when_broadcaster_closes():
+    broadcaster = FrameBroadcaster()
+    parts = []
+    viewer = threading.Thread(target=lambda: parts.extend(broadcaster.stream(timeout=0.05)))
+    viewer.start()
+
+    broadcaster.publish(np.zeros((32, 32, 3), np.uint8))
+    broadcaster.close()
+    viewer.join(2)
+
+    assert not viewer.is_alive()
+    assert broadcaster.viewers == 0
+
+
+def test_each_tier_is_encoded_once_per_frame():
+    broadcaster = FrameBroadcaster()
+    broadcaster.publish(np.zeros((720, 1280, 3), np.uint8))
+    first = broadcaster.encoded("360p")
+    assert broadcaster.encoded("360p") is first
+    assert broadcaster.encodes == 1
+
+
+def test_motion_boxes_cover_the_moving_region():
+    motion = MotionDetector()
+    still = np.zeros((480, 640, 3), np.uint8)
+    assert motion.update(still) == (0.0, [])
+    assert motion.update(still) == (0.0, [])
+
+    moved = still.copy()
+    moved[200:300, 400:500] = 255
+    score, boxes = motion.update(moved)
+    assert 0 < score < 0.1
+    assert len(boxes) == 1
+    x, y, w, h = boxes[0]
+    assert x <= 400 < 500 <= x + w and y <= 200 < 300 <= y + h
+
+
+def test_motion_ignores_specks():
+    motion = MotionDetector(min_area=0.01)
+    still = np.zeros((480, 640, 3), np.uint8)
+    motion.update(still)
+    speck = still.copy()
+    speck[100:124, 100:124] = 255
+    score, boxes = motion.update(speck)
+    assert score > 0 and boxes == []
@@ -0,0 +1,27 @@
+import cv2
+import numpy as np
+
+from clips import write_mjpeg_avi
+
+
+def test_mjpeg_avi_plays_back(tmp_path):
+    frames = []
+    for value in (0, 80, 160, 240, 255):
+        ok, buffer = cv2.imencode(".jpg", np.full((48, 64, 3), value, np.uint8))
+        frames.append(buffer.tobytes())
+    path = tmp_path / "clip.avi"
+    with open(path, "wb") as f:
+        write_mjpeg_avi(f, frames, 10.0, 64, 48)
+
+    cap = cv2.VideoCapture(str(path))
+    decoded = []
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        decoded.append(frame)
+    cap.release()
+
+    assert len(decoded) == len(frames)
+    assert decoded[0].shape == (48, 64, 3)
+    assert abs(int(decoded[2].mean()) - 160) <= 2
@@ -0,0 +1,60 @@
+import numpy as np
+
+from detector import MultiPoseTracker, PoseTracker, TrackerRegistry, action_labels, detect_action, detect_action_batch, detect_sequence
+
+
+def random_poses(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(0, 640, (n, 17, 2))
+
+
+def test_batch_matches_detect_action():
+    poses = random_poses(200)
+    labels, confidences = detect_action_batch(poses)
+    for i, pose in enumerate(poses):
+        result = detect_action(pose, tracker=PoseTracker())
+        assert result["label"] == labels[i]
+        np.testing.assert_allclose([result["confidences"][name] for name in action_labels()], confidences[i])
+
+
+def test_sequence_matches_frame_by_frame():
+    poses = random_poses(50, seed=1)
+    one_by_one = PoseTracker()
+    expected = [detect_action(pose, delta_time=0.5, tracker=one_by_one) for pose in poses]
+    assert detect_sequence(poses, delta_time=0.5, tracker=PoseTracker()) == expected
+
+
+def test_registry_keeps_one_tracker_per_stream():
+    registry = TrackerRegistry()
+    a, b = registry.get("a"), registry.get("b")
+    assert a is not b and registry.get("a") is a
+    a.detect(random_poses(1)[0])
+    assert np.isnan(b.last_positions).all() and not np.isnan(a.last_positions).any()
+
+
+def test_registry_drops_least_recently_used_past_the_cap():
+    registry = TrackerRegistry(max_trackers=2)
+    for key in ("a", "b", "a", "c"):
+        registry.get(key)
+    assert registry.keys() == ["a", "c"]
+
+
+def test_multi_pose_ids_follow_people_between_frames():
+    person = random_poses(1, seed=2)[0] / 10
+    other = person + 300
+    tracker = MultiPoseTracker()
+    first = [r["track_id"] for r in tracker.detect(np.stack([person, other]), now=0.0)]
+    # Input order swapped and everyone moved a little
+    second = [r["track_id"] for r in tracker.detect(np.stack([other + 2, person + 2]), now=0.1)]
+    assert second == first[::-1]
+
+    # Past idle_timeout the tracks are forgotten and ids are not reused
+    third = [r["track_id"] for r in tracker.detect(person[None], now=10.0)]
+    assert third == [3] and len(tracker) == 1
+
+
+def test_multi_pose_caps_tracks():
+    tracker = MultiPoseTracker(max_tracks=2)
+    poses = np.stack([random_poses(1, seed=3)[0] / 10 + 200 * i for i in range(3)])
+    assert len(tracker.detect(poses, now=0.0)) == 3
+    assert len(tracker) == 2
@@ -0,0 +1,56 @@
+from bench import SNAPSHOT_PNG
+from episodes import EpisodeEngine
+
+
+def test_snapshot_names_differ_per_stream(api_app):
+    names = []
+    for stream in ("cam1", "cam2"):
+        episode, status = api_app.episodes.observe(stream, "firearm", 0.9, now=1_800_000_000.0)
+        assert status == "opened"
+        names.append(api_app.save_episode_image(episode, SNAPSHOT_PNG, 0.9))
+    api_app.snapshot_writer._queue.join()
+    assert names[0] != names[1]
+
+
+def test_event_logged_points_at_a_servable_image(api_app):
+    socket = api_app.socketio.test_client(api_app.app)
+    socket.emit("high_confidence_pose", {"pose": "lying", "confidence": 0.95, "snapshot": SNAPSHOT_PNG,
+                                         "stream_id": "served"})
+    api_app.snapshot_writer._queue.join()
+    received = socket.get_received()
+    socket.disconnect()
+
+    alert = next(m["args"][0] for m in received if m["name"] == "alert")
+    logged = next(m["args"][0] for m in received if m["name"] == "event_logged")
+    assert alert["image-path"] is None
+    assert logged["timestamp"] == alert["timestamp"]
+    response = api_app.app.test_client().get(f"/imgs/{logged['image-path']}")
+    assert response.status_code == 200
+    assert api_app.event_store.get(logged["id"])["image-path"] == logged["image-path"]
+
+
+def test_samples_coalesce_into_one_episode_until_quiet():
+    closed = []
+    engine = EpisodeEngine(open_threshold=0.8, close_threshold=0.6, close_after=10.0, on_close=closed.append)
+    assert engine.observe("cam", "lying", 0.7, now=0.0) == (None, "ignored")
+    episode, status = engine.observe("cam", "lying", 0.85, now=1.0)
+    assert status == "opened"
+    # Dipping under the open threshold still extends an open episode
+    assert engine.observe("cam", "lying", 0.65, now=5.0) == (episode, "extended")
+    assert engine.observe("cam", "lying", 0.95, now=9.0) == (episode, "extended")
+
+    assert engine.sweep(now=15.0) == [] and not closed
+    assert engine.sweep(now=20.0) == [episode] and closed == [episode]
+    assert (episode.start, episode.end, episode.samples, episode.peak) == (1.0, 9.0, 3, 0.95)
+
+
+def test_long_and_excess_episodes_are_closed():
+    closed = []
+    engine = EpisodeEngine(close_after=10.0, max_duration=30.0, max_open=2, on_close=closed.append)
+    for t in range(0, 40, 5):
+        engine.observe("cam", "lying", 0.9, now=float(t))
+    assert [(e.start, e.end) for e in closed] == [(0.0, 25.0)]
+
+    engine.observe("a", "firearm", 0.9, now=40.0)
+    engine.observe("b", "firearm", 0.9, now=41.0)
+    assert [e.stream for e in closed[1:]] == ["cam"]
@@ -0,0 +1,60 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+import framebus
+from framebus import FrameRing
+
+pytestmark = pytest.mark.skipif(not framebus.SUPPORTED, reason="FrameRing needs an x86 host")
+
+
+@pytest.fixture
+def ring():
+    ring = FrameRing.create(slots=3, slot_bytes=32 * 32 * 3)
+    yield ring
+    ring.close()
+
+
+def test_write_then_read_from_another_attachment(ring):
+    frame = np.arange(16 * 24 * 3, dtype=np.uint8).reshape(16, 24, 3)
+    seq = ring.write(frame, timestamp=12.5)
+
+    reader = FrameRing.attach(ring.name)
+    try:
+        got_seq, view, timestamp = reader.read()
+        assert (got_seq, timestamp) == (seq, 12.5)
+        np.testing.assert_array_equal(view, frame)
+        assert not view.flags.writeable
+        del view
+    finally:
+        reader.close()
+
+
+def test_lapped_frames_are_invalid(ring):
+    first = ring.write(np.zeros((8, 8), np.uint8))
+    for _ in range(ring.slots):
+        ring.write(np.ones((8, 8), np.uint8))
+    assert not ring.valid(first)
+    assert ring.read(first) is None
+
+
+def test_oversize_frames_are_counted_not_written(ring):
+    assert ring.write(np.zeros((64, 64, 3), np.uint8)) is None
+    assert ring.counters()["oversize"] == 1
+    assert ring.latest == 0
+
+
+def test_wait_wakes_on_notify_and_ends_on_eof(ring):
+    read_end, write_end = os.pipe()
+    ring.notify_fd = write_end
+    writer = threading.Timer(0.05, ring.write, (np.zeros((8, 8), np.uint8),))
+    writer.start()
+    assert ring.wait(0, timeout=5, notify=read_end) == 1
+    assert ring.wait(1, timeout=0.05, notify=read_end) is None
+
+    os.close(write_end)
+    with pytest.raises(EOFError):
+        ring.wait(1, timeout=5, notify=read_end)
+    os.close(read_end)
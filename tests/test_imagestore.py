@@ -0,0 +1,75 @@
+import os
+
+import cv2
+import numpy as np
+
+from imagestore import ImageStore
+
+
+def jpeg(value=0):
+    ok, buffer = cv2.imencode(".jpg", np.full((240, 320, 3), value, np.uint8))
+    return buffer.tobytes()
+
+
+def save(image_store, name, data):
+    with open(os.path.join(image_store.img_dir, name), "wb") as f:
+        f.write(data)
+    image_store.add(name, data)
+
+
+def make_store(tmp_path, **kwargs):
+    img_dir = tmp_path / "imgs"
+    img_dir.mkdir()
+    return ImageStore(str(img_dir), str(tmp_path / "images.db"), **kwargs)
+
+
+def test_add_under_full_quota_keeps_the_new_image(tmp_path):
+    data = jpeg()
+    protected = {"a.jpg", "b.jpg"}
+    image_store = make_store(tmp_path, max_bytes=2 * len(data), protect=lambda names: protected & set(names))
+    save(image_store, "a.jpg", data)
+    save(image_store, "b.jpg", data)
+
+    # Nothing links to c.jpg yet, so protect() does not cover it
+    save(image_store, "c.jpg", data)
+    assert os.path.exists(os.path.join(image_store.img_dir, "c.jpg"))
+    assert image_store.get("c.jpg") is not None
+
+
+def test_quota_evicts_least_recently_viewed(tmp_path):
+    data = jpeg()
+    image_store = make_store(tmp_path, max_bytes=2 * len(data), grace=0)
+    for name in ("a.jpg", "b.jpg"):
+        save(image_store, name, data)
+    image_store.touch("a.jpg")
+
+    save(image_store, "c.jpg", data)
+    remaining = sorted(name for name in os.listdir(image_store.img_dir) if name.endswith(".jpg"))
+    assert remaining == ["a.jpg", "c.jpg"]
+    assert not os.path.exists(image_store.thumb_path("b.jpg"))
+    assert image_store.total_bytes == 2 * len(data)
+
+
+def test_age_limit_spares_protected_images(tmp_path):
+    image_store = make_store(tmp_path, max_age=60, protect=lambda names: {"keep.jpg"} & set(names))
+    for name in ("keep.jpg", "old.jpg"):
+        save(image_store, name, jpeg())
+
+    evicted = image_store.evict(now=image_store.get("old.jpg")["created"] + 120)
+    assert evicted == ["old.jpg"]
+    assert image_store.get("keep.jpg") is not None
+
+
+def test_thumbnail_is_scaled_to_height(tmp_path):
+    image_store = make_store(tmp_path, thumb_height=60)
+    save(image_store, "a.jpg", jpeg(128))
+    thumb = cv2.imread(image_store.thumbnail("a.jpg"))
+    assert thumb.shape[:2] == (60, 80)
+
+
+def test_undecodable_image_is_still_indexed(tmp_path):
+    image_store = make_store(tmp_path)
+    save(image_store, "broken.png", b"not an image")
+    assert image_store.get("broken.png")["bytes"] == len(b"not an image")
+    assert image_store.total_bytes == len(b"not an image")
+    assert not os.path.exists(image_store.thumb_path("broken.png"))
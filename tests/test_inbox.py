@@ -0,0 +1,43 @@
+import threading
+
+from inbox import LatestInbox
+
+
+def test_inbox_forgets_least_recent_streams_past_the_cap():
+    release = threading.Event()
+    inbox = LatestInbox(lambda key, item, skipped: release.wait(5), workers=1, max_clients=2)
+    for key in ("a", "b", "c"):
+        inbox.submit(key, 1)
+    assert inbox.keys() == ["b", "c"]
+    release.set()
+
+
+def test_inbox_sweeps_idle_streams():
+    inbox = LatestInbox(lambda key, item, skipped: None, workers=1, idle_timeout=0.0)
+    inbox.submit("a", 1)
+    inbox.submit("b", 1)
+    assert inbox.keys() == []
+
+
+def test_inbox_keeps_only_the_newest_waiting_item():
+    started, release = threading.Event(), threading.Event()
+    handled = []
+
+    def handler(key, item, skipped):
+        if item == "first":
+            started.set()
+            release.wait(5)
+        handled.append((item, skipped))
+
+    inbox = LatestInbox(handler, workers=1)
+    inbox.submit("a", "first")
+    started.wait(5)
+    assert inbox.submit("a", "second")
+    assert not inbox.submit("a", "third")
+    release.set()
+    for _ in range(100):
+        if len(handled) == 2:
+            break
+        threading.Event().wait(0.01)
+    assert handled == [("first", 0), ("third", 1)]
+    assert inbox.client_stats("a")["dropped"] == 1
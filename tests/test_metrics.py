@@ -0,0 +1,29 @@
+from metrics import MetricsRegistry
+
+
+def test_render_exposes_counters_histograms_and_collectors():
+    registry = MetricsRegistry("pose")
+    counter = registry.counter("frames_total", "Frames.", ("client",))
+    histogram = registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+    registry.collector("depth", "Queue depth.", lambda: 3)
+
+    counter.inc('a"b', amount=2)
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    lines = registry.render().splitlines()
+
+    assert "# TYPE pose_frames_total counter" in lines
+    assert 'pose_frames_total{client="a\\"b"} 2' in lines
+    assert 'pose_latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'pose_latency_seconds_bucket{le="+Inf"} 2' in lines
+    assert "pose_latency_seconds_count 2" in lines
+    assert "pose_depth 3" in lines
+
+
+def test_broken_collector_does_not_break_the_scrape():
+    registry = MetricsRegistry()
+    registry.collector("broken", "Fails.", lambda: 1 / 0)
+    registry.collector("fine", "Works.", lambda: [(("x",), 1.5)], labelnames=("name",))
+    lines = registry.render().splitlines()
+    assert lines[2].startswith("# broken failed:")
+    assert 'fine{name="x"} 1.5' in lines
@@ -0,0 +1,19 @@
+import numpy as np
+
+from detector import action_labels
+from replay import write_npz
+
+
+def test_write_npz_labels_round_trip(tmp_path):
+    names = list(action_labels()) + ["neutral"]
+    labels = np.array(["neutral", "right_punch", "left_punch", "right_kick", "neutral", names[0], names[-2]])
+    confidences = np.zeros((len(labels), len(action_labels())))
+    stream_ids = np.array(["cam"] * len(labels))
+    path = tmp_path / "scored.npz"
+
+    write_npz(path, labels, confidences, stream_ids, None)
+
+    with np.load(path) as data:
+        decoded = data["label_names"][data["labels"]]
+        assert decoded.tolist() == labels.tolist()
+        assert "timestamps" not in data
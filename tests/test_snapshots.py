@@ -0,0 +1,53 @@
+import threading
+
+from bench import SNAPSHOT_PNG
+from snapshots import SnapshotWriter
+
+
+def test_rejected_calls_are_not_dropped_snapshots(tmp_path):
+    writer = SnapshotWriter(str(tmp_path), max_queue=1)
+    release = threading.Event()
+    started = threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    assert writer.call(block)
+    started.wait(5)
+    assert writer.call(lambda: None)
+    assert not writer.call(lambda: None)
+    assert not writer.submit(SNAPSHOT_PNG, "a.png")
+    release.set()
+    writer._queue.join()
+
+    stats = writer.stats()
+    assert (stats["calls_rejected"], stats["dropped"]) == (1, 1)
+
+
+def test_snapshot_written_then_callback(tmp_path):
+    writer = SnapshotWriter(str(tmp_path))
+    saved = []
+    writer.submit(SNAPSHOT_PNG, "a.png", on_done=saved.append)
+    writer._queue.join()
+    assert saved == ["a.png"]
+    assert (tmp_path / "a.png").read_bytes()[:4] == b"\x89PNG"
+
+
+def test_unreadable_snapshot_reports_failure(tmp_path):
+    writes = []
+    writer = SnapshotWriter(str(tmp_path), image_format="jpeg", on_write=lambda seconds, ok: writes.append(ok))
+    saved = []
+    writer.submit("data:image/png;base64,bm90IGFuIGltYWdl", "a.jpg", on_done=saved.append)
+    writer._queue.join()
+    assert saved == [None] and writes == [False]
+    assert writer.stats()["failed"] == 1
+    assert not list(tmp_path.iterdir())
+
+
+def test_snapshot_reencoded_to_the_configured_format(tmp_path):
+    writer = SnapshotWriter(str(tmp_path), image_format="jpeg")
+    assert writer.extension == ".jpg"
+    writer.submit(SNAPSHOT_PNG, "a.jpg")
+    writer._queue.join()
+    assert (tmp_path / "a.jpg").read_bytes()[:2] == b"\xff\xd8"
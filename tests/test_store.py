@@ -0,0 +1,97 @@
+import json
+import sqlite3
+
+import pytest
+
+import store
+from conftest import make_event
+from store import SCHEMA_VERSION, EventStore
+
+
+def user_version(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def rollups(event_store):
+    return sorted(tuple(row) for row in event_store._conn().execute("SELECT * FROM rollups"))
+
+
+def test_reopening_migrated_store_is_a_no_op(tmp_path):
+    path = str(tmp_path / "events.db")
+    EventStore(path).append(make_event())
+    reopened = EventStore(path)
+    assert user_version(path) == SCHEMA_VERSION
+    assert reopened.count() == 1
+
+
+def test_failed_migration_step_rolls_back_and_reruns(tmp_path, monkeypatch):
+    path = str(tmp_path / "events.db")
+    legacy = tmp_path / "events.json"
+    legacy.write_text(json.dumps([make_event(), make_event(pose="firearm")]))
+
+    broken = list(store._SCHEMA)
+    broken[1] += "\nSELECT no_such_function();"
+    monkeypatch.setattr(store, "_SCHEMA", broken)
+    with pytest.raises(sqlite3.OperationalError):
+        EventStore(path, legacy_json=str(legacy))
+    assert user_version(path) == 1
+    monkeypatch.undo()
+
+    # Step 2 adds a column; a half-applied step would fail here with "duplicate column"
+    event_store = EventStore(path, legacy_json=str(legacy))
+    assert user_version(path) == SCHEMA_VERSION
+    assert [event["pose"] for event in event_store.query()] == ["lying", "firearm"]
+
+
+def test_rollups_follow_every_write(tmp_path):
+    event_store = EventStore(str(tmp_path / "events.db"))
+    for i in range(30):
+        event_store.append(make_event(
+            timestamp=f"2026-01-{i % 3 + 1:02d} 12:00:00", pose=["lying", "firearm"][i % 2], confidence=50 + i,
+            stream_id=f"cam{i % 4}"
+        ))
+    event_store.update(3, {"status": "suspicious"})
+    event_store.update_many({"status": "not suspicious"}, ids=[5, 6, 7])
+    event_store.delete(10)
+    event_store.delete_many(pose="firearm", max_confidence=60)
+
+    maintained = rollups(event_store)
+    event_store.rebuild_rollups()
+    assert maintained == rollups(event_store)
+
+
+def test_changes_since_a_version(tmp_path):
+    event_store = EventStore(str(tmp_path / "events.db"))
+    for _ in range(3):
+        event_store.append(make_event())
+    since = event_store.version()
+
+    event_store.update(1, {"status": "suspicious"})
+    event_store.delete(2)
+    added = event_store.append(make_event())
+
+    assert [event["id"] for event in event_store.query(since=since)] == [1, added["id"]]
+    assert event_store.deleted_since(since) == [2]
+    assert event_store.deleted_since(event_store.version()) == []
+
+
+def test_tail_cache_follows_writes(tmp_path):
+    event_store = EventStore(str(tmp_path / "events.db"), cache_size=3)
+    assert event_store.latest() is None
+    for i in range(5):
+        event_store.append(make_event(confidence=i))
+    event_store.update(5, {"status": "suspicious"})
+    event_store.delete(4)
+
+    misses = event_store.cache.misses
+    assert [e["id"] for e in event_store.recent(2)] == [5, 3]
+    assert event_store.latest()["status"] == "suspicious"
+    assert event_store.cache.misses == misses
+
+    # Deeper than the cache holds: read from the database
+    assert [e["id"] for e in event_store.recent(4)] == [5, 3, 2, 1]
+    assert event_store.cache.misses == misses + 1